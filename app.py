@@ -4,13 +4,26 @@ Tinder-style mechanics: drag the card right to keep, left to delete,
 or use the round action buttons / keyboard. Built with PyQt5.
 """
 
+import math
 import os
+import sqlite3
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+import metrics
 from backend import ImageBackend
+from exif import read_thumbnail
+from filters import Filter, FilterError
+from imagecache import ImageCache, image_bytes
+from prefetch import DecodePipeline, PrefetchPlanner
+from quality import quality_issues, quality_score
 from sounds import SoundManager
 from theme import (
     PALETTE,
@@ -23,15 +36,95 @@ from theme import (
     primary_button_style,
     round_action_style,
 )
+from thumbcache import ThumbnailCache, default_cache_dir
 from widgets import FloatingEmoji, FullscreenViewer, SwipeDeck, Toast
 
-MAX_DISPLAY_DIM = 1600
-MAX_PREVIEW_DIM = 900
+# Photos are decoded to fill the deck's card at the screen's pixel density
+# (see decode_dim), rounded up to DECODE_STEP so that small resizes reuse
+# what was decoded, and at most MAX_DISPLAY_DIM. Until the deck is on
+# screen DEFAULT_DISPLAY_DIM stands in. Back cards are drawn dimmed and
+# darkened, so their previews are decoded at PREVIEW_SCALE of that. A
+# resize re-decodes once it has been still for RESIZE_DEBOUNCE_MS.
+DEFAULT_DISPLAY_DIM = 1600
+MAX_DISPLAY_DIM = 4096
+DECODE_STEP = 128
+PREVIEW_SCALE = 0.56
+RESIZE_DEBOUNCE_MS = 250
+# A card whose full-size decode is not ready yet is shown at once from a
+# proxy about this big (see _proxy_pixmap), then upgraded in place. Without
+# a cheap proxy it shows a blank card of the photo's shape this big.
+PROXY_DIM = 400
+PLACEHOLDER_DIM = 64
+# Full-size photos decoded ahead of the cursor: at least PREFETCH_AHEAD,
+# more (on up to PREFETCH_MAX_WORKERS threads) when the user sorts fast or
+# decodes are slow; see PrefetchPlanner. Pixmaps of the last PREFETCH_BEHIND
+# photos sorted are kept for undo.
+PREFETCH_AHEAD = 2
+PREFETCH_MAX_AHEAD = 12
+PREFETCH_MAX_WORKERS = min(4, max(1, (os.cpu_count() or 2) - 1))
+PREFETCH_BEHIND = 2
+# Quality of the JPEGs kept in the on-disk thumbnail cache.
+PREVIEW_QUALITY = 88
+# Back cards are drawn dimmed and darkened, so an embedded preview half the
+# requested size is good enough for them. That is the MPF preview most camera
+# JPEGs carry; a bare 160 px IFD1 thumbnail (phones, editor exports) is not.
+EMBEDDED_MIN_FRACTION = 0.5
+# Previews whose aspect ratio is further off than this are letterboxed.
+EMBEDDED_ASPECT_TOLERANCE = 0.02
+
+# EXIF orientation -> (clockwise rotation, then mirror left-right).
+_ORIENTATIONS = {
+    2: (0, True), 3: (180, False), 4: (180, True), 5: (90, True),
+    6: (90, False), 7: (270, True), 8: (270, False),
+}
+
+ORDER_LABELS = {
+    "name": "name",
+    "natural": "natural name",
+    "captured": "capture time",
+    "size": "file size",
+    "mtime": "date modified",
+}
 
 WELCOME_MESSAGE = "Drop a photo folder here\nor press  O  to open one"
 WELCOME_HINT = "Drag right to keep · drag left to delete · double-click to inspect"
 
 
+def encode_preview(image: QtGui.QImage) -> bytes:
+    """Bytes for the thumbnail cache: JPEG, or PNG to keep transparency."""
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    if image.hasAlphaChannel():
+        image.save(buffer, "PNG")
+    else:
+        image.save(buffer, "JPEG", PREVIEW_QUALITY)
+    buffer.close()
+    return bytes(data)
+
+
+def decode_dim(card: QtCore.QSize, dpr: float, scale: float = 1.0) -> int:
+    """Longest side to decode a photo at so it fills ``card`` (logical px) sharply."""
+    side = round(max(card.width(), card.height()) * dpr * scale)
+    dim = DECODE_STEP * math.ceil(side / DECODE_STEP)
+    return max(DECODE_STEP, min(MAX_DISPLAY_DIM, dim))
+
+
+def decode_category(path: str, max_dim: int) -> tuple:
+    """What decode costs are averaged over: file format and target size."""
+    return os.path.splitext(path)[1].lower(), max_dim
+
+
+def oriented(image: QtGui.QImage, orientation: int) -> QtGui.QImage:
+    """``image`` turned upright according to an EXIF orientation tag."""
+    rotation, mirror = _ORIENTATIONS.get(orientation, (0, False))
+    if rotation:
+        image = image.transformed(QtGui.QTransform().rotate(rotation))
+    if mirror:
+        image = image.mirrored(True, False)
+    return image
+
+
 def human_size(num_bytes: int) -> str:
     size = float(num_bytes)
     for unit in ("B", "KB", "MB", "GB"):
@@ -152,10 +245,47 @@ class FinishDialog(QtWidgets.QDialog):
         self.accept()
 
 
+class _BackendSignals(QtCore.QObject):
+    """Re-emits backend callbacks, which fire on worker threads, on the GUI thread."""
+
+    scan_progress = QtCore.pyqtSignal(int)
+    scan_complete = QtCore.pyqtSignal(int)
+    move_done = QtCore.pyqtSignal(str, str, str)  # src, dest, error ("" on success)
+    move_progress = QtCore.pyqtSignal(str, object, object)  # src, bytes copied, total
+    finish_progress = QtCore.pyqtSignal(int, object)  # files done, bytes freed
+    finish_done = QtCore.pyqtSignal(object, object)  # BulkResult or None, x2
+    folder_changed = QtCore.pyqtSignal(object, object)  # added paths, removed paths
+    duplicates_found = QtCore.pyqtSignal(object, object)  # backend, groups
+    quality_scored = QtCore.pyqtSignal(object, object)  # backend, {path: scores}
+    order_applied = QtCore.pyqtSignal(object)  # backend
+
+
 class ImageSwiper(QtWidgets.QWidget):
     def __init__(self):
         super().__init__()
         self.backend = None
+        self._backend_signals = _BackendSignals(self)
+        self._backend_signals.scan_progress.connect(self._on_scan_progress)
+        self._backend_signals.scan_complete.connect(self._on_scan_complete)
+        self._backend_signals.move_done.connect(self._on_move_done)
+        self._backend_signals.move_progress.connect(self._on_move_progress)
+        self._backend_signals.finish_progress.connect(self._on_finish_progress)
+        self._backend_signals.finish_done.connect(self._on_finish_done)
+        self._backend_signals.folder_changed.connect(self._on_folder_changed)
+        self._backend_signals.duplicates_found.connect(self._on_duplicates_found)
+        self._backend_signals.quality_scored.connect(self._on_quality_scored)
+        self._backend_signals.order_applied.connect(self._on_order_applied)
+        self._finish_progress = None
+        self._waiting_for_scan = False
+        # Exact-duplicate groups by member path, filled in the background.
+        self._duplicates = {}
+        self._duplicates_cancel = None
+        # Quality scores by path, also filled in the background; with
+        # _worst_first the queue is re-sorted by them once they arrive.
+        self._quality = {}
+        self._quality_cancel = None
+        self._worst_first = False
+        self._order_cancel = None
         self.history = []
         self.current_index = -1
         self.current_path = None
@@ -168,7 +298,31 @@ class ImageSwiper(QtWidgets.QWidget):
         self.title_font = pick_font(TITLE_FONT_CANDIDATES)
         self.sound = SoundManager(muted=self.settings.value("sound/muted", False, bool))
 
-        self._pixmap_cache = {}  # path -> display pixmap
+        # Decoded pixmaps and the deck's card-sized copies of them share one
+        # byte-budgeted LRU; the cards on screen and next up are pinned.
+        self._pixmap_cache = ImageCache()
+        # Scaled previews persist on disk across sessions; they are encoded
+        # and written on a background thread.
+        self.thumbnails = self._open_thumbnail_cache()
+        self._thumb_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbs")
+        # Photos are decoded to QImages on worker threads around the cursor
+        # (see _prefetch); only the QPixmap conversion runs here.
+        self._planner = PrefetchPlanner(
+            min_ahead=PREFETCH_AHEAD,
+            max_ahead=PREFETCH_MAX_AHEAD,
+            max_workers=PREFETCH_MAX_WORKERS,
+            default_bytes=DEFAULT_DISPLAY_DIM * DEFAULT_DISPLAY_DIM * 3,
+        )
+        self._decoder = DecodePipeline(self._decode_image, workers=1)
+        self._decoder.decoded.connect(self._on_decoded)
+        self._behind = OrderedDict()  # moved path -> pinned pixmap key, for undo
+        self._proxy_path = None  # the front card awaits a sharper decode of this photo
+        self._placeholder = False  # ... and shows only a blank card meanwhile
+        self._resize_timer = QtCore.QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self._resize_timer.timeout.connect(self._update_decode_dims)
+        self._screen_hooked = False
         self._progress_anim = None
 
         self.setWindowTitle("Photo Deleter")
@@ -178,6 +332,7 @@ class ImageSwiper(QtWidgets.QWidget):
         self.setAcceptDrops(True)
 
         self._build_ui()
+        self._display_dim, self._preview_dim = self._decode_dims()
         self._connect_shortcuts()
         self._show_welcome()
 
@@ -218,8 +373,9 @@ class ImageSwiper(QtWidgets.QWidget):
         top_bar.addWidget(open_button)
 
         # Swipe deck ------------------------------------------------------
-        self.deck = SwipeDeck()
+        self.deck = SwipeDeck(self._pixmap_cache)
         self.deck.swiped.connect(self._on_deck_swiped)
+        self.deck.resized.connect(self._resize_timer.start)
         self.deck.inspect_requested.connect(self.open_fullscreen)
 
         # Meta strip ------------------------------------------------------
@@ -227,6 +383,16 @@ class ImageSwiper(QtWidgets.QWidget):
         self.file_label.setObjectName("fileLabel")
         self.file_label.setWordWrap(True)
 
+        self.quality_chip = QtWidgets.QLabel("")
+        self.quality_chip.setObjectName("qualityChip")
+        self.quality_chip.setToolTip("Sharpness and exposure score (W sorts worst first)")
+        self.quality_chip.hide()
+
+        file_row = QtWidgets.QHBoxLayout()
+        file_row.setSpacing(10)
+        file_row.addWidget(self.file_label, stretch=1)
+        file_row.addWidget(self.quality_chip, alignment=QtCore.Qt.AlignTop)
+
         self.meta_label = QtWidgets.QLabel("")
         self.meta_label.setObjectName("metaLabel")
 
@@ -238,7 +404,7 @@ class ImageSwiper(QtWidgets.QWidget):
         meta_layout = QtWidgets.QVBoxLayout(meta_strip)
         meta_layout.setContentsMargins(16, 10, 16, 10)
         meta_layout.setSpacing(2)
-        meta_layout.addWidget(self.file_label)
+        meta_layout.addLayout(file_row)
         meta_layout.addWidget(self.meta_label)
         meta_layout.addWidget(self.action_label)
 
@@ -294,7 +460,7 @@ class ImageSwiper(QtWidgets.QWidget):
         )
 
         hints = QtWidgets.QLabel(
-            "→ Keep    ← Delete    Space Skip    Ctrl+Z Undo    F Inspect    M Mute    O Open"
+            "→ Keep    ← Delete    Space Skip    Ctrl+Z Undo    F Inspect    M Mute    O Open    S Subfolders    D Copies    W Worst first    T Order    / Filter"
         )
         hints.setObjectName("hintLabel")
 
@@ -345,6 +511,12 @@ class ImageSwiper(QtWidgets.QWidget):
         QtWidgets.QShortcut(QtGui.QKeySequence("M"), self, activated=self.toggle_mute)
         QtWidgets.QShortcut(QtGui.QKeySequence("O"), self, activated=self.choose_directory)
         QtWidgets.QShortcut(QtGui.QKeySequence("R"), self, activated=self.resume_last_folder)
+        QtWidgets.QShortcut(QtGui.QKeySequence("S"), self, activated=self.toggle_subfolders)
+        QtWidgets.QShortcut(QtGui.QKeySequence("D"), self, activated=self.delete_duplicates)
+        QtWidgets.QShortcut(QtGui.QKeySequence("W"), self, activated=self.toggle_worst_first)
+        QtWidgets.QShortcut(QtGui.QKeySequence("T"), self, activated=self.cycle_order)
+        QtWidgets.QShortcut(QtGui.QKeySequence("/"), self, activated=self.filter_folder)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+Shift+M"), self, activated=self.export_metrics)
 
     # -- status / welcome -----------------------------------------------
 
@@ -367,56 +539,272 @@ class ImageSwiper(QtWidgets.QWidget):
 
     # -- image loading ------------------------------------------------------
 
-    def _load_pixmap(self, path: str, max_dim: int = MAX_DISPLAY_DIM):
-        key = (path, max_dim)
-        cached = self._pixmap_cache.get(key)
-        if cached is not None:
-            return cached
-        reader = QtGui.QImageReader(path)
-        reader.setAutoTransform(True)
-        size = reader.size()
-        if size.isValid() and (size.width() > max_dim or size.height() > max_dim):
+    def _open_thumbnail_cache(self) -> Optional[ThumbnailCache]:
+        budget = self.settings.value("cache/thumbnail_mb", 512, int) * 1024 ** 2
+        try:
+            return ThumbnailCache(budget=budget)
+        except (OSError, sqlite3.Error) as exc:
+            print(f"Thumbnail cache unavailable: {exc}")
+            return None
+
+    def _embedded_preview(self, path: str, max_dim: int) -> QtGui.QImage:
+        """The embedded preview of ``path`` if it is big enough, else a null image."""
+        thumb = read_thumbnail(path)
+        if thumb is None or max(thumb.width, thumb.height) < max_dim * EMBEDDED_MIN_FRACTION:
+            return QtGui.QImage()
+        full = QtGui.QImageReader(path).size()
+        if not full.isEmpty():
+            # Both sizes are as stored, before orientation.
+            ratio = (thumb.width * full.height()) / (thumb.height * full.width())
+            if abs(ratio - 1.0) > EMBEDDED_ASPECT_TOLERANCE:
+                return QtGui.QImage()
+        buffer = QtCore.QBuffer()
+        buffer.setData(thumb.data)
+        reader = QtGui.QImageReader(buffer, b"jpeg")
+        size = QtCore.QSize(thumb.width, thumb.height)
+        if thumb.width > max_dim or thumb.height > max_dim:
             size.scale(max_dim, max_dim, QtCore.Qt.KeepAspectRatio)
             reader.setScaledSize(size)
         image = reader.read()
+        return oriented(image, thumb.orientation) if not image.isNull() else image
+
+    @metrics.timed("app.load_pixmap")
+    def _load_pixmap(
+        self, path: str, max_dim: Optional[int] = None, embedded: bool = False, wait: bool = True
+    ) -> Optional[QtGui.QPixmap]:
+        """Display pixmap of ``path`` no larger than ``max_dim`` (the front card's size).
+
+        Comes from the in-memory cache, else from the decode pipeline (see
+        ``_decode_image``). Without ``wait``, returns None while the decode
+        is still queued or running; ``_on_decoded`` follows up.
+        """
+        key = (path, max_dim or self._display_dim, embedded)
+        cached = self._pixmap_cache.get(key)
+        if cached is not None:
+            metrics.count("app.pixmap.memory_hits")
+            return cached
+        if not wait and not self._decoder.ready(key):
+            self._decoder.request(key)
+            return None
+        image = self._decoder.take(key)
         pixmap = QtGui.QPixmap.fromImage(image) if not image.isNull() else QtGui.QPixmap()
-        if len(self._pixmap_cache) > 8:
-            self._pixmap_cache.clear()
-        self._pixmap_cache[key] = pixmap
+        self._pixmap_cache.put(key, pixmap)
         return pixmap
 
-    def _upcoming_pixmaps(self):
+    @metrics.timed("app.decode")
+    def _decode_image(self, path: str, max_dim: int, embedded: bool) -> QtGui.QImage:
+        """Decode ``path`` to at most ``max_dim``; runs on the pipeline's workers.
+
+        Tries, in order: the embedded EXIF preview (with ``embedded``, for
+        back cards), the on-disk thumbnail cache, and a scaled decode of the
+        file. Touches nothing but thread-safe state.
+        """
+        start = time.perf_counter()
+        image = self._embedded_preview(path, max_dim) if embedded else QtGui.QImage()
+        if not image.isNull():
+            metrics.count("app.pixmap.embedded_hits")
+        data = None
+        if image.isNull() and self.thumbnails is not None:
+            data = self.thumbnails.get(path, max_dim)
+        if data is not None:
+            image.loadFromData(data)
+            metrics.count("app.pixmap.disk_hits")
+        if image.isNull():
+            metrics.count("app.pixmap.decodes")
+            reader = QtGui.QImageReader(path)
+            reader.setAutoTransform(True)
+            size = reader.size()
+            scaled = size.isValid() and (size.width() > max_dim or size.height() > max_dim)
+            if scaled:
+                size.scale(max_dim, max_dim, QtCore.Qt.KeepAspectRatio)
+                reader.setScaledSize(size)
+            image = reader.read()
+            # Small originals decode as fast as a thumbnail would.
+            if scaled and not image.isNull() and self.thumbnails is not None:
+                self._thumb_writer.submit(self._store_preview, path, max_dim, image)
+        self._planner.note_decode(
+            decode_category(path, max_dim), time.perf_counter() - start, image_bytes(image)
+        )
+        return image
+
+    def _store_preview(self, path: str, max_dim: int, image: QtGui.QImage):
+        try:
+            self.thumbnails.put(path, max_dim, encode_preview(image))
+        except Exception as exc:
+            print(f"Could not cache preview of {path}: {exc}")
+
+    def _upcoming_keys(self) -> list:
+        """Pixmap keys of the back cards (previews of the next two photos)."""
         if not self.backend:
             return []
+        paths = [self.backend.get_image(self.current_index + offset) for offset in (1, 2)]
+        return [(path, self._preview_dim, True) for path in paths if path]
+
+    def _upcoming_pixmaps(self):
+        # Never blocks: a back card still decoding is added by _on_decoded.
         out = []
-        for offset in (1, 2):
-            path = self.backend.get_image(self.current_index + offset)
-            if path:
-                pixmap = self._load_pixmap(path, MAX_PREVIEW_DIM)
-                if not pixmap.isNull():
-                    out.append(pixmap)
+        for key in self._upcoming_keys():
+            pixmap = self._load_pixmap(*key, wait=False)
+            if pixmap is not None and not pixmap.isNull():
+                out.append(pixmap)
         return out
 
-    def _set_meta_for(self, path: str):
-        parts = []
-        try:
-            stat = os.stat(path)
-            pixmap = self._pixmap_cache.get((path, MAX_DISPLAY_DIM))
+    def _prefetch(self):
+        """Queue decodes around the cursor; anything no longer needed is cancelled.
+
+        A front card shown as a proxy comes first, then the back-card
+        previews, then the full-size photos ahead, then the one behind (a
+        skipped photo is back there after a re-sort).
+        Photos left by keep/delete need no decode: ``_behind`` keeps their
+        pixmaps for undo. The front and back cards are pinned in the cache.
+
+        How many photos ahead, and on how many workers, comes from
+        ``_planner``: enough to stay a second ahead of the user's recent
+        pace, given what photos like the next one have taken to decode.
+        """
+        if not self.backend:
+            return
+        keys = self._upcoming_keys()
+        front = [(self.current_path, self._display_dim, False)] if self.current_path else []
+        self._pixmap_cache.pin("cards", front + keys)
+        if self._proxy_path:
+            keys = front + keys
+        upcoming = self.backend.get_image(self.current_index + 1)
+        ahead, workers = self._planner.plan(
+            decode_category(upcoming or "", self._display_dim), self._pixmap_cache.budget
+        )
+        self._decoder.workers = workers
+        for offset in [*range(1, ahead + 1), -1]:
+            index = self.current_index + offset
+            path = self.backend.get_image(index) if index >= 0 else None
+            if path:
+                keys.append((path, self._display_dim, False))
+        self._decoder.want(k for k in keys if k not in self._pixmap_cache)
+
+    def _decode_dims(self) -> tuple:
+        """(front card, back card) decode sizes for the deck as laid out now."""
+        if not self.deck.isVisible():
+            return DEFAULT_DISPLAY_DIM, round(DEFAULT_DISPLAY_DIM * PREVIEW_SCALE)
+        card, dpr = self.deck.card_size(), self.deck.devicePixelRatioF()
+        return decode_dim(card, dpr), decode_dim(card, dpr, PREVIEW_SCALE)
+
+    def _update_decode_dims(self):
+        """Re-decode the cards on screen if the deck's size or density changed.
+
+        What is shown stays up until the new decodes replace it.
+        """
+        dims = self._decode_dims()
+        if dims == (self._display_dim, self._preview_dim):
+            return
+        self._display_dim, self._preview_dim = dims
+        if not self.current_path:
+            return
+        pixmap = self._pixmap_cache.peek((self.current_path, self._display_dim, False))
+        if pixmap is not None:
+            self.deck.replace_image(pixmap)
+        else:
+            self._proxy_path = self.current_path
+        self._prefetch()
+
+    def _on_decoded(self, key: tuple):
+        front = (self.current_path, self._display_dim, False)
+        if self._proxy_path and self._proxy_path == self.current_path and key == front:
+            self._proxy_path = None
+            pixmap = self._load_pixmap(*key)
+            if not pixmap.isNull():
+                self.deck.replace_image(pixmap)
+            if self._placeholder:
+                self._placeholder = False
+                if pixmap.isNull():
+                    self._note_unreadable(self.current_path)
+                    self.load_next_image()
+                    return
+                self.update_controls(True)
+        if key in self._upcoming_keys() and self.current_path:
+            self.deck.set_upcoming(self._upcoming_pixmaps())
+
+    def _proxy_pixmap(self, path: str) -> Optional[QtGui.QPixmap]:
+        """A quick stand-in for the front card while its full decode runs.
+
+        Tries, in order: the back-card preview already in memory, the EXIF
+        preview, the on-disk preview, and for JPEGs a DCT-scaled decode
+        (libjpeg decodes 1/8 of the pixels or fewer). None if none of them
+        is cheap for this file.
+        """
+        pixmap = self._pixmap_cache.peek((path, self._preview_dim, True))
+        if pixmap is None:
+            image = self._decode_proxy(path)
+            pixmap = QtGui.QPixmap.fromImage(image) if not image.isNull() else None
+        if pixmap is not None:
+            metrics.count("app.pixmap.proxies")
+        return pixmap
+
+    def _placeholder_pixmap(self, path: str) -> QtGui.QPixmap:
+        """A blank card in the shape of ``path``, from its header alone."""
+        reader = QtGui.QImageReader(path)
+        size = reader.size()
+        if not size.isValid():
+            size = QtCore.QSize(PLACEHOLDER_DIM, PLACEHOLDER_DIM)
+        elif reader.transformation() & QtGui.QImageIOHandler.TransformationRotate90:
+            size.transpose()
+        size.scale(PLACEHOLDER_DIM, PLACEHOLDER_DIM, QtCore.Qt.KeepAspectRatio)
+        pixmap = QtGui.QPixmap(size.expandedTo(QtCore.QSize(1, 1)))
+        pixmap.fill(QtGui.QColor(PALETTE["surface"]))
+        metrics.count("app.pixmap.placeholders")
+        return pixmap
+
+    @metrics.timed("app.decode_proxy")
+    def _decode_proxy(self, path: str) -> QtGui.QImage:
+        image = self._embedded_preview(path, PROXY_DIM)
+        if image.isNull() and self.thumbnails is not None:
+            data = self.thumbnails.get(path, self._preview_dim)
+            if data is not None:
+                image.loadFromData(data)
+        if image.isNull():
             reader = QtGui.QImageReader(path)
             size = reader.size()
-            if size.isValid():
-                parts.append(f"{size.width()} × {size.height()} px")
-            elif pixmap is not None and not pixmap.isNull():
-                parts.append(f"{pixmap.width()} × {pixmap.height()} px")
-            parts.append(human_size(stat.st_size))
-            parts.append(datetime.fromtimestamp(stat.st_mtime).strftime("%b %d, %Y"))
-        except OSError:
-            pass
+            if reader.format() == b"jpeg" and max(size.width(), size.height()) > 2 * PROXY_DIM:
+                reader.setAutoTransform(True)
+                size.scale(PROXY_DIM, PROXY_DIM, QtCore.Qt.KeepAspectRatio)
+                reader.setScaledSize(size)
+                image = reader.read()
+        return image
+
+    def _remember_behind(self, src: str, dest: str):
+        """Pin the pixmap of a photo just kept or deleted, for its undo."""
+        key = (src, self._display_dim, False)
+        if key in self._pixmap_cache:
+            self._behind[dest] = key
+            while len(self._behind) > PREFETCH_BEHIND:
+                self._behind.popitem(last=False)
+            self._pixmap_cache.pin("behind", self._behind.values())
+
+    @metrics.timed("app.set_meta")
+    def _set_meta_for(self, path: str):
+        parts = []
+        meta = self.backend.metadata(path) if self.backend else None
+        if meta is not None:
+            if meta.width and meta.height:
+                parts.append(f"{meta.width} × {meta.height} px")
+            parts.append(human_size(meta.size))
+            taken = meta.captured if meta.captured is not None else meta.mtime_ns / 1e9
+            parts.append(datetime.fromtimestamp(taken).strftime("%b %d, %Y"))
         if self.backend:
             position = self.backend.processed_count() + 1
-            parts.append(f"{position} of {self.backend.total_images}")
+            parts.append(f"{position} of {self._total_text()}")
         self.meta_label.setText("   ·   ".join(parts))
 
+    def _display_name(self, path: str) -> str:
+        # Subfolder scans show where the photo lives, not just its name.
+        if self.backend and self.backend.recursive:
+            return os.path.relpath(path, self.backend.images_dir)
+        return os.path.basename(path)
+
+    def _total_text(self) -> str:
+        # While the folder is still streaming in, the total is a lower bound.
+        total = self.backend.total_images
+        return str(total) if self.backend.scan_complete else f"{total}+"
+
     # -- directory handling ---------------------------------------------
 
     def choose_directory(self):
@@ -430,27 +818,126 @@ class ImageSwiper(QtWidgets.QWidget):
         if last_dir and os.path.isdir(last_dir):
             self.load_directory(last_dir)
 
-    def load_directory(self, directory: str):
-        self.backend = ImageBackend(directory)
-        self.history.clear()
+    def load_directory(self, directory: str, where: Optional[str] = None):
+        """Open ``directory``; ``where`` limits the session to a filter expression.
+
+        Raises FilterError for a bad expression, before the current session
+        is closed.
+        """
+        session_filter = Filter(where) if where else None
+        self._cancel_analysis()
+        if self.backend is not None:
+            self.backend.close()
+        self.backend = ImageBackend(
+            directory,
+            stream=True,
+            on_scan_progress=self._backend_signals.scan_progress.emit,
+            on_scan_complete=self._backend_signals.scan_complete.emit,
+            async_moves=True,
+            on_move_done=self._backend_signals.move_done.emit,
+            journal=True,
+            recursive=self.settings.value("scan/recursive", False, bool),
+            layout=self.settings.value("scan/layout", "mirror", str),
+            watch=True,
+            on_folder_change=self._backend_signals.folder_changed.emit,
+            index=True,
+            filter=session_filter,
+            dest_root=self.settings.value("moves/dest_root", "", str) or None,
+            verify_moves=self.settings.value("moves/verify", False, bool),
+            on_move_progress=self._backend_signals.move_progress.emit,
+        )
+        self._waiting_for_scan = False
+        self.history = self.backend.resumed_history()
         self.current_index = -1
         self.current_path = None
         self.kept_count = 0
         self.deleted_count = 0
         self.skipped_count = 0
+        resumed = self.backend.resume_state
+        if resumed is not None:
+            self.kept_count, self.deleted_count = resumed.counts()
+            self.skipped_count = resumed.skipped
+            self.current_index = self.backend.resume_index() - 1
         self._pixmap_cache.clear()
+        self._decoder.clear()
+        self._behind.clear()
+        self._proxy_path = None
+        self._placeholder = False
+        self._pixmap_cache.pin("behind", ())
         self.action_label.setText("No actions yet.")
         self.finish_button.hide()
-        self.folder_chip.setText(os.path.basename(directory) or directory)
+        name = os.path.basename(directory) or directory
+        self.folder_chip.setText(f"{name} · {where}" if where else name)
         self.settings.setValue("session/last_dir", directory)
         self._update_stats()
 
+        if resumed is not None:
+            self.action_label.setText(
+                f"Resumed session: {self.kept_count} kept · {self.deleted_count} deleted"
+            )
+            self.toast.popup("Resumed where you left off")
+        elif self.backend.scan_complete:
+            self._announce_loaded()
+        if self.backend.scan_complete:
+            self._start_analysis()
+        self._set_status("Ready", "active")
+        self.load_next_image()
+
+    def _announce_loaded(self):
         total = self.backend.total_images
         if total:
             self.toast.popup(f"Loaded {total} photo(s)")
             self.sound.play("open")
-        self._set_status("Ready", "active")
-        self.load_next_image()
+
+    def _on_scan_progress(self, total: int):
+        if not self.backend:
+            return
+        if self._waiting_for_scan:
+            self._waiting_for_scan = False
+            self.load_next_image(advance_index=False)
+            return
+        self.update_progress()
+        if self.current_path:
+            self._prefetch()
+            self.deck.set_upcoming(self._upcoming_pixmaps())
+            self._set_meta_for(self.current_path)
+
+    def _on_scan_complete(self, total: int):
+        if not self.backend:
+            return
+        self._announce_loaded()
+        self._start_analysis()
+        self._on_scan_progress(total)
+
+    def _on_folder_changed(self, added: list, removed: list):
+        if not self.backend:
+            return
+        if self._waiting_for_scan:
+            self._waiting_for_scan = False
+            self.load_next_image(advance_index=False)
+            return
+        if added:
+            self.toast.popup(f"{len(added)} new photo(s)")
+        if self.current_path is None:
+            # Everything was sorted; photos copied in since reopen the session.
+            positions = [self.backend.index_of_image(p) for p in added]
+            positions = [p for p in positions if p >= 0]
+            if positions:
+                self.current_index = min(positions)
+                self.finish_button.hide()
+                self.load_next_image(advance_index=False)
+            return
+        if self.current_path in removed:
+            self.action_label.setText(
+                f"{os.path.basename(self.current_path)} was removed from the folder"
+            )
+            self.current_index = self.backend.position_of(self.current_path)
+            self.load_next_image(advance_index=False)
+            return
+        self._resync_cursor()
+        self._prefetch()
+        self.deck.set_upcoming(self._upcoming_pixmaps())
+        self._set_meta_for(self.current_path)
 
     # -- drag & drop -------------------------------------------------------
 
@@ -480,6 +967,7 @@ class ImageSwiper(QtWidgets.QWidget):
 
     # -- core flow -----------------------------------------------------------
 
+    @metrics.timed("app.load_next_image")
     def load_next_image(self, advance_index=True):
         if not self.backend:
             return
@@ -490,26 +978,67 @@ class ImageSwiper(QtWidgets.QWidget):
         while True:
             img_path = self.backend.get_image(self.current_index)
             if not img_path:
+                if not self.backend.scan_complete:
+                    self._wait_for_scan()
+                    return
                 self._on_session_complete()
                 return
 
-            pixmap = self._load_pixmap(img_path)
-            if not pixmap.isNull():
+            # Show what is ready now, else a proxy, else a blank card; the
+            # full decode replaces either when it arrives (_on_decoded). The
+            # GUI thread never waits for a decode here.
+            pixmap = self._load_pixmap(img_path, wait=False)
+            if pixmap is None or not pixmap.isNull():
+                proxy = self._proxy_pixmap(img_path) if pixmap is None else None
                 self.current_path = img_path
-                self.deck.set_image(pixmap)
+                self._proxy_path = img_path if pixmap is None else None
+                self._placeholder = pixmap is None and proxy is None
+                if self._placeholder:
+                    proxy = self._placeholder_pixmap(img_path)
+                self.deck.set_image(proxy if pixmap is None else pixmap)
+                self._prefetch()
                 self.deck.set_upcoming(self._upcoming_pixmaps())
-                self.file_label.setText(os.path.basename(img_path))
+                self.file_label.setText(self._display_name(img_path))
                 self._set_meta_for(img_path)
+                self._show_duplicate_hint(img_path)
+                self._show_quality_for(img_path)
                 self._set_status("Ready", "active")
                 self.update_progress()
-                self.update_controls(True)
+                self.update_controls(not self._placeholder)
                 return
 
-            self.action_label.setText(
-                f"Skipped unreadable file: {os.path.basename(img_path)}"
-            )
+            self._note_unreadable(img_path)
             self.current_index += 1
 
+    def _settle_front(self) -> bool:
+        """Finish the front card's decode if it is still a blank card.
+
+        Only waits when the user acts on a photo before it appeared (keys
+        pressed ahead of the decode). False if it turned out unreadable;
+        the next photo is then loaded instead and the action is dropped.
+        """
+        if not self._placeholder:
+            return True
+        key = (self.current_path, self._display_dim, False)
+        pixmap = self._load_pixmap(*key)
+        self._on_decoded(key)
+        return not pixmap.isNull()
+
+    def _note_unreadable(self, path: str):
+        self.action_label.setText(f"Skipped unreadable file: {os.path.basename(path)}")
+        metrics.count("app.unreadable_skipped")
+
+    def _wait_for_scan(self):
+        # The cursor ran past what the background scan has published so far;
+        # _on_scan_progress picks up from the same index once more arrive.
+        self._waiting_for_scan = True
+        self.current_path = None
+        self.deck.set_message("Scanning folder…", f"{self.backend.total_images} photo(s) found so far")
+        self._set_status("Scanning", "info")
+        self.file_label.clear()
+        self.update_progress()
+        self.update_controls(False)
+
     def _on_session_complete(self):
         self.current_path = None
         summary = (
@@ -533,7 +1062,7 @@ class ImageSwiper(QtWidgets.QWidget):
             self.delete_current()
 
     def keep_current(self):
-        if not self.backend or not self.current_path:
+        if not self.backend or not self.current_path or not self._settle_front():
             return
         dest = self.backend.keep(self.current_path)
         if not dest:
@@ -541,6 +1070,8 @@ class ImageSwiper(QtWidgets.QWidget):
             self._set_status("Move failed", "error")
             return
         self.history.append(("keep", dest))
+        self._remember_behind(self.current_path, dest)
+        self._planner.note_action()
         self.kept_count += 1
         name = os.path.basename(dest)
         self.action_label.setText(f"Kept {name}")
@@ -552,7 +1083,7 @@ class ImageSwiper(QtWidgets.QWidget):
         self.load_next_image()
 
     def delete_current(self):
-        if not self.backend or not self.current_path:
+        if not self.backend or not self.current_path or not self._settle_front():
             return
         dest = self.backend.delete(self.current_path)
         if not dest:
@@ -560,6 +1091,8 @@ class ImageSwiper(QtWidgets.QWidget):
             self._set_status("Move failed", "error")
             return
         self.history.append(("delete", dest))
+        self._remember_behind(self.current_path, dest)
+        self._planner.note_action()
         self.deleted_count += 1
         name = os.path.basename(dest)
         self.action_label.setText(f"Deleted {name}")
@@ -570,9 +1103,276 @@ class ImageSwiper(QtWidgets.QWidget):
         self.current_index -= 1
         self.load_next_image()
 
-    def skip_current(self):
+    # -- background analysis -------------------------------------------------
+
+    def _start_analysis(self):
+        """Look for exact copies, score every photo and apply the chosen order.
+
+        Runs once the scan is complete.
+        """
+        self._start_duplicate_scan()
+        self._start_quality_scan()
+        if not self._worst_first and self.settings.value("queue/order", "name", str) != "name":
+            self._start_ordering()
+
+    def _cancel_analysis(self):
+        self._cancel_duplicate_scan()
+        self._cancel_quality_scan()
+        self._cancel_ordering()
+
+    # -- exact duplicates ----------------------------------------------------
+
+    def _start_duplicate_scan(self):
+        self._cancel_duplicate_scan()
+        backend = self.backend
+        cancel = threading.Event()
+        self._duplicates_cancel = cancel
+
+        def run():
+            try:
+                groups = backend.exact_duplicate_groups(cancel=cancel)
+            except Exception as exc:
+                print(f"Duplicate scan failed: {exc}")
+                return
+            if not cancel.is_set():
+                self._backend_signals.duplicates_found.emit(backend, groups)
+
+        threading.Thread(target=run, name="duplicates", daemon=True).start()
+
+    def _cancel_duplicate_scan(self):
+        if self._duplicates_cancel is not None:
+            self._duplicates_cancel.set()
+            self._duplicates_cancel = None
+        self._duplicates = {}
+
+    def _on_duplicates_found(self, backend, groups):
+        if backend is not self.backend:
+            return
+        self._duplicates = {path: group for group in groups for path in group}
+        if groups:
+            extra = sum(len(group) - 1 for group in groups)
+            self.toast.popup(f"{extra} identical cop{'y' if extra == 1 else 'ies'} found")
+        if self.current_path:
+            self._show_duplicate_hint(self.current_path)
+
+    def _other_copies(self, path: str) -> list:
+        return [
+            p for p in self._duplicates.get(path, ())
+            if p != path and self.backend.index_of_image(p) >= 0
+        ]
+
+    def _show_duplicate_hint(self, path: str):
+        copies = self._other_copies(path)
+        if copies:
+            self.action_label.setText(
+                f"{len(copies)} identical cop{'y' if len(copies) == 1 else 'ies'} "
+                "in this folder — press D to delete all but this one"
+            )
+
+    def delete_duplicates(self):
+        """Delete every other byte-identical copy of the photo on screen."""
         if not self.backend or not self.current_path:
             return
+        copies = self._other_copies(self.current_path)
+        if not copies:
+            self.toast.popup("No identical copies")
+            return
+        deleted = 0
+        for path in copies:
+            dest = self.backend.delete(path)
+            if dest:
+                self.history.append(("delete", dest))
+                self._remember_behind(path, dest)
+                self._planner.note_action()
+                deleted += 1
+        self.deleted_count += deleted
+        self.action_label.setText(
+            f"Deleted {deleted} cop{'y' if deleted == 1 else 'ies'} of "
+            f"{os.path.basename(self.current_path)}"
+        )
+        self.toast.popup(f"✕ Deleted {deleted} duplicate(s)")
+        self.sound.play("delete")
+        self._update_stats()
+        self._resync_cursor()
+        self._prefetch()
+        self.deck.set_upcoming(self._upcoming_pixmaps())
+        self._set_meta_for(self.current_path)
+
+    # -- quality scores --------------------------------------------------------
+
+    def _start_quality_scan(self):
+        self._cancel_quality_scan()
+        backend = self.backend
+        cancel = threading.Event()
+        self._quality_cancel = cancel
+
+        def run():
+            try:
+                scores = backend.quality_scores(cancel=cancel)
+            except Exception as exc:
+                print(f"Quality scoring failed: {exc}")
+                return
+            if not cancel.is_set():
+                self._backend_signals.quality_scored.emit(backend, scores)
+
+        threading.Thread(target=run, name="quality", daemon=True).start()
+
+    def _cancel_quality_scan(self):
+        if self._quality_cancel is not None:
+            self._quality_cancel.set()
+            self._quality_cancel = None
+        self._quality = {}
+
+    def _on_quality_scored(self, backend, scores):
+        if backend is not self.backend:
+            return
+        self._quality = scores
+        if self._worst_first:
+            self._apply_sort()
+        elif self.current_path:
+            self._show_quality_for(self.current_path)
+
+    def _show_quality_for(self, path: str):
+        scores = self._quality.get(path)
+        if scores is None:
+            self.quality_chip.hide()
+            return
+        score = quality_score(scores)
+        self.quality_chip.setText(" · ".join([f"Quality {score}"] + quality_issues(scores)))
+        if score < 40:
+            style = "background: rgba(244, 81, 108, 0.16); border-color: rgba(244, 81, 108, 0.55);"
+        elif score < 70:
+            style = f"background: {PALETTE['surface']};"
+        else:
+            style = "background: rgba(45, 212, 119, 0.16); border-color: rgba(45, 212, 119, 0.55);"
+        self.quality_chip.setStyleSheet(style)
+        self.quality_chip.show()
+
+    def _worst_first_key(self):
+        ranks = {path: quality_score(scores) for path, scores in self._quality.items()}
+        # Photos without a score (unreadable, or added since) go last.
+        return lambda path: ranks.get(path, 101)
+
+    # -- queue order ---------------------------------------------------------
+
+    def _apply_sort(self):
+        if not self.backend:
+            return
+        self._cancel_ordering()
+        if self._worst_first and self._quality:
+            self.backend.sort_queue(self._worst_first_key())
+            self._restart_queue()
+        else:
+            self._start_ordering()
+
+    def _start_ordering(self):
+        order = self.settings.value("queue/order", "name", str)
+        if order not in ImageBackend.ORDERS:
+            order = "name"
+        backend = self.backend
+        if order in ("name", "natural"):
+            # Nothing to read from disk: cheap enough to do right here.
+            backend.set_order(order)
+            self._restart_queue()
+            return
+        cancel = threading.Event()
+        self._order_cancel = cancel
+
+        def run():
+            try:
+                done = backend.set_order(order, cancel=cancel)
+            except Exception as exc:
+                print(f"Sorting failed: {exc}")
+                return
+            if done and not cancel.is_set():
+                self._backend_signals.order_applied.emit(backend)
+
+        threading.Thread(target=run, name="order", daemon=True).start()
+
+    def _cancel_ordering(self):
+        if self._order_cancel is not None:
+            self._order_cancel.set()
+            self._order_cancel = None
+
+    def _on_order_applied(self, backend):
+        if backend is not self.backend:
+            return
+        self._order_cancel = None
+        self._restart_queue()
+
+    def _restart_queue(self):
+        # After a re-sort the queue is shown from the top, so photos that
+        # moved in front of the cursor are not passed over.
+        self.current_index = 0
+        if self.current_path is not None:
+            self.load_next_image(advance_index=False)
+
+    def toggle_worst_first(self):
+        """Sort the remaining photos by quality score, lowest first (or back to the chosen order)."""
+        self._worst_first = not self._worst_first
+        if self._worst_first and not self._quality:
+            self.toast.popup("Worst first — once scoring finishes")
+            return
+        order = self.settings.value("queue/order", "name", str)
+        self.toast.popup("Worst first" if self._worst_first else f"Order: {ORDER_LABELS.get(order, order)}")
+        self._apply_sort()
+
+    def cycle_order(self):
+        """Switch to the next queue order (name, natural, capture time, size, date modified)."""
+        orders = ImageBackend.ORDERS
+        current = self.settings.value("queue/order", "name", str)
+        order = orders[(orders.index(current) + 1) % len(orders)] if current in orders else "name"
+        self.settings.setValue("queue/order", order)
+        self._worst_first = False
+        self.toast.popup(f"Order: {ORDER_LABELS[order]}")
+        self._apply_sort()
+
+    def _on_move_done(self, src: str, dest: str, error: str):
+        if not error or not self.backend:
+            return
+        # The move was undone before the failure arrived; nothing to roll back.
+        entry = next((h for h in reversed(self.history) if h[1] == dest), None)
+        if entry is None:
+            return
+        self.history.remove(entry)
+        action = entry[0]
+        if action == "keep":
+            self.kept_count = max(0, self.kept_count - 1)
+        elif action == "delete":
+            self.deleted_count = max(0, self.deleted_count - 1)
+        self._update_stats()
+        self.action_label.setText(f"{action.capitalize()} failed: {error}")
+        self._set_status("Move failed", "error")
+        # The backend put the file back in the queue; show it again.
+        idx = self.backend.index_of_image(src)
+        if idx >= 0:
+            self.current_index = idx - 1
+            self.finish_button.hide()
+            self.load_next_image()
+        else:
+            self._resync_cursor()
+
+    def _on_move_progress(self, src: str, copied: int, total: int):
+        # Only cross-device copies report progress (kept/ or deleted/ on
+        # another drive, see the moves/dest_root setting).
+        if copied < total:
+            self._set_status(f"Copying {os.path.basename(src)} {100 * copied // max(1, total)}%", "active")
+        else:
+            self._set_status("Ready", "active")
+
+    def _resync_cursor(self):
+        """Re-point current_index at current_path after the queue changed under it."""
+        if self.current_path:
+            idx = self.backend.index_of_image(self.current_path)
+            if idx >= 0:
+                self.current_index = idx
+        self.update_progress()
+
+    def skip_current(self):
+        if not self.backend or not self.current_path or not self._settle_front():
+            return
+        self.backend.skip(self.current_path)
+        self._planner.note_action()
         self.skipped_count += 1
         self.action_label.setText(f"Skipped {os.path.basename(self.current_path)}")
         self.deck.fly_out("skip")
@@ -593,6 +1393,11 @@ class ImageSwiper(QtWidgets.QWidget):
             self.kept_count = max(0, self.kept_count - 1)
         elif action == "delete":
             self.deleted_count = max(0, self.deleted_count - 1)
+        key = self._behind.pop(moved_path, None)
+        pixmap = self._pixmap_cache.peek(key) if key else None
+        if pixmap is not None:
+            self._pixmap_cache.put((restored, self._display_dim, False), pixmap)
+        self._pixmap_cache.pin("behind", self._behind.values())
         idx = self.backend.index_of_image(restored)
         if idx >= 0:
             self.current_index = idx - 1
@@ -615,7 +1420,7 @@ class ImageSwiper(QtWidgets.QWidget):
         processed = self.backend.processed_count()
         percent = int((processed / total) * 100) if total else 0
         self._animate_progress(percent)
-        self.progress_label.setText(f"{processed} / {total} sorted")
+        self.progress_label.setText(f"{processed} / {self._total_text()} sorted")
 
     def _animate_progress(self, value: int):
         if self._progress_anim is not None:
@@ -649,6 +1454,64 @@ class ImageSwiper(QtWidgets.QWidget):
         self.mute_button.setText(self._mute_glyph())
         self.toast.popup("Sound off" if self.sound.muted else "Sound on")
 
+    def export_metrics(self, path: Optional[str] = None) -> Optional[str]:
+        """Start recording hot-path timings, or write what was recorded so far.
+
+        The report goes to ``path``, else the ``PHOTO_DELETER_METRICS`` file,
+        else ``metrics.json`` in the cache directory.
+        """
+        if not metrics.enabled():
+            metrics.enable()
+            self.toast.popup("Recording timings · Ctrl+Shift+M again to save")
+            return None
+        path = path or metrics.export_path() or os.path.join(default_cache_dir(), "metrics.json")
+        try:
+            metrics.write(path)
+        except OSError as exc:
+            self.toast.popup(f"Could not save timings: {exc.strerror or exc}")
+            return None
+        self.toast.popup(f"Timings saved to {path}")
+        return path
+
+    def toggle_subfolders(self):
+        recursive = not self.settings.value("scan/recursive", False, bool)
+        self.settings.setValue("scan/recursive", recursive)
+        self.toast.popup("Including subfolders" if recursive else "Top folder only")
+        if self.backend is not None:
+            self.load_directory(self.backend.images_dir, self._filter_text())
+
+    def _filter_text(self) -> Optional[str]:
+        if self.backend is None:
+            return None
+        return getattr(self.backend.filter, "text", None)
+
+    def filter_folder(self):
+        """Ask for a filter expression and reopen the folder with it."""
+        if self.backend is None:
+            return
+        text, ok = QtWidgets.QInputDialog.getText(
+            self,
+            "Filter",
+            "Only show photos where (empty for all), e.g. size > 8MB and year = 2019:",
+            text=self._filter_text() or "",
+        )
+        if ok:
+            self.apply_filter(text)
+
+    def apply_filter(self, text: str) -> bool:
+        """Reopen the folder limited to ``text``; False if it does not parse."""
+        if self.backend is None:
+            return False
+        text = text.strip()
+        try:
+            self.load_directory(self.backend.images_dir, text or None)
+        except FilterError as exc:
+            self.toast.popup(f"Filter: {exc}")
+            return False
+        if text:
+            self.toast.popup(f"{self.backend.total_images} photo(s) match")
+        return True
+
     def _mute_glyph(self) -> str:
         return "🔇" if self.sound.muted else "🔊"
 
@@ -689,29 +1552,109 @@ class ImageSwiper(QtWidgets.QWidget):
         dlg = FinishDialog(self, kept, deleted)
         if dlg.exec_() != QtWidgets.QDialog.Accepted:
             return
-        deleted_n = 0
-        restored_n = 0
-        if dlg.delete_confirmed:
-            deleted_n = self.backend.finish_delete()
-        if dlg.restore_confirmed:
-            restored_n = self.backend.finish_restore_kept()
+
+        total = (len(deleted) if dlg.delete_confirmed else 0) + (
+            len(kept) if dlg.restore_confirmed else 0
+        )
+        cancel = threading.Event()
+        progress = QtWidgets.QProgressDialog("Finishing session…", "Cancel", 0, max(1, total), self)
+        progress.setWindowTitle("Finish Session")
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(400)
+        progress.canceled.connect(cancel.set)
+        self._finish_progress = progress
+        self.finish_button.setEnabled(False)
+        self._set_status("Finishing…", "active")
+
+        backend = self.backend
+        signals = self._backend_signals
+
+        def run():
+            # Runs on a plain thread; results come back through signals.
+            base = 0
+
+            def report(result):
+                signals.finish_progress.emit(base + result.done, result.bytes)
+
+            deleted_result = restored_result = None
+            if dlg.delete_confirmed:
+                deleted_result = backend.finish_delete(progress=report, cancel=cancel)
+                base = deleted_result.done
+            if dlg.restore_confirmed and not cancel.is_set():
+                restored_result = backend.finish_restore_kept(progress=report, cancel=cancel)
+            signals.finish_done.emit(deleted_result, restored_result)
+
+        threading.Thread(target=run, name="finish-session", daemon=True).start()
+
+    def _on_finish_progress(self, done: int, freed: int):
+        progress = self._finish_progress
+        if progress is None:
+            return
+        progress.setValue(min(done, progress.maximum()))
+        if freed:
+            progress.setLabelText(f"Finishing session…  {human_size(freed)} freed")
+
+    def _on_finish_done(self, deleted_result, restored_result):
+        if self._finish_progress is not None:
+            self._finish_progress.reset()
+            self._finish_progress = None
+        self.finish_button.setEnabled(True)
 
         parts = []
-        if deleted_n:
-            parts.append(f"{deleted_n} photo(s) permanently deleted")
-        if restored_n:
-            parts.append(f"{restored_n} photo(s) restored")
+        errors = 0
+        cancelled = False
+        if deleted_result is not None:
+            errors += len(deleted_result.errors)
+            cancelled |= deleted_result.cancelled
+            if deleted_result.done:
+                parts.append(
+                    f"{deleted_result.done} photo(s) permanently deleted "
+                    f"({human_size(deleted_result.bytes)})"
+                )
+        if restored_result is not None:
+            errors += len(restored_result.errors)
+            cancelled |= restored_result.cancelled
+            if restored_result.done:
+                parts.append(f"{restored_result.done} photo(s) restored")
+        if errors:
+            parts.append(f"{errors} error(s)")
         summary = " · ".join(parts) if parts else "No changes made."
-        self._set_status("Finished", "success")
+
+        if cancelled:
+            # Leave the journal and the Finish button so the user can resume.
+            self._set_status("Finish cancelled", "error")
+            self.action_label.setText(f"Cancelled — {summary}")
+            return
+
+        if self.backend is not None:
+            self.backend.end_session()
+        self._set_status("Finished", "success" if not errors else "error")
         self.action_label.setText(summary)
         self.deck.set_message("All done ✨", summary)
         self.finish_button.hide()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._screen_hooked and self.windowHandle() is not None:
+            # Moving to a screen with another pixel density resizes nothing.
+            self.windowHandle().screenChanged.connect(self._resize_timer.start)
+            self._screen_hooked = True
+
     def resizeEvent(self, event):
         super().resizeEvent(event)
         if self.toast.isVisible():
             self.toast._reposition()
 
+    def closeEvent(self, event):
+        self._cancel_analysis()
+        if self.backend is not None:
+            self.backend.close()
+        self._decoder.shutdown()
+        self._thumb_writer.shutdown(wait=True)
+        if self.thumbnails is not None:
+            self.thumbnails.close()
+        super().closeEvent(event)
+
 
 def main():
     QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True)
@@ -1,6 +1,115 @@
+import hashlib
+import math
 import os
-import shutil
-from typing import List, Optional
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import metrics
+from duplicates import (
+    DEFAULT_THRESHOLD,
+    MASK64,
+    compute_hashes,
+    exact_duplicate_groups,
+    group_near_duplicates,
+    to_signed,
+)
+from exif import read_exif
+from filters import Filter
+from journal import ResumeState, SessionJournal
+from metaindex import ImageMeta, MetadataIndex, read_metadata
+from moves import CANCELLED, FAILED, BulkResult, MoveExecutor, MoveJob, move_file, run_bulk
+from quality import Scores, compute_scores
+from sortedlist import IndexedSortedList
+from watcher import CREATED, DIR_REMOVED, REMOVED, FolderWatcher, create_watcher
+
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def natural_key(name: str) -> Tuple:
+    """Sort key that orders ``IMG_2`` before ``IMG_10``, ignoring case.
+
+    ``re.split`` puts text at even and numbers at odd positions, so two keys
+    never compare a str with an int.
+    """
+    parts = _DIGITS.split(name)
+    parts[1::2] = [int(p) for p in parts[1::2]]
+    parts[0::2] = [p.casefold() for p in parts[0::2]]
+    return tuple(parts)
+
+
+def source_id(images_dir: str) -> str:
+    """Stable, readable name for a source folder: ``<basename>-<hash of its path>``.
+
+    Folders sharing a ``dest_root`` each get their own subfolder under this
+    name, so one folder's Finish never touches another's photos.
+    """
+    path = os.path.abspath(images_dir)
+    digest = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=5).hexdigest()
+    return f"{os.path.basename(path) or 'root'}-{digest}"
+
+
+class _NameIndex:
+    """In-memory set of the names in one directory, for collision-free moves.
+
+    The directory is listed once with ``os.scandir`` on first use and then
+    kept current by the backend's own moves. ``reserve`` applies the
+    ``name``, ``name_1``, ``name_2`` ... policy against the set, using a
+    per-(stem, ext) next-suffix counter so repeated collisions do not walk
+    the suffixes from 1 every time.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._names = None
+        self._next_suffix = {}
+
+    def _loaded(self) -> set:
+        if self._names is None:
+            names = set()
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        names.add(entry.name)
+            except FileNotFoundError:
+                pass
+            self._names = names
+        return self._names
+
+    def reserve(self, filename: str) -> str:
+        """Claim the first free name for ``filename`` and return its full path."""
+        names = self._loaded()
+        if filename not in names:
+            names.add(filename)
+            return os.path.join(self.directory, filename)
+
+        base, ext = os.path.splitext(filename)
+        i = self._next_suffix.get((base, ext), 1)
+        while f"{base}_{i}{ext}" in names:
+            i += 1
+        new_name = f"{base}_{i}{ext}"
+        self._next_suffix[(base, ext)] = i + 1
+        names.add(new_name)
+        return os.path.join(self.directory, new_name)
+
+    def add(self, filename: str):
+        self._loaded().add(filename)
+
+    def release(self, filename: str):
+        """Forget ``filename`` after it left the directory (or was never used)."""
+        if self._names is None:
+            return
+        self._names.discard(filename)
+        # Let the freed suffix be handed out again so the policy stays
+        # "lowest free suffix", exactly as the stat-probing loop had it.
+        base, ext = os.path.splitext(filename)
+        stem, sep, number = base.rpartition("_")
+        if sep and number.isdigit() and (stem, ext) in self._next_suffix:
+            key = (stem, ext)
+            self._next_suffix[key] = min(self._next_suffix[key], int(number))
 
 
 class ImageBackend:
@@ -15,157 +124,1158 @@ class ImageBackend:
 
     SUPPORTED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
 
-    def __init__(self, images_dir: str):
+    # Streaming scan: the constructor returns as soon as this many images are
+    # found; the rest of the directory is read on a background thread and
+    # published in batches at most every SCAN_BATCH_INTERVAL seconds.
+    SCAN_FIRST_BATCH = 200
+    SCAN_BATCH_INTERVAL = 0.25
+    # Recursive scans list this many directories at once.
+    SCAN_WORKERS = 8
+
+    # Where keep/delete put files from subfolders in a recursive session:
+    # "mirror" recreates the subfolder under kept/ and deleted/, "flat"
+    # drops everything straight into the two buckets.
+    LAYOUTS = ("mirror", "flat")
+
+    # Queue orders for set_order(); "name" is the scan order. Keys for the
+    # others are computed up front on SORT_WORKERS threads.
+    ORDERS = ("name", "natural", "captured", "size", "mtime")
+    SORT_WORKERS = 8
+    SORT_BATCH = 256
+
+    def __init__(
+        self,
+        images_dir: str,
+        stream: bool = False,
+        on_scan_progress: Optional[Callable[[int], None]] = None,
+        on_scan_complete: Optional[Callable[[int], None]] = None,
+        async_moves: bool = False,
+        on_move_done: Optional[Callable[[str, str, str], None]] = None,
+        journal: bool = False,
+        recursive: bool = False,
+        layout: str = "mirror",
+        watch: bool = False,
+        on_folder_change: Optional[Callable[[List[str], List[str]], None]] = None,
+        index: bool = False,
+        filter: Union[str, Filter, Callable[[ImageMeta], bool], None] = None,
+        dest_root: Optional[str] = None,
+        verify_moves: bool = False,
+        on_move_progress: Optional[Callable[[str, int, int], None]] = None,
+        persist_index: bool = True,
+    ):
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"layout must be one of {self.LAYOUTS}, not {layout!r}")
+        # Raises FilterError before anything is created on disk.
+        self.filter = Filter(filter) if isinstance(filter, str) else filter
+        self._filter_text = self.filter.text if isinstance(self.filter, Filter) else None
         self.images_dir = os.path.abspath(images_dir)
-        self.kept_dir = os.path.join(self.images_dir, "kept")
-        self.deleted_dir = os.path.join(self.images_dir, "deleted")
-        os.makedirs(self.kept_dir, exist_ok=True)
-        os.makedirs(self.deleted_dir, exist_ok=True)
+        # kept/ and deleted/ live in this folder's own bucket under
+        # dest_root, which may be on another filesystem (e.g. a NAS); moves
+        # then copy via moves.move_file.
+        self.dest_root = (
+            os.path.join(os.path.abspath(dest_root), source_id(self.images_dir))
+            if dest_root else self.images_dir
+        )
+        self.kept_dir = os.path.join(self.dest_root, "kept")
+        self.deleted_dir = os.path.join(self.dest_root, "deleted")
+        self.verify_moves = verify_moves
+        self._on_move_progress = on_move_progress
+        self.recursive = recursive
+        self.layout = layout
+        # kept/ and deleted/ are created by the first move into them.
+        self._prefix = os.path.join(self.images_dir, "")
+
+        self._lock = threading.RLock()
+        # Every published scan batch gets a tier; _images is ordered by
+        # (tier, rank, path) so a late batch never lands in front of the
+        # cursor. Tier 0 is implicit and not stored. The rank comes from
+        # sort_queue() and is 0 in scan order.
+        self._tiers = {}
+        self._rank: Optional[Callable[[str], object]] = None
+        self._images = IndexedSortedList(key=self._sort_key)
+        self._next_tier = 0
+        self._total_images = 0
+        self._name_indexes = {}
+        # Folder each moved file came from, for undo and restore.
+        self._origins = {}
+        self._on_scan_progress = on_scan_progress
+        self._on_scan_complete = on_scan_complete
+        self._scan_done = threading.Event()
+        self._stop = threading.Event()
+        self._scan_thread = None
+        # With async_moves, keep/delete update the queue at once and the
+        # file itself is moved by the executor; _pending maps dest -> job.
+        self._executor = (
+            MoveExecutor(self._on_move_finished, move_func=self._move_file) if async_moves else None
+        )
+        self._pending = {}
+        self._on_move_done = on_move_done
+        # Optional session journal; _move_ids maps a moved file to the id of
+        # the journal record that put it there.
+        self._journal = SessionJournal(self.images_dir) if journal else None
+        self._move_ids = {}
+        self._next_move_id = 0
+        self.resume_state: Optional[ResumeState] = None
+        if self._journal is not None and self._executor is not None:
+            self._executor.before_job = self._before_move_job
+            self._executor.on_idle = self._on_moves_idle
+
+        # Optional live watcher; _expected holds paths our own undo/restore
+        # moves are about to create, so their events are not taken as new.
+        self._watcher: Optional[FolderWatcher] = None
+        self._expected = set()
+        self._on_folder_change = on_folder_change
+
+        # Optional persistent metadata index, brought up to date on a
+        # background thread once the scan is complete. A filter needs it.
+        # Without persist_index it lives in memory and nothing is written.
+        self.index = (
+            MetadataIndex(self.images_dir, persist=persist_index)
+            if index or self.filter is not None else None
+        )
+        self._index_thread = None
+        # Rows already indexed are matched by one SQL query up front;
+        # _apply_filter tests the rest in Python as the scan reaches them.
+        self._filter_hits = (
+            self.index.query(self.filter) if isinstance(self.filter, Filter) else None
+        )
+
+        resumed = self._journal is not None and self._resume()
+        # Started before the scan so nothing created meanwhile is missed;
+        # _publish drops paths the watcher already added.
+        if watch:
+            self._start_watching()
+        if self.index is not None:
+            self._index_thread = threading.Thread(
+                target=self._refresh_index, name="index-refresh", daemon=True
+            )
+        if not resumed and stream:
+            self._start_streaming_scan()
+        elif not resumed:
+            self._publish(self._scan_images())
+            self._finish_scan()
+        if self._index_thread is not None:
+            self._index_thread.start()
+
+    # -- scanning -------------------------------------------------------
 
-        self._images = self._scan_images()
-        self._total_images = len(self._images)
+    def _iter_image_paths(self) -> Iterator[str]:
+        """Yield supported image paths in directory order.
+
+        ``DirEntry.is_file`` answers from the cached ``d_type`` on most
+        platforms, so this costs no per-entry ``stat`` call.
+        """
+        if self.recursive:
+            yield from self._walk_image_paths()
+            return
+        with os.scandir(self.images_dir) as it:
+            for entry in it:
+                if self._stop.is_set():
+                    return
+                _, ext = os.path.splitext(entry.name)
+                if ext.lower() not in self.SUPPORTED_EXT:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                yield entry.path
+
+    def _scan_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """List one directory: ``(image paths, subdirectories to descend into)``.
+
+        Hidden folders and the session's own kept/ and deleted/ are skipped,
+        and directory symlinks are not followed.
+        """
+        images = []
+        subdirs = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                name = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not name.startswith(".") and entry.path not in (self.kept_dir, self.deleted_dir):
+                            subdirs.append(entry.path)
+                        continue
+                    _, ext = os.path.splitext(name)
+                    if ext.lower() in self.SUPPORTED_EXT and entry.is_file():
+                        images.append(entry.path)
+                except OSError:
+                    continue
+        return images, subdirs
+
+    def _walk_image_paths(self) -> Iterator[str]:
+        """Walk the tree on a pool of ``os.scandir`` workers.
+
+        Images are yielded per directory as soon as that directory has been
+        listed, so the streaming scan can publish them while deeper levels
+        are still being read.
+        """
+        with ThreadPoolExecutor(max_workers=self.SCAN_WORKERS, thread_name_prefix="scan") as pool:
+            pending = {pool.submit(self._scan_dir, self.images_dir)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if self._stop.is_set():
+                    for future in pending:
+                        future.cancel()
+                    return
+                for future in done:
+                    try:
+                        images, subdirs = future.result()
+                    except OSError as exc:
+                        print(f"Scan failed: {exc}")
+                        continue
+                    for subdir in subdirs:
+                        pending.add(pool.submit(self._scan_dir, subdir))
+                    yield from images
 
     def _scan_images(self) -> List[str]:
-        files = []
-        for entry in os.listdir(self.images_dir):
-            path = os.path.join(self.images_dir, entry)
-            if os.path.isfile(path):
-                _, ext = os.path.splitext(entry.lower())
-                if ext in self.SUPPORTED_EXT:
-                    files.append(path)
+        files = list(self._iter_image_paths())
         files.sort()
         return files
 
+    def _start_streaming_scan(self):
+        paths = self._iter_image_paths()
+        first = []
+        for path in paths:
+            first.append(path)
+            if len(first) >= self.SCAN_FIRST_BATCH:
+                break
+        else:
+            # Small directory: everything fit in the first batch.
+            self._publish(sorted(first))
+            self._finish_scan()
+            return
+
+        self._publish(sorted(first))
+        self._scan_thread = threading.Thread(
+            target=self._scan_rest, args=(paths,), name="image-scan", daemon=True
+        )
+        self._scan_thread.start()
+
+    def _scan_rest(self, paths: Iterator[str]):
+        batch = []
+        last = time.monotonic()
+        try:
+            for path in paths:
+                batch.append(path)
+                now = time.monotonic()
+                if now - last >= self.SCAN_BATCH_INTERVAL:
+                    self._publish(sorted(batch))
+                    self._notify(self._on_scan_progress)
+                    batch = []
+                    last = now
+            if batch:
+                self._publish(sorted(batch))
+        except OSError as exc:
+            print(f"Scan failed: {exc}")
+        finally:
+            self._finish_scan()
+            self._notify(self._on_scan_complete)
+
+    def _apply_filter(self, batch: List[str]) -> List[str]:
+        """The paths in ``batch`` that pass the session filter.
+
+        Index rows are brought up to date first (only new or changed files
+        are opened); unreadable files never pass.
+        """
+        index = self.index
+        before = {path: index.get(path) for path in batch}
+        index.refresh(batch, cancel=self._stop)
+        hits = self._filter_hits
+        passed = []
+        for path in batch:
+            row = index.get(path)
+            if row is None:
+                continue
+            if hits is not None and row is before[path]:
+                matched = index.rel(path) in hits
+            else:
+                matched = self.filter(row)
+            if matched:
+                passed.append(path)
+        return passed
+
+    def _publish(self, batch: List[str]) -> List[str]:
+        """Queue a scan batch; returns the paths that were added."""
+        if self.filter is not None:
+            batch = self._apply_filter(batch)
+        with self._lock:
+            if self._watcher is not None:
+                batch = [path for path in batch if path not in self._images]
+            if not batch:
+                return batch
+            tier = self._next_tier
+            self._next_tier += 1
+            if tier:
+                for path in batch:
+                    self._tiers[path] = tier
+            self._images.update(batch)
+            self._total_images += len(batch)
+            if self._journal is not None:
+                self._journal.append("scan", tier=tier, names=[self._journal.rel(p) for p in batch])
+        return batch
+
+    def _finish_scan(self):
+        # A scan stopped by close() is not complete; the next resume rescans.
+        if self._journal is not None and not self._stop.is_set():
+            # The recorded list is only the filtered subset; a resume trusts
+            # it for the same filter text only.
+            self._journal.append("scan_done", filter=self._filter_text)
+            self._journal.checkpoint()
+        self._scan_done.set()
+
+    def _notify(self, callback: Optional[Callable[[int], None]]):
+        if callback is None or self._stop.is_set():
+            return
+        try:
+            callback(self.total_images)
+        except Exception as exc:
+            print(f"Scan callback failed: {exc}")
+
+    def _sort_key(self, path: str):
+        rank = self._rank(path) if self._rank is not None else 0
+        return (self._tiers.get(path, 0), rank, path)
+
+    def sort_queue(self, key: Optional[Callable[[str], object]] = None):
+        """Reorder the remaining images by ``key(path)``, ties by path.
+
+        ``None`` goes back to name order. Everything queued so far becomes
+        one tier, so images that arrive later (streaming scan, watcher) are
+        still appended after it rather than in front of the cursor. Keys are
+        taken once per image, when it enters the queue.
+        """
+        with self._lock:
+            paths = list(self._images)
+            self._tiers.clear()
+            self._rank = key
+            self._images = IndexedSortedList(paths, key=self._sort_key)
+
+    def _order_key(self, order: str) -> Callable[[str], object]:
+        """Per-path key function for ``order``; missing files sort last."""
+        index = self.index
+
+        def stat_key(path: str):
+            row = index.get(path) if index is not None else None
+            if row is not None:
+                return row.size if order == "size" else row.mtime_ns
+            try:
+                st = os.stat(path)
+            except OSError:
+                return math.inf
+            return st.st_size if order == "size" else st.st_mtime_ns
+
+        def captured_key(path: str):
+            # Capture time from EXIF, else the file's mtime.
+            row = index.get(path) if index is not None else None
+            if row is not None:
+                return row.captured if row.captured is not None else row.mtime_ns / 1e9
+            captured = read_exif(path).get("captured")
+            if captured is not None:
+                return captured
+            try:
+                return os.stat(path).st_mtime_ns / 1e9
+            except OSError:
+                return math.inf
+
+        if order == "natural":
+            return lambda path: natural_key(self._rel(path))
+        if order == "captured":
+            return captured_key
+        return stat_key
+
+    def set_order(self, order: str, cancel: Optional[threading.Event] = None) -> bool:
+        """Re-sort the queue by one of ``ORDERS``; False if cancelled.
+
+        Keys for the remaining images are computed first (EXIF headers and
+        stats on a thread pool, cached index rows when there are some), then
+        the queue is rebuilt once with ``sort_queue``. Blocking for the
+        "captured", "size" and "mtime" orders.
+        """
+        if order not in self.ORDERS:
+            raise ValueError(f"order must be one of {self.ORDERS}, not {order!r}")
+        if order == "name":
+            self.sort_queue(None)
+            return True
+        key_of = self._order_key(order)
+        paths = self.remaining_images()
+        if order == "natural":
+            keys = {path: key_of(path) for path in paths}
+        else:
+            def batch_keys(batch):
+                return [key_of(path) for path in batch]
+
+            keys = {}
+            batches = [paths[i:i + self.SORT_BATCH] for i in range(0, len(paths), self.SORT_BATCH)]
+            with ThreadPoolExecutor(max_workers=self.SORT_WORKERS, thread_name_prefix="sort") as pool:
+                for batch, batch_result in zip(batches, pool.map(batch_keys, batches)):
+                    if cancel is not None and cancel.is_set():
+                        pool.shutdown(cancel_futures=True)
+                        return False
+                    keys.update(zip(batch, batch_result))
+        if cancel is not None and cancel.is_set():
+            return False
+        # Images that arrive later get their key when they are queued.
+        self.sort_queue(lambda path: keys[path] if path in keys else key_of(path))
+        return True
+
+    @property
+    def scan_complete(self) -> bool:
+        """True once the whole directory has been read and ``total_images`` is exact."""
+        return self._scan_done.is_set()
+
+    def wait_for_scan(self, timeout: Optional[float] = None) -> bool:
+        return self._scan_done.wait(timeout)
+
+    def wait_for_index(self, timeout: Optional[float] = None) -> bool:
+        """Block until the background index refresh is done (True without an index)."""
+        thread = self._index_thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def close(self):
+        """Stop a background scan and the watcher, and finish any queued moves."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        if self._index_thread is not None:
+            self._index_thread.join()
+            self._index_thread = None
+        if self._scan_thread is not None:
+            self._scan_thread.join()
+            self._scan_thread = None
+        if self._executor is not None:
+            self._executor.close()
+        if self._journal is not None:
+            self._journal.checkpoint()
+            self._journal.close()
+        if self.index is not None:
+            self.index.close()
+
+    # -- metadata -----------------------------------------------------------
+
+    def _refresh_index(self):
+        while not self._scan_done.wait(0.1):
+            if self._stop.is_set():
+                return
+        with self._lock:
+            paths = list(self._images)
+        try:
+            self.index.refresh(paths, cancel=self._stop, prune=True)
+        except Exception as exc:
+            print(f"Index refresh failed: {exc}")
+
+    def metadata(self, path: str) -> Optional[ImageMeta]:
+        """Dimensions, format, EXIF fields and size/mtime for ``path``.
+
+        With ``index=True`` this is a dict lookup once the background
+        refresh has reached the file; otherwise the header is read now.
+        """
+        if self.index is not None:
+            return self.index.get(path) or self.index.lookup(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        fields = read_metadata(path)
+        fields.update(path=path, size=st.st_size, mtime_ns=st.st_mtime_ns)
+        return ImageMeta(**fields)
+
+    # -- duplicates -----------------------------------------------------------
+
+    def _queue_order(self, groups: List[List[str]]) -> List[List[str]]:
+        """Sort group members, and the groups, by position in the queue."""
+        with self._lock:
+            def position(path):
+                return self._images.index(path) if path in self._images else len(self._images)
+
+            ordered = [sorted(group, key=position) for group in groups]
+            ordered.sort(key=lambda group: position(group[0]))
+        return ordered
+
+    def exact_duplicate_groups(self, cancel: Optional[threading.Event] = None) -> List[List[str]]:
+        """Groups of remaining images that are byte-for-byte identical.
+
+        Sizes and already-known digests come from the metadata index when
+        there is one; see ``duplicates.exact_duplicate_groups`` for the
+        staged hashing. Members and groups are in queue order. Blocking.
+        """
+        with self._lock:
+            paths = list(self._images)
+        files = []
+        known = {}
+        for path in paths:
+            row = self.index.get(path) if self.index is not None else None
+            if row is not None:
+                files.append((path, row.size))
+                if row.digest is not None:
+                    known[path] = row.digest
+                continue
+            try:
+                files.append((path, os.stat(path).st_size))
+            except OSError:
+                continue
+
+        groups, computed = exact_duplicate_groups(
+            files, known=known, workers=self.FINISH_WORKERS, cancel=cancel
+        )
+        if self.index is not None and computed:
+            self.index.update_many((path, {"digest": digest}) for path, digest in computed.items())
+        return self._queue_order(groups)
+
+    def near_duplicate_groups(
+        self,
+        threshold: int = DEFAULT_THRESHOLD,
+        progress: Optional[Callable[[int, int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> List[List[str]]:
+        """Groups of remaining images that look alike (bursts, re-exports).
+
+        Perceptual hashes come from the metadata index when it has them;
+        the rest are computed in a process pool (``progress(done, total)``)
+        and stored back. Members and groups are in queue order. Blocking:
+        the UI calls it from a worker thread.
+        """
+        with self._lock:
+            paths = list(self._images)
+        hashes = {}
+        missing = []
+        for path in paths:
+            row = self.index.get(path) if self.index is not None else None
+            if row is not None and row.dhash is not None and row.phash is not None:
+                hashes[path] = (row.dhash & MASK64, row.phash & MASK64)
+            else:
+                missing.append(path)
+
+        computed = compute_hashes(missing, progress=progress, cancel=cancel)
+        if cancel is not None and cancel.is_set():
+            return []
+        if self.index is not None:
+            for path in computed:
+                if self.index.get(path) is None:
+                    self.index.lookup(path)
+            self.index.update_many(
+                (path, {"dhash": to_signed(dh), "phash": to_signed(ph)})
+                for path, (dh, ph) in computed.items()
+            )
+        hashes.update(computed)
+        return self._queue_order(group_near_duplicates(hashes, threshold))
+
+    # -- quality ----------------------------------------------------------
+
+    def quality_scores(
+        self,
+        progress: Optional[Callable[[int, int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Scores]:
+        """``(sharpness, dark, bright)`` for every remaining image.
+
+        See ``quality.py`` for what the numbers mean. Cached scores come
+        from the metadata index; the rest are computed in a process pool
+        (``progress(done, total)``) and stored back. Unreadable files are
+        left out. Blocking.
+        """
+        with self._lock:
+            paths = list(self._images)
+        scores = {}
+        missing = []
+        for path in paths:
+            row = self.index.get(path) if self.index is not None else None
+            if row is not None and row.sharpness is not None:
+                scores[path] = (row.sharpness, row.clip_dark, row.clip_bright)
+            else:
+                missing.append(path)
+
+        computed = compute_scores(missing, progress=progress, cancel=cancel)
+        if cancel is not None and cancel.is_set():
+            return {}
+        if self.index is not None:
+            for path in computed:
+                if self.index.get(path) is None:
+                    self.index.lookup(path)
+            self.index.update_many(
+                (path, {"sharpness": sharp, "clip_dark": dark, "clip_bright": bright})
+                for path, (sharp, dark, bright) in computed.items()
+            )
+        scores.update(computed)
+        return scores
+
+    # -- live watching ----------------------------------------------------
+
+    def _start_watching(self):
+        self._watcher = create_watcher(
+            self.images_dir,
+            self._on_watch_events,
+            self.SUPPORTED_EXT,
+            recursive=self.recursive,
+            skip_dirs=(self.kept_dir, self.deleted_dir),
+        )
+
+    @property
+    def watching(self) -> bool:
+        return self._watcher is not None
+
+    def _on_watch_events(self, events: List[Tuple[str, str]]):
+        """Apply a batch of watcher events to the queue (watcher thread)."""
+        created = []
+        removed = []
+        with self._lock:
+            for kind, path in events:
+                if kind == CREATED:
+                    if path in self._expected:
+                        self._expected.discard(path)
+                    elif path not in self._images and path not in created:
+                        created.append(path)
+                elif kind == REMOVED:
+                    if path in created:
+                        created.remove(path)
+                    elif path in self._images and path not in removed:
+                        removed.append(path)
+                elif kind == DIR_REMOVED:
+                    prefix = path + os.sep
+                    created = [p for p in created if not p.startswith(prefix)]
+                    removed.extend(
+                        p for p in self._images if p.startswith(prefix) and p not in removed
+                    )
+            if self.index is not None:
+                self.index.forget(removed)
+            for path in removed:
+                # The tier is kept so position_of() still knows where it was.
+                self._images.discard(path)
+                self._total_images -= 1
+                if self._journal is not None:
+                    self._journal.append("gone", path=self._journal.rel(path))
+            if created:
+                created = self._publish(sorted(created))
+        if (created or removed) and self._on_folder_change is not None and not self._stop.is_set():
+            try:
+                self._on_folder_change(created, removed)
+            except Exception as exc:
+                print(f"Folder change callback failed: {exc}")
+
+    def _expect_arrival(self, path: str):
+        if self._watcher is not None:
+            with self._lock:
+                self._expected.add(path)
+
+    def _unexpect(self, path: str):
+        with self._lock:
+            self._expected.discard(path)
+
+    def position_of(self, path: str) -> int:
+        """Index of ``path``, or of the image now in its place if it is gone."""
+        with self._lock:
+            if path in self._images:
+                return self._images.index(path)
+            return self._images.bisect_key(self._sort_key(path))
+
+    # -- session journal ------------------------------------------------
+
+    def _resume(self) -> bool:
+        """Rebuild the session from the journal.
+
+        Returns True when the recorded image list is still valid (the
+        folder's mtime matches the last checkpoint) and no scan is needed.
+        Otherwise a fresh journal is started that carries the undo history
+        over, and the caller rescans.
+        """
+        journal = self._journal
+        state = journal.load()
+        if state is None:
+            journal.start()
+            return False
+
+        outcomes = state.repair(self.images_dir)
+        self.resume_state = state
+        self._next_move_id = state.next_move_id
+        for rel_path, tier in state.moved_tiers.items():
+            if tier:
+                self._tiers[journal.abs(rel_path)] = tier
+        for action, dest, src, move_id in state.history:
+            self._move_ids[journal.abs(dest)] = move_id
+            self._origins[journal.abs(dest)] = os.path.dirname(journal.abs(src))
+
+        try:
+            mtime_ns = os.stat(self.images_dir).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        # The mtime check only covers the top folder, so a recursive session
+        # always rescans (the history is still restored). So does one whose
+        # filter differs from the one the list was recorded under; a
+        # callable filter cannot be compared.
+        trusted = (
+            state.scan_complete and not self.recursive
+            and state.scan_filter == self._filter_text
+            and (self.filter is None or self._filter_text is not None)
+        )
+        if trusted and mtime_ns is not None and state.mtime_ns == mtime_ns:
+            journal.reopen()
+            for move_id, outcome in outcomes:
+                journal.append(outcome, id=move_id)
+            paths = []
+            for rel_path, tier in state.images.items():
+                path = journal.abs(rel_path)
+                if tier:
+                    self._tiers[path] = tier
+                paths.append(path)
+            self._images.update(paths)
+            self._next_tier = state.next_tier
+            self._total_images = state.total
+            self._scan_done.set()
+            journal.checkpoint()
+            return True
+
+        # The folder changed behind our back: rescan, but keep the history.
+        journal.start()
+        journal.append("state", skipped=state.skipped, total=len(state.history))
+        for action, dest, src, move_id in state.history:
+            journal.append("move", id=move_id, kind=action, src=src, dest=dest)
+            journal.append("done", id=move_id)
+        self._total_images = len(state.history)
+        return False
+
+    def resumed_history(self) -> List[Tuple[str, str]]:
+        """Undo history recovered from the journal, as ``(action, moved_path)``."""
+        if self.resume_state is None:
+            return []
+        return [
+            (action, self._journal.abs(dest))
+            for action, dest, _src, _id in self.resume_state.history
+        ]
+
+    def resume_index(self) -> int:
+        """Index of the image the UI should show first after resuming."""
+        state = self.resume_state
+        if state is None or state.cursor is None:
+            return 0
+        rel_path, tier, inclusive = state.cursor
+        path = self._journal.abs(rel_path)
+        with self._lock:
+            present = path in self._images
+            key = self._sort_key(path) if present else (tier, 0, path)
+            index = self._images.bisect_key(key)
+            if present and not inclusive:
+                index += 1
+        return index
+
+    def skip(self, path: str):
+        """Record that the user skipped ``path``; the file stays in the queue."""
+        if self._journal is not None:
+            self._journal.append("skip", path=self._journal.rel(path))
+
+    def end_session(self):
+        """Forget the journal once the session has been finished."""
+        journal, self._journal = self._journal, None
+        if journal is not None:
+            journal.discard()
+
+    def _before_move_job(self, job: MoveJob):
+        # Group commit: one fsync makes every intent queued so far durable.
+        journal = self._journal
+        if journal is not None:
+            journal.flush()
+
+    def _on_moves_idle(self):
+        journal = self._journal
+        if journal is not None:
+            journal.checkpoint()
+
+    def _journal_intent(self, kind: str, src: str, dest: str):
+        if self._journal is None:
+            return
+        with self._lock:
+            move_id = self._next_move_id
+            self._next_move_id += 1
+            self._move_ids[dest] = move_id
+        self._journal.append(
+            "move", id=move_id, kind=kind, src=self._journal.rel(src), dest=self._journal.rel(dest)
+        )
+
+    def _journal_outcome(self, outcome: str, dest: str):
+        if self._journal is None:
+            return
+        with self._lock:
+            move_id = self._move_ids.get(dest)
+            if outcome != "done":
+                self._move_ids.pop(dest, None)
+        if move_id is not None:
+            self._journal.append(outcome, id=move_id)
+
+    def flush_moves(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued keep/delete has reached the disk."""
+        if self._executor is None:
+            return True
+        return self._executor.flush(timeout)
+
     @property
     def total_images(self) -> int:
         return self._total_images
 
     def processed_count(self) -> int:
-        return self._total_images - len(self._images)
+        with self._lock:
+            return self._total_images - len(self._images)
 
     def get_image(self, index: int) -> Optional[str]:
-        if index < 0 or index >= len(self._images):
-            return None
-        return self._images[index]
+        with self._lock:
+            if index < 0 or index >= len(self._images):
+                return None
+            return self._images[index]
+
+    def _names_for(self, directory: str) -> _NameIndex:
+        index = self._name_indexes.get(directory)
+        if index is None:
+            index = self._name_indexes[directory] = _NameIndex(directory)
+        return index
 
     def _resolve_unique_destination(self, directory: str, filename: str) -> str:
-        dest = os.path.join(directory, filename)
-        if not os.path.exists(dest):
-            return dest
+        """Reserve a free destination name in ``directory``.
 
-        base, ext = os.path.splitext(filename)
-        i = 1
-        while True:
-            new_name = f"{base}_{i}{ext}"
-            dest = os.path.join(directory, new_name)
-            if not os.path.exists(dest):
-                return dest
-            i += 1
+        The name is picked from the in-memory index; a single ``lexists``
+        catches files that appeared behind our back since it was loaded.
+        """
+        with self._lock:
+            names = self._names_for(directory)
+            while True:
+                dest = names.reserve(filename)
+                if not os.path.lexists(dest):
+                    return dest
+
+    def _release_destination(self, dest: str):
+        with self._lock:
+            self._names_for(os.path.dirname(dest)).release(os.path.basename(dest))
+
+    def _rel(self, path: str) -> str:
+        if path.startswith(self._prefix):
+            return path[len(self._prefix):]
+        return os.path.relpath(path, self.images_dir)
+
+    def _bucket_dir(self, src: str, bucket: str) -> str:
+        """Destination folder for ``src`` inside kept/ or deleted/."""
+        if self.layout == "mirror":
+            rel_dir = os.path.dirname(self._rel(src))
+            if rel_dir and not rel_dir.startswith(os.pardir):
+                return os.path.join(bucket, rel_dir)
+        return bucket
 
-    def _move(self, src: str, dest_dir: str) -> Optional[str]:
+    def _bucket_of(self, path: str) -> Optional[str]:
+        for bucket in (self.kept_dir, self.deleted_dir):
+            if path.startswith(bucket + os.sep):
+                return bucket
+        return None
+
+    def _origin_dir(self, moved_path: str) -> str:
+        """Folder a moved file should go back to."""
+        origin = self._origins.get(moved_path)
+        if origin is not None:
+            return origin
+        bucket = self._bucket_of(moved_path)
+        if bucket is not None and self.layout == "mirror":
+            rel_dir = os.path.dirname(moved_path[len(bucket) + 1:])
+            return os.path.join(self.images_dir, rel_dir)
+        return self.images_dir
+
+    @metrics.timed("backend.move")
+    def _move(self, src: str, dest_dir: str, kind: str, background: bool = False) -> Optional[str]:
         try:
-            filename = os.path.basename(src)
-            dest = self._resolve_unique_destination(dest_dir, filename)
-            shutil.move(src, dest)
-            if src in self._images:
-                self._images.remove(src)
-            return dest
+            return self._move_or_raise(src, dest_dir, kind, background)
         except Exception as e:
             print(f"Move failed: {e}")
+            metrics.count("backend.move_failures")
             return None
 
+    def _move_or_raise(self, src: str, dest_dir: str, kind: str, background: bool = False) -> str:
+        dest = None
+        try:
+            if dest_dir not in self._name_indexes:
+                os.makedirs(dest_dir, exist_ok=True)
+            filename = os.path.basename(src)
+            dest = self._resolve_unique_destination(dest_dir, filename)
+            if kind == "undo":
+                self._expect_arrival(dest)
+            self._journal_intent(kind, src, dest)
+            if background:
+                # The executor flushes the journal right before it moves.
+                job = self._executor.submit(src, dest)
+                with self._lock:
+                    self._pending[dest] = job
+            else:
+                while True:
+                    if self._journal is not None:
+                        self._journal.flush()
+                    try:
+                        self._move_file(src, dest)
+                        break
+                    except FileExistsError:
+                        # Another program took the name since it was picked;
+                        # it stays reserved, and the move gets the next one.
+                        self._journal_outcome("fail", dest)
+                        self._unexpect(dest)
+                        dest = self._resolve_unique_destination(dest_dir, filename)
+                        if kind == "undo":
+                            self._expect_arrival(dest)
+                        self._journal_intent(kind, src, dest)
+                self._journal_outcome("done", dest)
+            self._commit_move(src, dest)
+            return dest
+        except Exception:
+            if dest is not None:
+                self._journal_outcome("fail", dest)
+                self._release_destination(dest)
+                self._unexpect(dest)
+            raise
+
+    @metrics.timed("backend.move_file")
+    def _move_file(self, src: str, dest: str):
+        progress = None
+        if self._on_move_progress is not None:
+            callback = self._on_move_progress
+
+            def progress(copied: int, total: int):
+                try:
+                    callback(src, copied, total)
+                except Exception as exc:
+                    print(f"Move progress callback failed: {exc}")
+        move_file(src, dest, verify=self.verify_moves, progress=progress)
+
+    def _commit_move(self, src: str, dest: str):
+        with self._lock:
+            self._origins.pop(src, None)
+            self._origins[dest] = os.path.dirname(src)
+            self._images.discard(src)
+            tier = self._tiers.pop(src, 0)
+            if tier:
+                self._tiers[dest] = tier
+            self._release_destination(src)
+            if self.index is not None:
+                self.index.rename(src, dest)
+
+    def _revert_move(self, src: str, dest: str):
+        """Put ``src`` back after its background move was cancelled or failed."""
+        with self._lock:
+            self._pending.pop(dest, None)
+            self._origins.pop(dest, None)
+            tier = self._tiers.pop(dest, 0)
+            if tier:
+                self._tiers[src] = tier
+            self._release_destination(dest)
+            if self.index is not None:
+                self.index.rename(dest, src)
+            if os.path.lexists(src):
+                self._names_for(os.path.dirname(src)).add(os.path.basename(src))
+                self._images.add(src)
+
+    def _on_move_finished(self, job: MoveJob):
+        # Runs on the executor thread.
+        if job.state == FAILED:
+            print(f"Move failed: {job.error}")
+            self._journal_outcome("fail", job.dest)
+            self._revert_move(job.src, job.dest)
+        else:
+            self._journal_outcome("done", job.dest)
+            with self._lock:
+                self._pending.pop(job.dest, None)
+        if self._on_move_done is not None:
+            self._on_move_done(job.src, job.dest, str(job.error or ""))
+
     def keep(self, path: str) -> Optional[str]:
-        return self._move(path, self.kept_dir)
+        dest_dir = self._bucket_dir(path, self.kept_dir)
+        return self._move(path, dest_dir, "keep", background=self._executor is not None)
 
     def delete(self, path: str) -> Optional[str]:
-        return self._move(path, self.deleted_dir)
+        dest_dir = self._bucket_dir(path, self.deleted_dir)
+        return self._move(path, dest_dir, "delete", background=self._executor is not None)
 
     def undo_move(self, moved_path: str) -> Optional[str]:
         moved_path = os.path.abspath(moved_path)
-        parent = os.path.dirname(moved_path)
-        if parent not in {self.kept_dir, self.deleted_dir}:
+        if self._bucket_of(moved_path) is None:
             return None
+
+        with self._lock:
+            job = self._pending.get(moved_path)
+        if job is not None:
+            if self._executor.cancel(job):
+                self._journal_outcome("cancel", job.dest)
+                self._revert_move(job.src, job.dest)
+                return job.src
+            job.wait()
+            if job.state in (FAILED, CANCELLED):
+                # The file never left; it is back in the queue already.
+                return job.src if job.src in self._images else None
+
         if not os.path.exists(moved_path):
             return None
 
-        restored = self._move(moved_path, self.images_dir)
+        restored = self._move(moved_path, self._origin_dir(moved_path), "undo")
         if not restored:
             return None
 
-        if restored not in self._images:
-            self._images.append(restored)
-            self._images.sort()
+        with self._lock:
+            self._images.add(restored)
+            # A hard-linked move shows up as IN_CREATE, which the watcher
+            # does not report; once queued, the path needs no expectation.
+            self._expected.discard(restored)
         return restored
 
+    def move_many(
+        self,
+        paths: Iterable[str],
+        action: str,
+        progress: Optional[Callable[[BulkResult], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> BulkResult:
+        """Keep or delete many queued images at once (``action`` is "keep" or "delete").
+
+        Same destinations and collision policy as ``keep``/``delete``, run
+        on the Finish pool. Paths that are not in the queue are skipped.
+        ``BulkResult.bytes`` is the size of the files moved.
+        """
+        if action not in ("keep", "delete"):
+            raise ValueError(f"action must be 'keep' or 'delete', not {action!r}")
+        bucket = self.kept_dir if action == "keep" else self.deleted_dir
+        self.flush_moves()
+        items = []
+        for path in paths:
+            if path not in self._images:
+                continue
+            row = self.index.get(path) if self.index is not None else None
+            if row is not None:
+                items.append((path, row.size))
+                continue
+            try:
+                items.append((path, os.stat(path).st_size))
+            except OSError:
+                continue
+
+        def move(path: str):
+            self._move_or_raise(path, self._bucket_dir(path, bucket), action)
+
+        return run_bulk(items, move, workers=self.FINISH_WORKERS, progress=progress, cancel=cancel)
+
     def index_of_image(self, path: str) -> int:
         path = os.path.abspath(path)
-        try:
-            return self._images.index(path)
-        except ValueError:
-            return -1
+        with self._lock:
+            try:
+                return self._images.index(path)
+            except ValueError:
+                return -1
 
     def remaining_count(self) -> int:
-        return len(self._images)
+        with self._lock:
+            return len(self._images)
+
+    def remaining_images(self) -> List[str]:
+        """Snapshot of the remaining images, in queue order."""
+        with self._lock:
+            return list(self._images)
 
     def get_kept_files(self) -> List[str]:
-        """Return list of filenames currently in the kept/ directory."""
-        if not os.path.isdir(self.kept_dir):
-            return []
-        return sorted(
-            f for f in os.listdir(self.kept_dir)
-            if os.path.isfile(os.path.join(self.kept_dir, f))
-        )
+        """Return paths, relative to kept/, of the files currently in it."""
+        self.flush_moves()
+        return self._relative_files(self.kept_dir)
 
     def get_deleted_files(self) -> List[str]:
-        """Return list of filenames currently in the deleted/ directory."""
-        if not os.path.isdir(self.deleted_dir):
-            return []
-        return sorted(
-            f for f in os.listdir(self.deleted_dir)
-            if os.path.isfile(os.path.join(self.deleted_dir, f))
-        )
+        """Return paths, relative to deleted/, of the files currently in it."""
+        self.flush_moves()
+        return self._relative_files(self.deleted_dir)
+
+    def _relative_files(self, bucket: str) -> List[str]:
+        start = len(bucket) + 1
+        return sorted(path[start:] for path, _size in self._list_files(bucket))
+
+    # Finish-step purge/restore run on this many threads.
+    FINISH_WORKERS = 8
+
+    def _list_files(self, directory: str) -> List[Tuple[str, int]]:
+        """``(path, size)`` for the regular files in ``directory`` and below."""
+        files = []
+        stack = [directory]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+                        except OSError:
+                            continue
+            except FileNotFoundError:
+                continue
+        return files
+
+    def _remove_tree_if_empty(self, bucket: str):
+        """Remove ``bucket`` and any subfolders left empty by the Finish step."""
+        for root, dirs, files in os.walk(bucket, topdown=False):
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+            self._name_indexes.pop(root, None)
 
-    def finish_delete(self) -> int:
+    def finish_delete(
+        self,
+        progress: Optional[Callable[[BulkResult], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> BulkResult:
         """Permanently remove all files in the deleted/ folder.
 
-        Returns the number of files removed.
+        Runs on a bounded thread pool. ``progress(result)`` is called as
+        batches finish and setting ``cancel`` stops the purge early. The
+        folder itself is removed once it is empty.
         """
-        count = 0
-        if not os.path.isdir(self.deleted_dir):
-            return count
-        for fname in os.listdir(self.deleted_dir):
-            fpath = os.path.join(self.deleted_dir, fname)
-            if os.path.isfile(fpath):
-                try:
-                    os.remove(fpath)
-                    count += 1
-                except Exception as exc:
-                    print(f"Could not delete {fpath}: {exc}")
-        try:
-            os.rmdir(self.deleted_dir)
-        except OSError:
-            pass
-        return count
+        self.flush_moves()
+        files = self._list_files(self.deleted_dir)
+        result = run_bulk(
+            files, os.remove, workers=self.FINISH_WORKERS, progress=progress, cancel=cancel
+        )
+        for path, message in result.errors:
+            print(f"Could not delete {path}: {message}")
+        if self.index is not None:
+            self.index.forget(path for path, _size in files if not os.path.lexists(path))
+        self._remove_tree_if_empty(self.deleted_dir)
+        return result
 
-    def finish_restore_kept(self) -> int:
+    def finish_restore_kept(
+        self,
+        progress: Optional[Callable[[BulkResult], None]] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> BulkResult:
         """Move all kept files back to the source directory.
 
-        Returns the number of files restored.
+        Same pool, progress and cancellation behaviour as ``finish_delete``.
         """
-        count = 0
-        if not os.path.isdir(self.kept_dir):
-            return count
-        for fname in os.listdir(self.kept_dir):
-            src = os.path.join(self.kept_dir, fname)
-            if os.path.isfile(src):
-                dest = self._resolve_unique_destination(self.images_dir, fname)
+        self.flush_moves()
+
+        def restore(src: str):
+            origin = self._origin_dir(src)
+            os.makedirs(origin, exist_ok=True)
+            while True:
+                dest = self._resolve_unique_destination(origin, os.path.basename(src))
+                self._expect_arrival(dest)
                 try:
-                    shutil.move(src, dest)
-                    count += 1
-                except Exception as exc:
-                    print(f"Could not restore {src}: {exc}")
-        try:
-            os.rmdir(self.kept_dir)
-        except OSError:
-            pass
-        return count
+                    self._move_file(src, dest)
+                    break
+                except FileExistsError:
+                    self._unexpect(dest)  # taken meanwhile; try the next name
+                except Exception:
+                    self._release_destination(dest)
+                    self._unexpect(dest)
+                    raise
+            # The file is there; its event may never come (see undo_move).
+            self._unexpect(dest)
+            if self.index is not None:
+                self.index.rename(src, dest)
+
+        files = self._list_files(self.kept_dir)
+        result = run_bulk(
+            files, restore, workers=self.FINISH_WORKERS, progress=progress, cancel=cancel
+        )
+        for path, message in result.errors:
+            print(f"Could not restore {path}: {message}")
+        self._remove_tree_if_empty(self.kept_dir)
+        return result
@@ -0,0 +1,344 @@
+"""Duplicate detection: exact copies and perceptual near-duplicates.
+
+Exact copies (:func:`exact_duplicate_groups`) are found in stages so that
+almost no bytes are read: files are bucketed by size, colliding sizes are
+hashed on their first and last 64 KiB, and only files that still collide
+are streamed in full through BLAKE2.
+
+Near-duplicates use perceptual hashes.
+
+Two 64-bit hashes are computed per image from a small grayscale decode:
+
+- dHash: sign of the horizontal gradient on a 9x8 thumbnail.
+- pHash: sign of the low-frequency 8x8 DCT block of a 32x32 thumbnail
+  against its median.
+
+Hashing runs in a process pool (decoding is CPU bound and holds the GIL).
+Near-duplicate pairs are found with a multi-index Hamming search
+(:func:`near_duplicate_pairs`), vectorized with NumPy, instead of an
+all-pairs comparison.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from procpool import map_in_processes
+
+HASH_BITS = 64
+MASK64 = (1 << HASH_BITS) - 1
+# Pairs are near-duplicates when both hashes differ in at most this many bits.
+DEFAULT_THRESHOLD = 8
+
+Hashes = Tuple[int, int]  # (dhash, phash)
+
+# Exact duplicates: bytes hashed at each end of a file before a full read.
+PARTIAL_BYTES = 64 * 1024
+READ_CHUNK = 1024 * 1024
+DIGEST_SIZE = 20
+
+_DCT_SIZE = 32
+_dct_matrix = None
+
+
+# -- exact duplicates ----------------------------------------------------------
+
+
+def file_digest(path: str) -> str:
+    """BLAKE2b of the whole file, hex."""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(READ_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def partial_digest(path: str, size: int) -> Tuple[str, bool]:
+    """Hash of the first and last ``PARTIAL_BYTES``; ``(hex, covers_whole_file)``.
+
+    A file no longer than both ends together is read in full, and its
+    partial hash is then the same as :func:`file_digest`.
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as fh:
+        if size <= 2 * PARTIAL_BYTES:
+            digest.update(fh.read())
+            return digest.hexdigest(), True
+        digest.update(fh.read(PARTIAL_BYTES))
+        fh.seek(-PARTIAL_BYTES, os.SEEK_END)
+        digest.update(fh.read(PARTIAL_BYTES))
+    return digest.hexdigest(), False
+
+
+def _colliding(buckets: Dict[object, List[str]]) -> List[List[str]]:
+    return [paths for paths in buckets.values() if len(paths) > 1]
+
+
+def exact_duplicate_groups(
+    files: Iterable[Tuple[str, int]],
+    known: Optional[Dict[str, str]] = None,
+    workers: int = 4,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[List[List[str]], Dict[str, str]]:
+    """Group byte-identical files among ``(path, size)`` pairs.
+
+    ``known`` maps paths to full digests that are still valid (from the
+    metadata index); those files are never read. Returns the sorted groups
+    and the full digests computed on the way, for the caller to cache.
+    Unreadable files are left out.
+    """
+    known = known or {}
+    by_size: Dict[int, List[str]] = {}
+    for path, size in files:
+        by_size.setdefault(size, []).append(path)
+    sizes = {}
+    candidates = []
+    for size, paths in by_size.items():
+        if len(paths) > 1:
+            candidates.extend(paths)
+            sizes.update((path, size) for path in paths)
+
+    computed: Dict[str, str] = {}
+
+    def stopped():
+        return cancel is not None and cancel.is_set()
+
+    def partial(path):
+        if path in known and sizes[path] <= 2 * PARTIAL_BYTES:
+            return path, known[path], True
+        try:
+            value, whole = partial_digest(path, sizes[path])
+        except OSError:
+            return path, None, False
+        return path, value, whole
+
+    def full(path):
+        try:
+            return path, file_digest(path)
+        except OSError:
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="digest") as pool:
+        # Stage 2: ends of each file. Small files are read whole here, and
+        # files with a known digest need no full read later.
+        by_partial: Dict[Tuple[int, str], List[str]] = {}
+        final: Dict[str, str] = {}
+        for path, value, whole in pool.map(partial, candidates):
+            if stopped():
+                return [], computed
+            if value is None:
+                continue
+            if path in known:
+                final[path] = known[path]
+            elif whole:
+                final[path] = computed[path] = value
+            by_partial.setdefault((sizes[path], value), []).append(path)
+
+        # Stage 3: stream only what still collides and is not final yet.
+        to_read = [
+            path for paths in _colliding(by_partial) for path in paths if path not in final
+        ]
+        for path, value in pool.map(full, to_read):
+            if stopped():
+                return [], computed
+            if value is not None:
+                final[path] = computed[path] = value
+
+    by_digest: Dict[str, List[str]] = {}
+    for paths in _colliding(by_partial):
+        for path in paths:
+            if path in final:
+                by_digest.setdefault(final[path], []).append(path)
+    return sorted(sorted(paths) for paths in _colliding(by_digest)), computed
+
+
+# -- perceptual hashes ---------------------------------------------------------
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & MASK64).bit_count()
+
+
+def to_signed(value: int) -> int:
+    """Fold an unsigned 64-bit hash into SQLite's signed INTEGER range."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _dct() -> np.ndarray:
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = np.arange(_DCT_SIZE)
+        _dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * _DCT_SIZE))
+    return _dct_matrix
+
+
+def dhash_pixels(pixels: np.ndarray) -> int:
+    """dHash of a 8x9 (rows x cols) grayscale array."""
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash_pixels(pixels: np.ndarray) -> int:
+    """pHash of a 32x32 grayscale array."""
+    c = _dct()
+    low = (c @ pixels @ c.T)[:8, :8].ravel()
+    median = np.median(low[1:])  # the DC term would skew the median
+    return _pack(low > median)
+
+
+def hash_image(path: str) -> Optional[Hashes]:
+    """``(dhash, phash)`` for one file, or None if it cannot be decoded."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            # JPEG decodes straight to a reduced size: far less work than a
+            # full decode followed by a resize.
+            image.draft("L", (_DCT_SIZE * 2, _DCT_SIZE * 2))
+            gray = image.convert("L")
+    except Exception:
+        return None
+    small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    thumb = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR), dtype=np.float64)
+    return dhash_pixels(small), phash_pixels(thumb)
+
+
+def _hash_batch(paths: Sequence[str]) -> List[Tuple[str, Optional[Hashes]]]:
+    return [(path, hash_image(path)) for path in paths]
+
+
+def compute_hashes(
+    paths: Sequence[str],
+    workers: Optional[int] = None,
+    batch_size: int = 32,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Hashes]:
+    """Hash ``paths`` in a process pool; unreadable files are left out.
+
+    See ``procpool.map_in_processes`` for batching, ``progress`` and the
+    start method.
+    """
+    return map_in_processes(
+        _hash_batch, paths, workers=workers, batch_size=batch_size, progress=progress, cancel=cancel
+    )
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _fields(parts: int) -> List[Tuple[np.uint64, np.uint64]]:
+    """``(mask, shift)`` splitting a 64-bit value into ``parts`` contiguous bit fields."""
+    bounds = [round(i * HASH_BITS / parts) for i in range(parts + 1)]
+    return [
+        (np.uint64(((1 << (hi - lo)) - 1) << lo), np.uint64(lo))
+        for lo, hi in zip(bounds, bounds[1:])
+    ]
+
+
+def _equal_key_pairs(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """All index pairs ``(a, b)`` whose keys are equal, each pair once."""
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    left, right = [], []
+    offset = 1
+    while offset < len(order):
+        same = np.flatnonzero(sorted_keys[offset:] == sorted_keys[:-offset])
+        if not len(same):
+            break
+        left.append(order[same])
+        right.append(order[same + offset])
+        offset += 1
+    if not left:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    return np.concatenate(left), np.concatenate(right)
+
+
+def near_duplicate_pairs(
+    dhashes: np.ndarray, phashes: np.ndarray, threshold: int = DEFAULT_THRESHOLD
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Index pairs whose dHash and pHash both differ in at most ``threshold`` bits.
+
+    Multi-index hashing: each hash is split into ``threshold + 1`` bit
+    fields, and two hashes within ``threshold`` bits agree exactly on at
+    least one field (pigeonhole). A qualifying pair therefore shares at
+    least one (dHash field, pHash field) combination. Each combination is a
+    table of ~14-bit keys with small buckets; its candidates are verified
+    with a vectorized popcount. A pair is kept only by the first table it
+    can appear in, so every pair is reported exactly once without a global
+    de-duplication pass.
+    """
+    fields = _fields(threshold + 1)
+    masks = [mask for mask, _shift in fields]
+    d_fields = [(dhashes & mask) >> shift for mask, shift in fields]
+    p_fields = [(phashes & mask) >> shift for mask, shift in fields]
+    found_a, found_b = [], []
+    for i, d_field in enumerate(d_fields):
+        d_field = d_field << np.uint64(32)
+        for j, p_field in enumerate(p_fields):
+            a, b = _equal_key_pairs(d_field | p_field)
+            if not len(a):
+                continue
+            dx = dhashes[a] ^ dhashes[b]
+            px = phashes[a] ^ phashes[b]
+            ok = (_popcount(dx) <= threshold) & (_popcount(px) <= threshold)
+            for mask in masks[:i]:
+                ok &= (dx & mask) != 0
+            for mask in masks[:j]:
+                ok &= (px & mask) != 0
+            found_a.append(a[ok])
+            found_b.append(b[ok])
+    if not found_a:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    return np.concatenate(found_a), np.concatenate(found_b)
+
+
+def group_near_duplicates(
+    hashes: Dict[str, Hashes], threshold: int = DEFAULT_THRESHOLD
+) -> List[List[str]]:
+    """Connected groups of images whose dHash and pHash are both within ``threshold``.
+
+    Groups and their members come back sorted.
+    """
+    paths = sorted(hashes)
+    if len(paths) < 2:
+        return []
+    dhashes = np.array([hashes[p][0] & MASK64 for p in paths], dtype=np.uint64)
+    phashes = np.array([hashes[p][1] & MASK64 for p in paths], dtype=np.uint64)
+    left, right = near_duplicate_pairs(dhashes, phashes, threshold)
+
+    parent = list(range(len(paths)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    groups: Dict[int, List[str]] = {}
+    for i in set(left.tolist()) | set(right.tolist()):
+        groups.setdefault(find(i), []).append(paths[i])
+    return sorted(sorted(group) for group in groups.values())
@@ -0,0 +1,366 @@
+"""Minimal EXIF reader: capture time, orientation and the embedded preview.
+
+Only the few bytes that hold the EXIF block are read, without decoding the
+image or importing Pillow:
+
+- JPEG: the APP1 ``Exif`` segment, found by walking the marker segments
+  that precede the image data (normally within the first few KB).
+- WebP: the ``EXIF`` RIFF chunk; other chunks are skipped with a seek.
+- PNG: the ``eXIf`` chunk, looked for up to the first ``IDAT``.
+
+The block is a small TIFF structure; :func:`parse_tiff` reads IFD0 and the
+Exif sub-IFD for the handful of tags we need.
+
+:func:`read_thumbnail` returns an embedded JPEG preview as bytes without
+decoding anything. The IFD1 thumbnail is usually only 160 px wide, so JPEGs
+that also carry a Multi-Picture Format (MPF, ``APP2``) preview, as most
+camera JPEGs do (typically 1620-1920 px), return that one instead. Phone
+photos and editor exports mostly have the small IFD1 thumbnail only.
+"""
+
+import struct
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+EXIF_HEADER = b"Exif\x00\x00"
+MPF_HEADER = b"MPF\x00"
+
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+TAG_SUBSEC_ORIGINAL = 0x9291
+TAG_THUMB_OFFSET = 0x0201  # JPEGInterchangeFormat, in IFD1
+TAG_THUMB_LENGTH = 0x0202
+TAG_MP_ENTRY = 0xB002  # in the MPF index IFD, 16 bytes per image
+
+# MP image types of the "large thumbnail" classes (VGA and full-HD previews).
+MP_PREVIEW_TYPES = {0x010001, 0x010002}
+
+# JPEG start-of-frame markers (all but DHT, JPG and DAC in C0-CF).
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# TIFF field type -> size in bytes of one value.
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+# Largest block we accept: an APP1 segment cannot exceed 64 KiB, and the
+# other containers have no business holding more than that for EXIF.
+MAX_EXIF_BYTES = 64 * 1024
+# Largest MPF preview we read; anything bigger is a full-size frame.
+MAX_PREVIEW_BYTES = 8 * 1024 * 1024
+
+
+def parse_exif_datetime(value) -> Optional[float]:
+    """``"YYYY:MM:DD HH:MM:SS"`` -> epoch seconds (local time), or None."""
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "replace")
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip("\0 ")[:19], "%Y:%m:%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+# -- containers -------------------------------------------------------------
+
+
+def _jpeg_app_segments(fh) -> Iterator[Tuple[int, int, bytes]]:
+    """``(marker, file offset, data)`` of each APP1/APP2 segment before the scan."""
+    fh.seek(2)
+    while True:
+        header = fh.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            return
+        marker = header[1]
+        if marker == 0xFF:  # fill byte before the real marker
+            fh.seek(-3, 1)
+            continue
+        if marker in (0xD9, 0xDA):  # end of image, start of scan
+            return
+        length = int.from_bytes(header[2:4], "big")
+        if length < 2:
+            return
+        if marker in (0xE1, 0xE2):
+            where = fh.tell()
+            yield marker, where, fh.read(length - 2)
+        else:
+            fh.seek(length - 2, 1)
+
+
+def _jpeg_block(fh) -> Optional[bytes]:
+    for marker, _where, data in _jpeg_app_segments(fh):
+        if marker == 0xE1 and data.startswith(EXIF_HEADER):
+            return data[len(EXIF_HEADER):]
+    return None
+
+
+def _webp_block(fh) -> Optional[bytes]:
+    fh.seek(12)
+    while True:
+        header = fh.read(8)
+        if len(header) < 8:
+            return None
+        size = int.from_bytes(header[4:8], "little")
+        if header[:4] == b"EXIF":
+            if size > MAX_EXIF_BYTES:
+                return None
+            data = fh.read(size)
+            # Some writers keep the JPEG-style prefix.
+            return data[len(EXIF_HEADER):] if data.startswith(EXIF_HEADER) else data
+        fh.seek(size + (size & 1), 1)
+
+
+def _png_block(fh) -> Optional[bytes]:
+    fh.seek(len(PNG_SIGNATURE))
+    while True:
+        header = fh.read(8)
+        if len(header) < 8:
+            return None
+        size = int.from_bytes(header[:4], "big")
+        kind = header[4:8]
+        if kind == b"eXIf":
+            return fh.read(size) if size <= MAX_EXIF_BYTES else None
+        if kind in (b"IDAT", b"IEND"):
+            return None
+        fh.seek(size + 4, 1)  # data and CRC
+
+
+def read_exif_block(path: str) -> Optional[bytes]:
+    """The raw TIFF-structured EXIF block of a JPEG, WebP or PNG file."""
+    with open(path, "rb") as fh:
+        head = fh.read(12)
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_block(fh)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return _webp_block(fh)
+        if head.startswith(PNG_SIGNATURE[:8]) and len(head) >= 8:
+            return _png_block(fh)
+    return None
+
+
+# -- TIFF -------------------------------------------------------------------
+
+
+def _read_ifd(data: bytes, offset: int, order: str) -> Dict[int, object]:
+    """Tags of one IFD; ASCII values as str, numbers as int (first value only)."""
+    tags: Dict[int, object] = {}
+    (count,) = struct.unpack_from(order + "H", data, offset)
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        tag, kind, n = struct.unpack_from(order + "HHI", data, entry)
+        size = _TYPE_SIZES.get(kind)
+        if size is None:
+            continue
+        where = entry + 8
+        if size * n > 4:
+            (where,) = struct.unpack_from(order + "I", data, where)
+        if kind == 2:
+            raw = data[where:where + n]
+            tags[tag] = raw.split(b"\0", 1)[0].decode("ascii", "replace")
+        elif kind == 3:
+            tags[tag] = struct.unpack_from(order + "H", data, where)[0]
+        elif kind == 4:
+            tags[tag] = struct.unpack_from(order + "I", data, where)[0]
+    return tags
+
+
+def _next_ifd(data: bytes, offset: int, order: str) -> int:
+    (count,) = struct.unpack_from(order + "H", data, offset)
+    return struct.unpack_from(order + "I", data, offset + 2 + 12 * count)[0]
+
+
+def _byte_order(data: bytes) -> Optional[str]:
+    if data[:2] == b"II":
+        return "<"
+    if data[:2] == b"MM":
+        return ">"
+    return None
+
+
+def parse_tiff(data: bytes) -> Dict[str, object]:
+    """``captured`` (epoch seconds) and ``orientation`` from a TIFF/EXIF block.
+
+    Missing or unreadable fields are left out.
+    """
+    fields: Dict[str, object] = {}
+    order = _byte_order(data)
+    if order is None:
+        return fields
+    try:
+        magic, ifd0_offset = struct.unpack_from(order + "HI", data, 2)
+        if magic != 42:
+            return fields
+        ifd0 = _read_ifd(data, ifd0_offset, order)
+        exif_ifd = {}
+        if isinstance(ifd0.get(TAG_EXIF_IFD), int):
+            exif_ifd = _read_ifd(data, ifd0[TAG_EXIF_IFD], order)
+    except (struct.error, IndexError):
+        return fields
+
+    orientation = ifd0.get(TAG_ORIENTATION)
+    if isinstance(orientation, int) and 1 <= orientation <= 8:
+        fields["orientation"] = orientation
+    captured = parse_exif_datetime(exif_ifd.get(TAG_DATETIME_ORIGINAL))
+    if captured is not None:
+        # Bursts share the second; the sub-second tag keeps them in order.
+        subsec = str(exif_ifd.get(TAG_SUBSEC_ORIGINAL, "")).strip()
+        if subsec.isdigit():
+            captured += int(subsec) / 10 ** len(subsec)
+    else:
+        captured = parse_exif_datetime(exif_ifd.get(TAG_DATETIME_DIGITIZED))
+    if captured is None:
+        captured = parse_exif_datetime(ifd0.get(TAG_DATETIME))
+    if captured is not None:
+        fields["captured"] = captured
+    return fields
+
+
+def read_exif(path: str) -> Dict[str, object]:
+    """``captured`` and ``orientation`` for ``path``, whichever are present.
+
+    Never raises: unreadable or unsupported files give an empty dict.
+    """
+    try:
+        block = read_exif_block(path)
+    except OSError:
+        return {}
+    return parse_tiff(block) if block else {}
+
+
+# -- embedded preview -------------------------------------------------------
+
+
+class Thumbnail(NamedTuple):
+    """An embedded JPEG preview (IFD1 or MPF), not yet decoded.
+
+    ``width`` and ``height`` are as stored; the preview is not rotated, so
+    ``orientation`` (the main image's EXIF tag, 1 when absent) still has to
+    be applied for display.
+    """
+
+    data: bytes
+    width: int
+    height: int
+    orientation: int
+
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """``(width, height)`` from the start-of-frame segment of JPEG bytes."""
+    if not data.startswith(b"\xff\xd8"):
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            return None
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker in _SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack_from(">HH", data, pos + 5)
+            return (width, height) if width and height else None
+        pos += 2 + length
+    return None
+
+
+def parse_thumbnail(data: bytes) -> Optional[Thumbnail]:
+    """The IFD1 JPEG preview of a TIFF/EXIF block, or None."""
+    order = _byte_order(data)
+    if order is None:
+        return None
+    try:
+        magic, ifd0_offset = struct.unpack_from(order + "HI", data, 2)
+        if magic != 42:
+            return None
+        ifd0 = _read_ifd(data, ifd0_offset, order)
+        ifd1_offset = _next_ifd(data, ifd0_offset, order)
+        if not ifd1_offset:
+            return None
+        ifd1 = _read_ifd(data, ifd1_offset, order)
+    except (struct.error, IndexError):
+        return None
+    start = ifd1.get(TAG_THUMB_OFFSET)
+    length = ifd1.get(TAG_THUMB_LENGTH)
+    if not isinstance(start, int) or not isinstance(length, int) or length <= 0:
+        return None
+    jpeg = data[start:start + length]
+    size = jpeg_dimensions(jpeg) if len(jpeg) == length else None
+    if size is None:
+        return None
+    orientation = ifd0.get(TAG_ORIENTATION)
+    if not isinstance(orientation, int) or not 1 <= orientation <= 8:
+        orientation = 1
+    return Thumbnail(jpeg, size[0], size[1], orientation)
+
+
+def parse_mpf(data: bytes) -> List[Tuple[int, int]]:
+    """``(offset, length)`` of the previews listed in an MPF block.
+
+    ``data`` starts at the MP header (after ``MPF\\0``); offsets are relative
+    to it. The primary image and full-size frames are left out.
+    """
+    order = _byte_order(data)
+    if order is None:
+        return []
+    previews = []
+    try:
+        magic, ifd_offset = struct.unpack_from(order + "HI", data, 2)
+        if magic != 42:
+            return []
+        (count,) = struct.unpack_from(order + "H", data, ifd_offset)
+        for i in range(count):
+            tag, kind, n, where = struct.unpack_from(order + "HHII", data, ifd_offset + 2 + 12 * i)
+            if tag == TAG_MP_ENTRY and kind == 7:
+                break
+        else:
+            return []
+        for i in range(n // 16):
+            attribute, length, offset = struct.unpack_from(order + "III", data, where + 16 * i)
+            if (attribute & 0xFFFFFF) in MP_PREVIEW_TYPES and offset and 0 < length <= MAX_PREVIEW_BYTES:
+                previews.append((offset, length))
+    except struct.error:
+        return []
+    return previews
+
+
+def _read_mpf_preview(path: str, orientation: int) -> Optional[Thumbnail]:
+    with open(path, "rb") as fh:
+        if fh.read(2) != b"\xff\xd8":
+            return None
+        for marker, where, data in _jpeg_app_segments(fh):
+            if marker == 0xE2 and data.startswith(MPF_HEADER):
+                break
+        else:
+            return None
+        base = where + len(MPF_HEADER)
+        best = None
+        for offset, length in parse_mpf(data[len(MPF_HEADER):]):
+            fh.seek(base + offset)
+            jpeg = fh.read(length)
+            size = jpeg_dimensions(jpeg) if len(jpeg) == length else None
+            if size is not None and (best is None or size[0] * size[1] > best.width * best.height):
+                best = Thumbnail(jpeg, size[0], size[1], orientation)
+        return best
+
+
+def read_thumbnail(path: str) -> Optional[Thumbnail]:
+    """The largest embedded preview of ``path``: MPF, else IFD1. Never raises."""
+    try:
+        block = read_exif_block(path)
+        thumb = parse_thumbnail(block) if block else None
+        if thumb is not None:
+            orientation = thumb.orientation
+        else:
+            orientation = parse_tiff(block).get("orientation", 1) if block else 1
+        preview = _read_mpf_preview(path, orientation)
+    except OSError:
+        return None
+    return preview or thumb
@@ -0,0 +1,325 @@
+"""Filter expressions for targeted sessions.
+
+A filter restricts the session queue to the images whose metadata-index
+row matches, e.g.::
+
+    size > 8MB and year = 2019
+    format = png and name ~ "Screenshot*"
+    width < 800 or height < 800
+    not (date >= 2020-03-01 and date < 2020-04-01)
+
+Fields:
+
+=============== ==========================================================
+``size``        file size; ``k``/``M``/``G`` suffixes are binary (``8MB``)
+``width``       pixels (a ``px`` suffix is allowed); also ``height``
+``format``      ``jpeg``, ``png``, ``webp``, ``gif``, ``bmp`` (``jpg`` works)
+``name``        file name; ``path`` is the path inside the folder
+``date``        capture time (EXIF, else mtime), ``YYYY-MM-DD[THH:MM[:SS]]``
+``year``        the year of ``date``
+``orientation`` EXIF orientation, 1-8
+``sharpness``   Laplacian variance, once the folder has been scored
+=============== ==========================================================
+
+Operators are ``= == != < <= > >=`` and ``~`` (glob match on ``name`` and
+``path``); combine with ``and``, ``or``, ``not`` and parentheses. Text
+compares case-insensitively. A comparison against a value the image does
+not have (no EXIF, not scored yet) is false.
+
+An expression compiles to a Python predicate over :class:`ImageMeta` rows
+and to an SQL ``WHERE`` clause that can use the index's column indexes;
+both give the same answer.
+"""
+
+import fnmatch
+import os
+import re
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+# SQL for the derived "taken" value. Indexed under exactly this text (see
+# metaindex.FILTER_INDEXES), so it must not be reformatted.
+TAKEN_SQL = "COALESCE(captured, mtime_ns / 1e9)"
+
+NUMERIC = {"size": "size", "width": "width", "height": "height",
+           "orientation": "orientation", "sharpness": "sharpness", "taken": TAKEN_SQL}
+TEXT = {"format": "fold(format)", "name": "fold(basename(path))", "path": "fold(path)"}
+FORMAT_ALIASES = {"jpg": "jpeg", "tif": "tiff"}
+
+_OPS = {"=": "=", "==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "~": "~"}
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<op><=|>=|!=|==|=|<|>|~)
+      | (?P<paren>[()])
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<word>[^\s()<>=!~"']+)
+    )""",
+    re.VERBOSE,
+)
+
+
+class FilterError(ValueError):
+    """The expression could not be parsed; the message says where."""
+
+
+def parse_size(text: str) -> int:
+    """``"500"``, ``"200k"``, ``"1.5M"``, ``"8MB"`` -> bytes (binary units)."""
+    value = text.strip().lower().rstrip("b")
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+    try:
+        return int(float(value[:len(value) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"not a size: {text!r}")
+
+
+def _parse_date(text: str) -> datetime:
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"not a date: {text!r}")
+
+
+# -- parsing ------------------------------------------------------------------
+
+# Nodes: ("and", [nodes]), ("or", [nodes]), ("not", node), ("cmp", key, op, value).
+Node = tuple
+
+
+def _tokenize(text: str) -> List[Tuple[str, str, int]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise FilterError(f"unexpected {text[pos:].lstrip()[:1]!r} at {pos + 1}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        tokens.append((kind, value, match.start(kind) + 1))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.i = 0
+
+    def peek(self) -> Optional[Tuple[str, str, int]]:
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def keyword(self, word: str) -> bool:
+        token = self.peek()
+        if token is not None and token[0] == "word" and token[1].lower() == word:
+            self.i += 1
+            return True
+        return False
+
+    def take(self, what: str) -> Tuple[str, str, int]:
+        token = self.peek()
+        if token is None:
+            raise FilterError(f"expected {what} at the end")
+        self.i += 1
+        return token
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise FilterError("empty filter")
+        node = self.expr()
+        token = self.peek()
+        if token is not None:
+            raise FilterError(f"unexpected {token[1]!r} at {token[2]}")
+        return node
+
+    def expr(self) -> Node:
+        parts = [self.conjunction()]
+        while self.keyword("or"):
+            parts.append(self.conjunction())
+        return parts[0] if len(parts) == 1 else ("or", parts)
+
+    def conjunction(self) -> Node:
+        parts = [self.negation()]
+        while self.keyword("and"):
+            parts.append(self.negation())
+        return parts[0] if len(parts) == 1 else ("and", parts)
+
+    def negation(self) -> Node:
+        if self.keyword("not"):
+            return ("not", self.negation())
+        token = self.peek()
+        if token is not None and token[0] == "paren" and token[1] == "(":
+            self.i += 1
+            node = self.expr()
+            close = self.take("')'")
+            if close[1] != ")":
+                raise FilterError(f"expected ')' at {close[2]}")
+            return node
+        return self.comparison()
+
+    def comparison(self) -> Node:
+        field_token = self.take("a field")
+        op_token = self.take("an operator")
+        value_token = self.take("a value")
+        if field_token[0] != "word":
+            raise FilterError(f"expected a field at {field_token[2]}")
+        if op_token[0] != "op":
+            raise FilterError(f"expected an operator after {field_token[1]!r} at {op_token[2]}")
+        if value_token[0] not in ("word", "string"):
+            raise FilterError(f"expected a value at {value_token[2]}")
+        try:
+            return _comparison(field_token[1].lower(), _OPS[op_token[1]], value_token[1])
+        except ValueError as exc:
+            raise FilterError(f"{exc} at {field_token[2]}")
+
+
+def _comparison(field: str, op: str, value: str) -> Node:
+    if field in ("year", "date"):
+        if op == "~":
+            raise ValueError(f"'~' does not apply to {field}")
+        if field == "year":
+            try:
+                year = int(value)
+            except ValueError:
+                raise ValueError(f"not a year: {value!r}")
+            start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+        else:
+            start = _parse_date(value)
+            # A bare day covers the whole day; a time is an instant.
+            end = datetime.fromordinal(start.toordinal() + 1) if len(value) <= 10 else start
+        return _range("taken", op, start.timestamp(), end.timestamp())
+    if field in ("size", "width", "height", "orientation", "sharpness"):
+        if op == "~":
+            raise ValueError(f"'~' does not apply to {field}")
+        if field == "size":
+            number = parse_size(value)
+        else:
+            text = value.lower()
+            text = text[:-2] if text.endswith("px") else text
+            try:
+                number = float(text) if field == "sharpness" else int(text)
+            except ValueError:
+                raise ValueError(f"not a number: {value!r}")
+        return ("cmp", field, op, number)
+    if field in TEXT:
+        if op not in ("=", "!=", "~"):
+            raise ValueError(f"{field} only supports =, != and ~")
+        if op == "~" and field == "format":
+            raise ValueError("'~' does not apply to format")
+        text = value.casefold()
+        if field == "format":
+            text = FORMAT_ALIASES.get(text, text)
+        return ("cmp", field, op, text)
+    raise ValueError(f"unknown field {field!r}")
+
+
+def _range(key: str, op: str, start: float, end: float) -> Node:
+    """A year or day (``[start, end)``) compared as a span of time."""
+    if start == end:  # an instant
+        return ("cmp", key, op, start)
+    within = ("and", [("cmp", key, ">=", start), ("cmp", key, "<", end)])
+    return {
+        "=": within,
+        "!=": ("not", within),
+        "<": ("cmp", key, "<", start),
+        "<=": ("cmp", key, "<", end),
+        ">": ("cmp", key, ">=", end),
+        ">=": ("cmp", key, ">=", start),
+    }[op]
+
+
+# -- compiling ----------------------------------------------------------------
+
+
+def _getter(key: str) -> Callable:
+    if key == "taken":
+        return lambda row: row.captured if row.captured is not None else row.mtime_ns / 1e9
+    if key == "format":
+        return lambda row: row.format.casefold() if row.format else None
+    if key == "name":
+        return lambda row: os.path.basename(row.path).casefold()
+    if key == "path":
+        return lambda row: row.path.casefold()
+    return lambda row: getattr(row, key)
+
+
+_COMPARE = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "~": lambda a, b: fnmatch.fnmatchcase(a, b),
+}
+
+
+def _to_python(node: Node) -> Callable:
+    kind = node[0]
+    if kind == "and":
+        parts = [_to_python(n) for n in node[1]]
+        return lambda row: all(p(row) for p in parts)
+    if kind == "or":
+        parts = [_to_python(n) for n in node[1]]
+        return lambda row: any(p(row) for p in parts)
+    if kind == "not":
+        inner = _to_python(node[1])
+        return lambda row: not inner(row)
+    _cmp, key, op, value = node
+    get = _getter(key)
+    compare = _COMPARE[op]
+
+    def test(row) -> bool:
+        actual = get(row)
+        return actual is not None and compare(actual, value)
+    return test
+
+
+def _to_sql(node: Node, params: list) -> str:
+    kind = node[0]
+    if kind in ("and", "or"):
+        return "(" + f" {kind.upper()} ".join(_to_sql(n, params) for n in node[1]) + ")"
+    if kind == "not":
+        # A comparison with NULL is false on the Python side, so its
+        # negation is true; SQL would give NULL for both.
+        return f"(NOT COALESCE({_to_sql(node[1], params)}, 0))"
+    _cmp, key, op, value = node
+    column = NUMERIC.get(key) or TEXT[key]
+    params.append(value)
+    if op == "~":
+        return f"name_glob(?, {column})"
+    # Bare comparisons, so SQLite can use the column indexes.
+    return f"{column} {op} ?"
+
+
+class Filter:
+    """A parsed filter expression.
+
+    ``matches(row)`` tests one :class:`ImageMeta`; ``sql`` and ``params``
+    form the equivalent ``WHERE`` clause for ``MetadataIndex.query``.
+    """
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        tree = _Parser(self.text).parse()
+        self.matches: Callable = _to_python(tree)
+        self.params: list = []
+        self.sql = _to_sql(tree, self.params)
+
+    def __call__(self, row) -> bool:
+        return self.matches(row)
+
+    def __repr__(self) -> str:
+        return f"Filter({self.text!r})"
+
+
+def sql_functions() -> List[Tuple[str, int, Callable]]:
+    """``(name, nargs, func)`` to register on a connection before ``Filter.sql`` runs."""
+    return [
+        ("fold", 1, lambda s: s.casefold() if isinstance(s, str) else None),
+        ("basename", 1, lambda s: os.path.basename(s) if isinstance(s, str) else None),
+        ("name_glob", 2, lambda p, s: fnmatch.fnmatchcase(s, p) if isinstance(s, str) else None),
+    ]
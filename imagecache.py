@@ -0,0 +1,146 @@
+"""In-memory LRU cache of decoded images, bounded by bytes.
+
+One :class:`ImageCache` is shared by the app's decoded photos and the deck's
+copies scaled to the screen, so both draw on the same memory budget instead
+of each emptying itself at a fixed entry count.
+
+- Entries are charged ``width * height * depth / 8`` bytes (pixmaps and
+  images both qualify). Inserting past the budget evicts the least recently
+  used entries until the total fits again.
+- Keys are tuples naming the source, the target size and, for anything
+  scaled to the screen, the device pixel ratio; the cache only hashes them.
+- :meth:`~ImageCache.pin` protects the keys an owner is about to show (the
+  current card, the cards behind it). Pinned entries are never evicted; if
+  they alone exceed the budget the cache runs over it rather than drop them.
+- ``hits``/``misses``/``evictions`` are kept in :meth:`~ImageCache.stats`
+  and also counted as ``imagecache.*`` metrics.
+
+Thread-safe; values are never copied, so a QPixmap must still only be
+touched on the GUI thread.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set
+
+import metrics
+
+DEFAULT_BUDGET = 256 * 1024 ** 2
+
+
+def image_bytes(image) -> int:
+    """Memory held by a QImage or QPixmap (0 for a null one)."""
+    return image.width() * image.height() * max(1, image.depth()) // 8
+
+
+class ImageCache:
+    """Least-recently-used images within a byte budget, with pinning. Thread-safe."""
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, sizeof: Callable[[Any], int] = image_bytes):
+        self.budget = budget
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()  # oldest first
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._pins: Dict[Hashable, Set[Hashable]] = {}  # owner -> keys
+        self._pinned: Set[Hashable] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key) -> Optional[Any]:
+        """The value for ``key``, now the most recently used, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.count("imagecache.hits" if value is not None else "imagecache.misses")
+        return value
+
+    def peek(self, key) -> Optional[Any]:
+        """Like :meth:`get`, without touching recency or the statistics."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._remove(key)
+            size = self._sizeof(value)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            evicted = self._evict()
+        if evicted:
+            metrics.count("imagecache.evictions", evicted)
+
+    def discard(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        """Drop every entry. Pins stay: they name what is wanted, not what is held."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def pin(self, owner: Hashable, keys: Iterable[Hashable]):
+        """Protect ``keys`` from eviction, replacing what ``owner`` pinned before."""
+        with self._lock:
+            keys = set(keys)
+            if keys:
+                self._pins[owner] = keys
+            else:
+                self._pins.pop(owner, None)
+            self._pinned = set().union(*self._pins.values())
+            evicted = self._evict()
+        if evicted:
+            metrics.count("imagecache.evictions", evicted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "budget": self.budget,
+                "pinned": sum(1 for key in self._pinned if key in self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # -- internals (lock held) ---------------------------------------------
+
+    def _remove(self, key):
+        if self._entries.pop(key, None) is not None:
+            self._bytes -= self._sizes.pop(key)
+
+    def _evict(self) -> int:
+        if self._bytes <= self.budget:
+            return 0
+        evicted = 0
+        # The newest entry is about to be used; it stays even if alone too big.
+        for key in list(self._entries)[:-1]:
+            if self._bytes <= self.budget:
+                break
+            if key in self._pinned:
+                continue
+            self._remove(key)
+            evicted += 1
+        self.evictions += evicted
+        return evicted
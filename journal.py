@@ -0,0 +1,324 @@
+"""Append-only session journal for instant resume and crash recovery.
+
+The journal lives at ``<images_dir>/.photo-deleter/journal.log`` and holds
+one JSON object per line. Paths are stored relative to ``images_dir`` so a
+session survives the folder being moved or remounted.
+
+Record kinds (``op``):
+
+- ``session``   first line of a journal
+- ``scan``      one published scan batch: ``tier`` and ``names``
+- ``scan_done`` the scan finished; the ``scan`` records are the whole folder,
+                or the part of it matching ``filter`` when that is set
+- ``move``      intent, written before the file is touched:
+                ``id``, ``kind`` (keep|delete|undo), ``src``, ``dest``
+- ``done`` / ``fail`` / ``cancel``  outcome of move ``id``
+- ``skip``      the user skipped ``path``
+- ``gone``      ``path`` was removed from the folder by another program
+- ``state``     counters carried over when a journal is rewritten
+- ``mtime``     ``images_dir`` mtime at a checkpoint, used to decide whether
+                the recorded image list can be trusted without a rescan
+
+Writes are buffered and flushed with ``fsync`` in groups: before a move
+runs, when the move queue goes idle, and at close.
+"""
+
+import filecmp
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from moves import partial_path
+
+JOURNAL_DIR = ".photo-deleter"
+JOURNAL_NAME = "journal.log"
+VERSION = 1
+
+
+class ResumeState:
+    """Session state rebuilt from a journal by :func:`replay`.
+
+    ``images`` maps remaining relative paths to their scan tier and
+    ``moved_tiers`` does the same for files sitting in kept/ or deleted/.
+    ``history`` holds ``(action, dest, src, move_id)`` tuples, oldest first.
+    ``cursor`` is ``(path, tier, inclusive)``: the UI resumes at ``path`` when
+    ``inclusive``, otherwise at the first image after it.
+    ``in_flight`` lists move records that have no outcome yet.
+    ``scan_filter`` is the filter text the image list was recorded under.
+    """
+
+    def __init__(self):
+        self.images: Dict[str, int] = {}
+        self.moved_tiers: Dict[str, int] = {}
+        self.history: List[Tuple[str, str, str, int]] = []
+        self.skipped = 0
+        self.total = 0
+        self.next_tier = 0
+        self.next_move_id = 0
+        self.cursor: Optional[Tuple[str, int, bool]] = None
+        self.scan_complete = False
+        self.scan_filter: Optional[str] = None
+        self.mtime_ns: Optional[int] = None
+        self.in_flight: List[dict] = []
+
+    def counts(self) -> Tuple[int, int]:
+        kept = sum(1 for action, *_ in self.history if action == "keep")
+        return kept, len(self.history) - kept
+
+    def repair(self, images_dir: str) -> List[Tuple[int, str]]:
+        """Settle moves that were interrupted by a crash, using the filesystem.
+
+        Returns ``(move_id, "done"|"fail")`` pairs for the caller to journal.
+        The temporary file (``moves.partial_path``) of a copy that had not
+        finished is removed. A move whose source and destination both exist
+        was a cross-device copy interrupted before the source was unlinked;
+        the destination is removed only if it is byte for byte a copy of the
+        source. Anything else there is not ours, so both files stay and the
+        move is marked failed.
+        """
+        outcomes = []
+        for rec in self.in_flight:
+            src = os.path.normpath(os.path.join(images_dir, rec["src"]))
+            dest = os.path.normpath(os.path.join(images_dir, rec["dest"]))
+            if os.path.lexists(partial_path(dest)):
+                try:
+                    os.remove(partial_path(dest))
+                except OSError as exc:
+                    print(f"Could not remove partial copy {partial_path(dest)}: {exc}")
+            src_there = os.path.lexists(src)
+            dest_there = os.path.lexists(dest)
+            if dest_there and not src_there:
+                outcomes.append((rec["id"], "done"))
+                continue
+            if not src_there:
+                # Both gone: nothing left to undo or redo.
+                outcomes.append((rec["id"], "done"))
+                continue
+            if dest_there and _same_content(src, dest):
+                try:
+                    os.remove(dest)
+                except OSError as exc:
+                    print(f"Could not remove interrupted copy {dest}: {exc}")
+            _revert_move(self, rec)
+            outcomes.append((rec["id"], "fail"))
+        self.in_flight = []
+        return outcomes
+
+
+def _same_content(a: str, b: str) -> bool:
+    try:
+        return (
+            os.path.isfile(a) and os.path.isfile(b)
+            and os.path.getsize(a) == os.path.getsize(b)
+            and filecmp.cmp(a, b, shallow=False)
+        )
+    except OSError:
+        return False
+
+
+def replay(records: List[dict]) -> ResumeState:
+    """Fold journal records into a :class:`ResumeState` in O(records)."""
+    state = ResumeState()
+    moves: Dict[int, dict] = {}
+    settled = set()
+
+    for rec in records:
+        op = rec.get("op")
+        if op == "scan":
+            tier = rec["tier"]
+            for name in rec["names"]:
+                state.images[name] = tier
+            state.total += len(rec["names"])
+            state.next_tier = max(state.next_tier, tier + 1)
+        elif op == "scan_done":
+            state.scan_complete = True
+            state.scan_filter = rec.get("filter")
+        elif op == "move":
+            moves[rec["id"]] = rec
+            state.next_move_id = max(state.next_move_id, rec["id"] + 1)
+            _apply_move(state, rec)
+        elif op == "done":
+            settled.add(rec["id"])
+        elif op in ("fail", "cancel"):
+            settled.add(rec["id"])
+            if rec["id"] in moves:
+                _revert_move(state, moves[rec["id"]])
+        elif op == "skip":
+            state.skipped += 1
+            path = rec["path"]
+            state.cursor = (path, state.images.get(path, 0), False)
+        elif op == "gone":
+            if state.images.pop(rec["path"], None) is not None:
+                state.total -= 1
+        elif op == "state":
+            state.skipped = rec.get("skipped", state.skipped)
+            state.total = rec.get("total", state.total)
+        elif op == "mtime":
+            state.mtime_ns = rec["ns"]
+
+    state.in_flight = [rec for move_id, rec in moves.items() if move_id not in settled]
+    return state
+
+
+def _apply_move(state: ResumeState, rec: dict):
+    kind, src, dest = rec["kind"], rec["src"], rec["dest"]
+    if kind == "undo":
+        tier = state.moved_tiers.pop(src, 0)
+        for i in range(len(state.history) - 1, -1, -1):
+            if state.history[i][1] == src:
+                del state.history[i]
+                break
+        state.images[dest] = tier
+        state.cursor = (dest, tier, True)
+    else:
+        tier = state.images.pop(src, 0)
+        state.moved_tiers[dest] = tier
+        state.history.append((kind, dest, src, rec["id"]))
+        state.cursor = (src, tier, False)
+
+
+def _revert_move(state: ResumeState, rec: dict):
+    kind, src, dest = rec["kind"], rec["src"], rec["dest"]
+    if kind == "undo":
+        # A failed undo leaves the file where it was; like the UI, the
+        # history entry it popped is not restored.
+        tier = state.images.pop(dest, 0)
+        state.moved_tiers[src] = tier
+        return
+    state.history = [h for h in state.history if h[3] != rec["id"]]
+    state.images[src] = state.moved_tiers.pop(dest, 0)
+
+
+class SessionJournal:
+    """Buffered, fsync'd writer and reader for one folder's journal."""
+
+    FLUSH_INTERVAL = 1.0
+    FLUSH_RECORDS = 256
+
+    def __init__(self, images_dir: str):
+        self.images_dir = images_dir
+        self.dir = os.path.join(images_dir, JOURNAL_DIR)
+        self.path = os.path.join(self.dir, JOURNAL_NAME)
+        self._prefix = os.path.join(images_dir, "")
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._fh = None
+
+    # -- paths ------------------------------------------------------------
+
+    def rel(self, path: str) -> str:
+        if path.startswith(self._prefix):
+            return path[len(self._prefix):]
+        return os.path.relpath(path, self.images_dir)
+
+    def abs(self, rel_path: str) -> str:
+        # Normalized, for kept/ and deleted/ outside images_dir ("../").
+        return os.path.normpath(os.path.join(self.images_dir, rel_path))
+
+    # -- reading ------------------------------------------------------------
+
+    def load(self) -> Optional[ResumeState]:
+        """Replay the journal on disk, or return None when there is none.
+
+        A torn last line (crash mid-write) is ignored.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                lines = fh.read().splitlines()
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            print(f"Could not read journal: {exc}")
+            return None
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        if not records or records[0].get("op") != "session" or records[0].get("version") != VERSION:
+            return None
+        return replay(records)
+
+    # -- writing ------------------------------------------------------------
+
+    def start(self):
+        """Begin a fresh journal, replacing any previous one."""
+        with self._lock:
+            os.makedirs(self.dir, exist_ok=True)
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = open(self.path, "w", encoding="utf-8")
+            self._buffer = [json.dumps({"op": "session", "version": VERSION, "t": time.time()})]
+        self.flush()
+
+    def reopen(self):
+        """Continue appending to the journal that :meth:`load` just read."""
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8")
+
+    def append(self, op: str, **fields):
+        fields["op"] = op
+        line = json.dumps(fields, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(line)
+            due = (
+                len(self._buffer) >= self.FLUSH_RECORDS
+                or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records and ``fsync`` them. Cheap when nothing is buffered."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer or self._fh is None:
+                return
+            data = "\n".join(self._buffer) + "\n"
+            self._buffer = []
+            try:
+                self._fh.write(data)
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+            except OSError as exc:
+                print(f"Journal write failed: {exc}")
+
+    def checkpoint(self):
+        """Record the folder's current mtime and flush."""
+        try:
+            mtime_ns = os.stat(self.images_dir).st_mtime_ns
+        except OSError:
+            return
+        self.append("mtime", ns=mtime_ns)
+        self.flush()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def discard(self):
+        """Delete the journal once the session is finished."""
+        with self._lock:
+            self._buffer = []
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                print(f"Could not remove journal: {exc}")
+            try:
+                os.rmdir(self.dir)
+            except OSError:
+                pass
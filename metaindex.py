@@ -0,0 +1,306 @@
+"""Persistent per-folder image metadata index.
+
+The index lives at ``<images_dir>/.photo-deleter/index.sqlite`` (SQLite in
+WAL mode, so several readers and one writer never block each other). Rows
+are keyed by path relative to ``images_dir`` and stamped with the file's
+size and mtime; a row is only re-read from the image when either changed.
+
+Every row is also held in memory once the index is open, so lookups are a
+dict access. Writes go to both. With ``persist=False`` (dry runs) nothing is
+written to the folder: an existing index is copied into an in-memory
+database and the session works on that copy.
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from exif import read_exif
+from filters import TAKEN_SQL, Filter, sql_functions
+from journal import JOURNAL_DIR
+
+INDEX_NAME = "index.sqlite"
+
+# (column, SQL type). New columns are added to existing databases on open,
+# so extending the index is a matter of appending here.
+COLUMNS: List[Tuple[str, str]] = [
+    ("path", "TEXT PRIMARY KEY"),
+    ("size", "INTEGER NOT NULL"),
+    ("mtime_ns", "INTEGER NOT NULL"),
+    ("width", "INTEGER"),
+    ("height", "INTEGER"),
+    ("format", "TEXT"),
+    ("captured", "REAL"),  # EXIF capture time, seconds since the epoch
+    ("orientation", "INTEGER"),  # EXIF orientation tag, 1-8
+    ("dhash", "INTEGER"),
+    ("phash", "INTEGER"),
+    ("digest", "TEXT"),  # full-content hash, hex
+    ("sharpness", "REAL"),  # Laplacian variance, see quality.py
+    ("clip_dark", "REAL"),  # fraction of pixels crushed to black
+    ("clip_bright", "REAL"),  # fraction of pixels blown to white
+]
+FIELDS = [name for name, _ in COLUMNS]
+
+# Column indexes for filter queries (filters.py); the last one matches
+# filters.TAKEN_SQL so date filters can use it.
+FILTER_INDEXES: List[Tuple[str, str]] = [
+    ("images_size", "size"),
+    ("images_width", "width"),
+    ("images_height", "height"),
+    ("images_taken", TAKEN_SQL),
+]
+
+
+class ImageMeta:
+    """One row of the index. Fields that could not be read are None."""
+
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def as_dict(self) -> Dict[str, object]:
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def matches(self, st: os.stat_result) -> bool:
+        return self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+    def __repr__(self) -> str:
+        return (
+            f"ImageMeta({self.path!r}, {self.width}x{self.height} {self.format}, "
+            f"{self.size} B)"
+        )
+
+
+def read_metadata(path: str) -> Dict[str, object]:
+    """Read dimensions and format from the image header, and EXIF fields.
+
+    ``Image.open`` is lazy, so no pixel data is decoded; EXIF comes from
+    the minimal parser in ``exif.py``.
+    """
+    from PIL import Image
+
+    fields: Dict[str, object] = {}
+    try:
+        with Image.open(path) as image:
+            fields["width"], fields["height"] = image.size
+            fields["format"] = image.format
+    except Exception as exc:
+        print(f"Could not read metadata for {path}: {exc}")
+        return fields
+    fields.update(read_exif(path))
+    return fields
+
+
+class MetadataIndex:
+    """SQLite-backed metadata cache for one folder.
+
+    Safe to use from several threads; several processes may open the same
+    index (SQLite serializes the writers).
+    """
+
+    REFRESH_WORKERS = 4
+    BATCH = 256
+
+    def __init__(
+        self,
+        images_dir: str,
+        reader: Callable[[str], Dict[str, object]] = read_metadata,
+        persist: bool = True,
+    ):
+        self.images_dir = os.path.abspath(images_dir)
+        self.path = os.path.join(self.images_dir, JOURNAL_DIR, INDEX_NAME)
+        self._prefix = os.path.join(self.images_dir, "")
+        self._reader = reader
+        self._lock = threading.RLock()
+        if persist:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        else:
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+            self._copy_from_disk()
+        for name, nargs, func in sql_functions():
+            self._db.create_function(name, nargs, func, deterministic=True)
+        self._migrate()
+        self._rows: Dict[str, ImageMeta] = {}
+        for values in self._db.execute(f"SELECT {', '.join(FIELDS)} FROM images"):
+            row = ImageMeta(**dict(zip(FIELDS, values)))
+            self._rows[row.path] = row
+
+    def _copy_from_disk(self):
+        """Load the on-disk index, if there is one, into the in-memory database."""
+        try:
+            source = sqlite3.connect(f"{Path(self.path).as_uri()}?mode=ro", uri=True, timeout=5.0)
+        except sqlite3.Error:
+            return
+        try:
+            source.backup(self._db)
+        except sqlite3.Error as exc:
+            print(f"Could not read the index, starting empty: {exc}")
+        finally:
+            source.close()
+
+    def _migrate(self):
+        with self._db:
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS)
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS images ({columns})")
+            present = {info[1] for info in self._db.execute("PRAGMA table_info(images)")}
+            for name, kind in COLUMNS:
+                if name not in present:
+                    self._db.execute(f"ALTER TABLE images ADD COLUMN {name} {kind}")
+            for name, expression in FILTER_INDEXES:
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON images ({expression})")
+
+    # -- paths ------------------------------------------------------------
+
+    def rel(self, path: str) -> str:
+        if path.startswith(self._prefix):
+            return path[len(self._prefix):]
+        return os.path.relpath(path, self.images_dir)
+
+    # -- queries ------------------------------------------------------------
+
+    def get(self, path: str) -> Optional[ImageMeta]:
+        """Cached row for ``path``, without touching the file."""
+        return self._rows.get(self.rel(path))
+
+    def lookup(self, path: str) -> Optional[ImageMeta]:
+        """Row for ``path``, read from the file first if it is missing or stale."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        row = self.get(path)
+        if row is not None and row.matches(st):
+            return row
+        return self._store([self._read(path, st)])[0]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def query(self, where: Filter) -> Set[str]:
+        """Relative paths of the rows matching ``where``, answered by SQLite."""
+        with self._lock:
+            cursor = self._db.execute(f"SELECT path FROM images WHERE {where.sql}", where.params)
+            return {path for (path,) in cursor}
+
+    # -- updates ------------------------------------------------------------
+
+    def _read(self, path: str, st: os.stat_result) -> ImageMeta:
+        fields = self._reader(path)
+        fields.update(path=self.rel(path), size=st.st_size, mtime_ns=st.st_mtime_ns)
+        return ImageMeta(**fields)
+
+    def _store(self, rows: Sequence[ImageMeta]) -> Sequence[ImageMeta]:
+        if not rows:
+            return rows
+        placeholders = ", ".join("?" for _ in FIELDS)
+        sql = f"INSERT OR REPLACE INTO images ({', '.join(FIELDS)}) VALUES ({placeholders})"
+        with self._lock:
+            with self._db:
+                self._db.executemany(sql, [tuple(getattr(r, f) for f in FIELDS) for r in rows])
+            for row in rows:
+                self._rows[row.path] = row
+        return rows
+
+    def refresh(
+        self,
+        paths: Iterable[str],
+        cancel: Optional[threading.Event] = None,
+        prune: bool = False,
+    ) -> int:
+        """Bring the rows for ``paths`` up to date; returns how many were re-read.
+
+        Only files whose size or mtime changed are opened, on a small thread
+        pool. With ``prune``, rows for files that no longer exist are dropped.
+        """
+        paths = list(paths)
+        stale: List[Tuple[str, os.stat_result]] = []
+        for path in paths:
+            if cancel is not None and cancel.is_set():
+                return 0
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            row = self.get(path)
+            if row is None or not row.matches(st):
+                stale.append((path, st))
+
+        updated = 0
+        if stale:
+            with ThreadPoolExecutor(max_workers=self.REFRESH_WORKERS, thread_name_prefix="meta") as pool:
+                for i in range(0, len(stale), self.BATCH):
+                    if cancel is not None and cancel.is_set():
+                        break
+                    chunk = stale[i:i + self.BATCH]
+                    rows = list(pool.map(lambda item: self._read(*item), chunk))
+                    self._store(rows)
+                    updated += len(rows)
+        if prune and not (cancel is not None and cancel.is_set()):
+            listed = {self.rel(p) for p in paths}
+            gone = [
+                rel for rel in list(self._rows)
+                if rel not in listed and not os.path.lexists(os.path.join(self.images_dir, rel))
+            ]
+            self._delete(gone)
+        return updated
+
+    def update(self, path: str, **fields):
+        """Set extra fields (hashes, scores) on an existing row."""
+        self.update_many([(path, fields)])
+
+    def update_many(self, updates: Iterable[Tuple[str, Dict[str, object]]]):
+        """Apply several :meth:`update` calls in one transaction."""
+        statements = []
+        with self._lock:
+            for path, fields in updates:
+                unknown = set(fields) - set(FIELDS[3:])
+                if unknown:
+                    raise ValueError(f"Unknown index fields: {sorted(unknown)}")
+                row = self.get(path)
+                if row is None or not fields:
+                    continue
+                for name, value in fields.items():
+                    setattr(row, name, value)
+                assignments = ", ".join(f"{name} = ?" for name in fields)
+                statements.append(
+                    (f"UPDATE images SET {assignments} WHERE path = ?", (*fields.values(), row.path))
+                )
+            with self._db:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+
+    def rename(self, src: str, dest: str):
+        """Follow a file that was moved without changing its content."""
+        with self._lock:
+            row = self._rows.pop(self.rel(src), None)
+            if row is None:
+                return
+            row.path = self.rel(dest)
+            self._rows[row.path] = row
+            with self._db:
+                self._db.execute("DELETE FROM images WHERE path = ?", (row.path,))
+                self._db.execute("UPDATE images SET path = ? WHERE path = ?", (row.path, self.rel(src)))
+
+    def forget(self, paths: Iterable[str]):
+        self._delete([self.rel(p) for p in paths])
+
+    def _delete(self, rels: List[str]):
+        if not rels:
+            return
+        with self._lock:
+            with self._db:
+                self._db.executemany("DELETE FROM images WHERE path = ?", [(r,) for r in rels])
+            for rel in rels:
+                self._rows.pop(rel, None)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,261 @@
+"""In-process latency histograms and counters for the hot paths.
+
+Off by default. While disabled, ``timed`` wrappers and ``timer`` blocks cost
+one flag check and ``count``/``observe`` return immediately, so the
+instrumentation stays in the code for good.
+
+Enable it with ``enable()`` or the ``PHOTO_DELETER_METRICS`` environment
+variable: ``1`` just records, a file path also writes a report there at
+exit. ``write(path)`` exports on demand; a ``.prom`` or ``.txt`` path gets
+the Prometheus text format (node_exporter's textfile collector reads it),
+anything else JSON.
+
+Histograms use fixed log-spaced buckets, eight per doubling from 1 µs to
+about two minutes, so recording is O(log buckets) with no allocation and a
+percentile is within a few percent of the exact value.
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+ENV_VAR = "PHOTO_DELETER_METRICS"
+PREFIX = "photo_deleter_"
+QUANTILES = (0.5, 0.95, 0.99)
+
+_STEPS_PER_DOUBLING = 8
+_MIN_SECONDS = 1e-6
+_BOUNDS: List[float] = [
+    _MIN_SECONDS * 2 ** (i / _STEPS_PER_DOUBLING) for i in range(27 * _STEPS_PER_DOUBLING + 1)
+]
+
+
+class Histogram:
+    """Latency distribution in seconds. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = [0] * (len(_BOUNDS) + 1)  # the last one is overflow
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(_BOUNDS, seconds)
+        with self._lock:
+            self._buckets[i] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Estimate of the ``q`` quantile (0-1); 0.0 when nothing was recorded."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self._buckets):
+                if n and seen + n >= rank:
+                    lower = _BOUNDS[i - 1] if i else 0.0
+                    upper = _BOUNDS[i] if i < len(_BOUNDS) else self.max
+                    # Interpolate inside the bucket, within what was seen.
+                    lower, upper = max(lower, self.min), min(upper, self.max)
+                    return lower + (upper - lower) * (rank - seen) / n
+                seen += n
+            return self.max
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            count, total = self.count, self.total
+            low, high = (self.min, self.max) if count else (0.0, 0.0)
+        out = {"count": count, "sum": total, "min": low, "max": high,
+               "mean": total / count if count else 0.0}
+        for q in QUANTILES:
+            out[f"p{round(q * 100)}"] = self.percentile(q)
+        return out
+
+
+_enabled = False
+_lock = threading.Lock()
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, int] = {}
+_exit_path: Optional[str] = None
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def export_path() -> Optional[str]:
+    """Where the report is written at exit, if anywhere."""
+    return _exit_path
+
+
+def enable(on: bool = True, export_at_exit: Optional[str] = None):
+    """Start (or stop) recording; with ``export_at_exit``, write a report there at exit."""
+    global _enabled, _exit_path
+    _enabled = on
+    if export_at_exit:
+        if _exit_path is None:
+            atexit.register(_write_at_exit)
+        _exit_path = export_at_exit
+
+
+def reset():
+    """Drop everything recorded so far."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def observe(name: str, seconds: float):
+    """Record one latency sample for ``name``."""
+    if not _enabled:
+        return
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+
+def count(name: str, n: int = 1):
+    """Add ``n`` to the counter ``name``."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str):
+    """``with timer("scan"):`` records the block's duration when enabled."""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording each call's duration (exceptions included) under ``name``."""
+
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# -- export -------------------------------------------------------------------
+
+
+def snapshot() -> Dict[str, Dict]:
+    """``{"histograms": {name: summary}, "counters": {name: value}}``."""
+    with _lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+    return {
+        "histograms": {name: histograms[name].summary() for name in sorted(histograms)},
+        "counters": {name: counters[name] for name in sorted(counters)},
+    }
+
+
+def to_json() -> str:
+    return json.dumps(snapshot(), indent=2) + "\n"
+
+
+def _metric_name(name: str) -> str:
+    return PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def to_prometheus() -> str:
+    """Prometheus text exposition: a summary per histogram, a counter per counter."""
+    data = snapshot()
+    lines = []
+    for name, summary in data["histograms"].items():
+        metric = _metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for q in QUANTILES:
+            lines.append(f'{metric}{{quantile="{q}"}} {summary[f"p{round(q * 100)}"]:.9g}')
+        lines.append(f"{metric}_sum {summary['sum']:.9g}")
+        lines.append(f"{metric}_count {summary['count']}")
+    for name, value in data["counters"].items():
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path: str) -> str:
+    """Write a report to ``path`` (format from the extension) atomically; returns the path."""
+    text = to_prometheus() if path.endswith((".prom", ".txt")) else to_json()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+    return path
+
+
+def _write_at_exit():
+    if _exit_path is None:
+        return
+    try:
+        write(_exit_path)
+    except OSError as exc:
+        print(f"Could not write metrics to {_exit_path}: {exc}")
+
+
+def _configure_from_env():
+    value = os.environ.get(ENV_VAR, "").strip()
+    if not value or value == "0":
+        return
+    enable(export_at_exit=None if value == "1" else value)
+
+
+_configure_from_env()
@@ -0,0 +1,410 @@
+"""File moves for the backend.
+
+``move_file`` moves one file, also across filesystems, so that a crash at
+any point leaves either the source or a complete, synced destination.
+
+``MoveExecutor`` applies moves on a single worker thread, strictly in
+submission order, so a keep followed by an undo of the same file can never
+be reordered. Jobs that have not started yet can be cancelled outright.
+
+``run_bulk`` fans a large, order-independent batch of file operations (the
+Finish step's purge and restore) out over a bounded thread pool.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+# Cross-device copies go in pieces of this size, with a progress call after each.
+COPY_CHUNK = 8 * 1024 * 1024
+PARTIAL_SUFFIX = ".part"
+
+# Errors after which the next copy method is tried instead of failing.
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+# os.link errors meaning the filesystem has no hard links (FAT, some shares).
+_NO_LINKS = {errno.EPERM, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK}
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class VerifyError(OSError):
+    """The copy's checksum did not match the source; the source was kept."""
+
+
+def partial_path(dest: str) -> str:
+    """Hidden temp name a cross-device copy to ``dest`` is written under."""
+    directory, name = os.path.split(dest)
+    return os.path.join(directory, "." + name + PARTIAL_SUFFIX)
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows, where directories cannot be opened
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _copy_data(src_fd: int, dst_fd: int, size: int, progress: Optional[Callable[[int, int], None]]):
+    """Copy ``size`` bytes in ``COPY_CHUNK`` pieces, in the kernel when it can.
+
+    Tries ``copy_file_range`` (which may reflink or copy server-side on
+    NFS/SMB), then ``sendfile``, then plain reads and writes; a method the
+    filesystem does not support is dropped for the rest of the file.
+    """
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append("copy_file_range")
+    if hasattr(os, "sendfile"):
+        methods.append("sendfile")
+    methods.append("readwrite")
+    copied = 0
+    while copied < size:
+        count = min(COPY_CHUNK, size - copied)
+        method = methods[0]
+        try:
+            if method == "copy_file_range":
+                n = os.copy_file_range(src_fd, dst_fd, count, copied, copied)
+            elif method == "sendfile":
+                os.lseek(dst_fd, copied, os.SEEK_SET)
+                n = os.sendfile(dst_fd, src_fd, copied, count)
+            else:
+                os.lseek(dst_fd, copied, os.SEEK_SET)
+                n = os.write(dst_fd, os.pread(src_fd, count, copied))
+        except OSError as exc:
+            if method != "readwrite" and exc.errno in _UNSUPPORTED:
+                methods.pop(0)
+                continue
+            raise
+        if n == 0:
+            raise OSError(errno.EIO, "source file ended early")
+        copied += n
+        if progress is not None:
+            progress(copied, size)
+
+
+def _file_digest(path: str) -> bytes:
+    digest = hashlib.blake2b()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(COPY_CHUNK), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def rename_noreplace(src: str, dest: str):
+    """``os.rename`` that never overwrites: raises ``FileExistsError`` instead.
+
+    Links ``src`` as ``dest`` (which fails atomically if the name is taken)
+    and then unlinks ``src``. Where hard links are unsupported, the name is
+    claimed with an ``O_EXCL`` placeholder that the rename then replaces, so
+    nothing another program creates meanwhile can be overwritten. Raises
+    ``OSError(EXDEV)`` across filesystems, like ``os.rename``.
+    """
+    try:
+        os.link(src, dest, follow_symlinks=False)
+    except FileExistsError:
+        raise
+    except OSError as exc:
+        if exc.errno not in _NO_LINKS:
+            raise
+        fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        os.close(fd)
+        try:
+            os.replace(src, dest)
+        except BaseException:
+            _discard(dest)
+            raise
+        return
+    try:
+        os.unlink(src)
+    except BaseException:
+        _discard(dest)
+        raise
+
+
+def move_file(
+    src: str,
+    dest: str,
+    verify: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> str:
+    """Move ``src`` to ``dest``; returns ``dest``.
+
+    Same filesystem: :func:`rename_noreplace`. Otherwise the data is copied
+    into ``partial_path(dest)``, permissions and timestamps are copied, the
+    file is ``fsync``-ed and renamed to ``dest`` the same way (and the
+    directory synced), and only then is ``src`` unlinked. Either way an
+    existing ``dest`` is never overwritten: ``FileExistsError`` is raised
+    and ``src`` stays. With ``verify`` the copy is
+    read back and compared with the source by BLAKE2b first; a mismatch
+    raises :class:`VerifyError` and leaves ``src`` alone.
+    ``progress(copied, total)`` reports bytes after every chunk of a copy.
+    """
+    try:
+        rename_noreplace(src, dest)
+        return dest
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+
+    tmp = partial_path(dest)
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o600)
+        try:
+            _copy_data(src_fd, dst_fd, size, progress)
+            os.fsync(dst_fd)
+            if verify and hasattr(os, "posix_fadvise"):
+                # Read the copy back from the disk, not the page cache.
+                os.posix_fadvise(dst_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(dst_fd)
+    except BaseException:
+        _discard(tmp)
+        raise
+    finally:
+        os.close(src_fd)
+
+    try:
+        shutil.copystat(src, tmp)
+        if verify and _file_digest(src) != _file_digest(tmp):
+            raise VerifyError(errno.EIO, "copy does not match the source", src)
+        rename_noreplace(tmp, dest)
+    except BaseException:
+        _discard(tmp)
+        raise
+    _fsync_dir(os.path.dirname(dest) or ".")
+    os.unlink(src)
+    return dest
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class MoveJob:
+    """One queued ``src -> dest`` move and its outcome."""
+
+    def __init__(self, src: str, dest: str):
+        self.src = src
+        self.dest = dest
+        self.state = PENDING
+        self.error: Optional[BaseException] = None
+        self._finished = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def __repr__(self) -> str:
+        return f"MoveJob({self.src!r} -> {self.dest!r}, {self.state})"
+
+
+class MoveExecutor:
+    """Ordered write-behind queue of file moves.
+
+    ``on_finished(job)`` is called on the worker thread after every job that
+    ran, whether it succeeded or failed. Cancelled jobs never reach it.
+    ``before_job(job)`` runs on the worker right before a move (the journal
+    uses it to make the intent durable) and ``on_idle()`` whenever the queue
+    has just drained.
+    """
+
+    def __init__(
+        self,
+        on_finished: Optional[Callable[[MoveJob], None]] = None,
+        move_func: Callable[[str, str], object] = move_file,
+        before_job: Optional[Callable[[MoveJob], None]] = None,
+        on_idle: Optional[Callable[[], None]] = None,
+    ):
+        self.on_finished = on_finished
+        self.move_func = move_func
+        self.before_job = before_job
+        self.on_idle = on_idle
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._active: Optional[MoveJob] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="move-executor", daemon=True)
+        self._thread.start()
+
+    def submit(self, src: str, dest: str) -> MoveJob:
+        job = MoveJob(src, dest)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MoveExecutor is closed")
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job
+
+    def cancel(self, job: MoveJob) -> bool:
+        """Drop ``job`` if it has not started. Returns True when it was dropped."""
+        with self._cond:
+            if job.state != PENDING:
+                return False
+            try:
+                self._queue.remove(job)
+            except ValueError:
+                return False
+            job.state = CANCELLED
+            job._finished.set()
+            self._cond.notify_all()
+            return True
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._queue) + (1 if self._active is not None else 0)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every submitted job has finished."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._queue and self._active is None, timeout
+            )
+
+    def close(self):
+        """Finish the queued work, then stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                job.state = RUNNING
+                self._active = job
+
+            try:
+                if self.before_job is not None:
+                    self.before_job(job)
+                self.move_func(job.src, job.dest)
+                job.state = DONE
+            except Exception as exc:
+                job.error = exc
+                job.state = FAILED
+
+            if self.on_finished is not None:
+                try:
+                    self.on_finished(job)
+                except Exception as exc:
+                    print(f"Move callback failed: {exc}")
+
+            with self._cond:
+                idle = not self._queue
+            if idle and self.on_idle is not None:
+                try:
+                    self.on_idle()
+                except Exception as exc:
+                    print(f"Move idle callback failed: {exc}")
+
+            with self._cond:
+                self._active = None
+                job._finished.set()
+                self._cond.notify_all()
+
+
+class BulkResult:
+    """Outcome of :func:`run_bulk`; also passed to progress callbacks.
+
+    ``bytes`` is the size of the files that were processed (freed, for a
+    purge). ``errors`` holds ``(path, message)`` pairs.
+    """
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.done = 0
+        self.bytes = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.cancelled = False
+
+    def __repr__(self) -> str:
+        return (
+            f"BulkResult(done={self.done}/{self.total}, bytes={self.bytes}, "
+            f"errors={len(self.errors)}, cancelled={self.cancelled})"
+        )
+
+
+def _run_batch(op, batch, cancel):
+    done = 0
+    nbytes = 0
+    errors = []
+    for path, size in batch:
+        if cancel is not None and cancel.is_set():
+            break
+        try:
+            op(path)
+            done += 1
+            nbytes += size
+        except Exception as exc:
+            errors.append((path, str(exc)))
+    return done, nbytes, errors
+
+
+def run_bulk(
+    items: Sequence[Tuple[str, int]],
+    op: Callable[[str], object],
+    workers: int = 4,
+    batch_size: int = 64,
+    progress: Optional[Callable[[BulkResult], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> BulkResult:
+    """Apply ``op(path)`` to every ``(path, size)`` in ``items`` in parallel.
+
+    Files are handed to workers in batches of ``batch_size`` to keep the
+    per-file scheduling overhead small, and at most two batches per worker
+    are in flight so ``cancel`` takes effect quickly. ``progress(result)``
+    runs on the calling thread after every batch. Errors are collected, not
+    raised.
+    """
+    result = BulkResult(len(items))
+    batches: Iterable = (items[i:i + batch_size] for i in range(0, len(items), batch_size))
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bulk") as pool:
+        in_flight = set()
+        for batch in batches:
+            if cancel is not None and cancel.is_set():
+                break
+            in_flight.add(pool.submit(_run_batch, op, batch, cancel))
+            if len(in_flight) >= 2 * workers:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                _collect(result, finished, progress)
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            _collect(result, finished, progress)
+    result.cancelled = cancel is not None and cancel.is_set() and result.done < result.total
+    return result
+
+
+def _collect(result, futures, progress):
+    for future in futures:
+        done, nbytes, errors = future.result()
+        result.done += done
+        result.bytes += nbytes
+        result.errors.extend(errors)
+    if progress is not None:
+        progress(result)
@@ -0,0 +1,272 @@
+"""Headless batch triage: ``python -m photo_deleter FOLDER [rules]``.
+
+Drives :class:`backend.ImageBackend` without importing Qt, so it runs on a
+server (e.g. a nightly pre-sort). Rules select photos:
+
+- ``--duplicates``: every byte-identical copy but the first (by name).
+- ``--near-duplicates``: every look-alike but the largest (most pixels,
+  then bytes).
+- ``--quality-below N``: photos whose 0-100 quality score is under ``N``.
+
+Filters (``--smaller-than``, ``--larger-than``, ``--before``, ``--after``)
+narrow what the rules selected; given on their own, they select every
+photo they match. ``--where EXPR`` takes a filter expression (see
+``filters.py``, e.g. ``"format = png and name ~ 'Screenshot*'"``) and
+limits the whole session to the matching photos, like the app's filter.
+
+Selected photos are moved with ``--action`` (delete by default) into
+``deleted/`` or ``kept/``, exactly like the app does, so the app's Finish
+step can purge or restore them later. ``--dest DIR`` puts those two folders
+in this folder's own subfolder of ``DIR`` instead (which may be on another
+drive); ``--verify`` then checksums each copy before the original is
+removed. ``--dry-run`` reports the selection without moving anything and
+writes nothing to the folder: no ``kept/`` or ``deleted/``, and the metadata
+index is only read.
+``--metrics FILE`` records move timings and writes them to ``FILE`` at the
+end (Prometheus text for ``.prom``, else JSON; see ``metrics.py``).
+
+Progress goes to stdout as JSON lines, one object per line with an
+``event`` field; anything the backend prints goes to stderr.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, TextIO
+
+import metrics
+from backend import ImageBackend
+from filters import Filter, FilterError
+from filters import parse_size as _parse_size
+from quality import quality_score
+
+
+def parse_size(text: str) -> int:
+    """``"500"``, ``"200k"``, ``"1.5M"`` -> bytes (binary units)."""
+    try:
+        return _parse_size(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
+def parse_filter(text: str) -> Filter:
+    try:
+        return Filter(text)
+    except FilterError as exc:
+        raise argparse.ArgumentTypeError(f"bad filter: {exc}")
+
+
+def parse_date(text: str) -> float:
+    """ISO date or date-time -> epoch seconds (local time)."""
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a date: {text!r}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m photo_deleter",
+        description="Sort a photo folder by rules, without the GUI.",
+    )
+    parser.add_argument("folder", help="folder of photos to triage")
+    parser.add_argument("--recursive", action="store_true", help="include subfolders")
+    parser.add_argument("--layout", choices=ImageBackend.LAYOUTS, default="mirror",
+                        help="where subfolder photos go inside kept/ and deleted/")
+
+    rules = parser.add_argument_group("rules")
+    rules.add_argument("--duplicates", action="store_true",
+                       help="select every exact copy but the first")
+    rules.add_argument("--near-duplicates", action="store_true",
+                       help="select every look-alike but the largest")
+    rules.add_argument("--threshold", type=int, default=8,
+                       help="max differing hash bits for --near-duplicates (default 8)")
+    rules.add_argument("--quality-below", type=int, metavar="N",
+                       help="select photos scoring under N (0-100)")
+
+    filters = parser.add_argument_group("filters")
+    filters.add_argument("--where", type=parse_filter, metavar="EXPR",
+                         help="only consider photos matching EXPR, e.g. \"size > 8MB and year = 2019\"")
+    filters.add_argument("--smaller-than", type=parse_size, metavar="SIZE")
+    filters.add_argument("--larger-than", type=parse_size, metavar="SIZE")
+    filters.add_argument("--before", type=parse_date, metavar="DATE",
+                         help="taken before DATE (EXIF capture time, else mtime)")
+    filters.add_argument("--after", type=parse_date, metavar="DATE")
+
+    parser.add_argument("--action", choices=("delete", "keep"), default="delete",
+                        help="what to do with selected photos (default: delete)")
+    parser.add_argument("--dest", metavar="DIR",
+                        help="put kept/ and deleted/ under DIR/<folder id> instead of FOLDER "
+                             "(may be another drive)")
+    parser.add_argument("--verify", action="store_true",
+                        help="checksum cross-device copies before removing the original")
+    parser.add_argument("--dry-run", action="store_true", help="report, do not move")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write move timings to FILE (.prom: Prometheus text, else JSON)")
+    return parser
+
+
+class Reporter:
+    """Writes one JSON object per line and flushes, so a pipe sees it at once."""
+
+    def __init__(self, out: TextIO):
+        self.out = out
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, **fields):
+        line = json.dumps({"event": event, **fields}, ensure_ascii=False)
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def progress(self, stage: str) -> Callable[[int, int], None]:
+        return lambda done, total: self("progress", stage=stage, done=done, total=total)
+
+
+def _filters(args, backend: ImageBackend) -> List[Callable[[str], bool]]:
+    checks = []
+
+    def size(path: str) -> Optional[int]:
+        row = backend.index.get(path) if backend.index is not None else None
+        if row is not None:
+            return row.size
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return None
+
+    def taken(path: str) -> Optional[float]:
+        meta = backend.metadata(path)
+        if meta is None:
+            return None
+        return meta.captured if meta.captured is not None else meta.mtime_ns / 1e9
+
+    def check(value: Callable[[str], Optional[float]], test: Callable[[float], bool]):
+        # Files that cannot be read never match.
+        def matches(path: str) -> bool:
+            v = value(path)
+            return v is not None and test(v)
+        checks.append(matches)
+
+    if args.smaller_than is not None:
+        check(size, lambda v: v < args.smaller_than)
+    if args.larger_than is not None:
+        check(size, lambda v: v > args.larger_than)
+    if args.before is not None:
+        check(taken, lambda v: v < args.before)
+    if args.after is not None:
+        check(taken, lambda v: v > args.after)
+    return checks
+
+
+def _pixels_then_bytes(backend: ImageBackend):
+    def key(path: str):
+        meta = backend.metadata(path)
+        if meta is None:
+            return (0, 0)
+        return ((meta.width or 0) * (meta.height or 0), meta.size)
+    return key
+
+
+def select(args, backend: ImageBackend, report: Reporter) -> Dict[str, str]:
+    """Paths to act on, in queue order, mapped to the rule that picked them."""
+    selected: Dict[str, str] = {}
+    has_rule = args.duplicates or args.near_duplicates or args.quality_below is not None
+
+    if args.duplicates:
+        groups = backend.exact_duplicate_groups()
+        for group in groups:
+            for path in group[1:]:
+                selected.setdefault(path, "duplicate")
+        report("rule", rule="duplicates", groups=len(groups))
+    if args.near_duplicates:
+        groups = backend.near_duplicate_groups(
+            args.threshold, progress=report.progress("near-duplicates")
+        )
+        best = _pixels_then_bytes(backend)
+        for group in groups:
+            # max() keeps the first of equals, which is the first in the queue.
+            keep = max(group, key=best)
+            for path in group:
+                if path != keep:
+                    selected.setdefault(path, "near-duplicate")
+        report("rule", rule="near-duplicates", groups=len(groups))
+    if args.quality_below is not None:
+        scores = backend.quality_scores(progress=report.progress("quality"))
+        low = [p for p, s in scores.items() if quality_score(s) < args.quality_below]
+        for path in low:
+            selected.setdefault(path, "quality")
+        report("rule", rule="quality-below", matched=len(low))
+
+    checks = _filters(args, backend)
+    if checks or (args.where is not None and not has_rule):
+        if args.before is not None or args.after is not None:
+            backend.wait_for_index()
+        candidates = selected if has_rule else dict.fromkeys(backend.remaining_images(), "filter")
+        selected = {p: rule for p, rule in candidates.items() if all(c(p) for c in checks)}
+
+    return {path: selected[path] for path in backend.remaining_images() if path in selected}
+
+
+def run(args, out: TextIO) -> int:
+    report = Reporter(out)
+    if args.metrics:
+        metrics.enable()
+    needs_index = bool(
+        args.duplicates or args.near_duplicates or args.quality_below is not None
+        or args.before is not None or args.after is not None
+    )
+    backend = ImageBackend(
+        args.folder, recursive=args.recursive, layout=args.layout, index=needs_index,
+        filter=args.where, dest_root=args.dest, verify_moves=args.verify,
+        persist_index=not args.dry_run,
+        on_move_progress=lambda src, copied, total: report(
+            "copy", path=os.path.relpath(src, args.folder), done=copied, total=total
+        ),
+    )
+    try:
+        report("scan", folder=backend.images_dir, images=backend.total_images)
+        selected = select(args, backend, report)
+        for path, rule in selected.items():
+            report("select", path=os.path.relpath(path, backend.images_dir), rule=rule,
+                   action=args.action)
+        if args.dry_run or not selected:
+            report("done", selected=len(selected), moved=0, bytes=0, errors=0,
+                   dry_run=args.dry_run)
+            return 0
+
+        def moved(result):
+            report("progress", stage=args.action, done=result.done, total=result.total)
+
+        result = backend.move_many(selected, args.action, progress=moved)
+        for path, message in result.errors:
+            report("error", path=os.path.relpath(path, backend.images_dir), message=message)
+        report("done", selected=len(selected), moved=result.done, bytes=result.bytes,
+               errors=len(result.errors), dry_run=False)
+        return 1 if result.errors else 0
+    finally:
+        backend.close()
+        if args.metrics:
+            try:
+                metrics.write(args.metrics)
+            except OSError as exc:
+                print(f"Could not write metrics to {args.metrics}: {exc}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.folder):
+        print(f"Not a folder: {args.folder}", file=sys.stderr)
+        return 2
+    out = sys.stdout
+    # The backend reports problems with print(); keep stdout pure JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        return run(args, out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Off-main-thread image decoding for the swipe deck.
+
+``QImage`` can be built on any thread, ``QPixmap`` only on the GUI thread.
+:class:`DecodePipeline` runs a decode function as ``QRunnable`` jobs on its
+own ``QThreadPool`` and hands back ``QImage`` results; the GUI thread turns
+them into pixmaps.
+
+- :meth:`~DecodePipeline.want` sets the window of images needed next, in
+  priority order. Jobs outside it are cancelled: queued ones are taken back
+  from the pool, a running one finishes but its result is dropped.
+- :meth:`~DecodePipeline.take` collects a result. With ``wait``, a job that
+  no worker has started yet runs on the calling thread rather than queueing
+  behind the others, and a running one is waited for.
+- ``decoded(key)`` is emitted (queued to the GUI thread) as each job ends.
+
+Keys are opaque to the pipeline; they are passed to the decode function as
+its arguments.
+
+:class:`PrefetchPlanner` decides how far ahead to decode and on how many
+workers, from how fast the user is sorting and what decodes have cost.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from PyQt5 import QtCore, QtGui
+
+import metrics
+
+
+class _Job(QtCore.QRunnable):
+    def __init__(self, pipeline: "DecodePipeline", key: tuple):
+        super().__init__()
+        # The pipeline holds the reference; Qt must not delete it.
+        self.setAutoDelete(False)
+        self.pipeline = pipeline
+        self.key = key
+        self.claimed = False  # set, under the pipeline lock, by whoever runs it
+        self.cancelled = False
+        self.done = threading.Event()
+        self.image: Optional[QtGui.QImage] = None
+
+    def run(self):
+        try:
+            self.pipeline._run(self, inline=False)
+        finally:
+            self.pipeline._release(self)
+
+
+class DecodePipeline(QtCore.QObject):
+    """Decodes images on a thread pool ahead of when they are shown."""
+
+    decoded = QtCore.pyqtSignal(object)  # key
+
+    def __init__(self, decode: Callable[..., QtGui.QImage], workers: int = 2, parent=None):
+        super().__init__(parent)
+        self._decode = decode
+        self._pool = QtCore.QThreadPool()
+        self._pool.setMaxThreadCount(workers)
+        self._lock = threading.Lock()
+        # Queued, running, and finished but not yet taken.
+        self._jobs: Dict[Hashable, _Job] = {}
+        # Every job the pool may still run. The pool only holds the C++
+        # object, so the Python one must outlive run() even once cancelled.
+        self._alive: Set[_Job] = set()
+
+    @property
+    def workers(self) -> int:
+        return self._pool.maxThreadCount()
+
+    @workers.setter
+    def workers(self, count: int):
+        # Extra threads start as soon as there is queued work; surplus ones
+        # finish their current job and retire.
+        if count != self._pool.maxThreadCount():
+            self._pool.setMaxThreadCount(count)
+
+    def pending(self) -> int:
+        """Jobs not finished yet."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done.is_set())
+
+    def ready(self, key) -> bool:
+        with self._lock:
+            job = self._jobs.get(key)
+            return job is not None and job.done.is_set()
+
+    # -- scheduling ---------------------------------------------------------
+
+    def want(self, keys: Iterable[tuple]):
+        """Decode ``keys`` (most urgent first); cancel everything else."""
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            wanted = set(keys)
+            for key in [k for k in self._jobs if k not in wanted]:
+                self._cancel(self._jobs.pop(key))
+            for rank, key in enumerate(keys):
+                job = self._jobs.get(key)
+                if job is None:
+                    self._submit(key, len(keys) - rank)
+                elif not job.claimed and self._pool.tryTake(job):
+                    # Still queued: requeue it at its new rank.
+                    self._pool.start(job, len(keys) - rank)
+
+    def request(self, key: tuple, priority: int = 0):
+        """Decode ``key`` too, without cancelling anything."""
+        with self._lock:
+            if key not in self._jobs:
+                self._submit(key, priority)
+
+    def _submit(self, key: tuple, priority: int):
+        job = _Job(self, key)
+        self._jobs[key] = job
+        self._alive.add(job)
+        self._pool.start(job, priority)
+
+    def _cancel(self, job: _Job):
+        job.cancelled = True
+        if not job.claimed and self._pool.tryTake(job):
+            self._alive.discard(job)
+            metrics.count("prefetch.cancelled")
+
+    def _release(self, job: _Job):
+        with self._lock:
+            self._alive.discard(job)
+
+    def clear(self):
+        """Cancel every job and drop every result (a new folder, a re-sort)."""
+        self.want(())
+
+    def shutdown(self):
+        self.clear()
+        self._pool.waitForDone()
+
+    # -- results ------------------------------------------------------------
+
+    def take(self, key: tuple, wait: bool = True) -> Optional[QtGui.QImage]:
+        """The decoded image for ``key``, removing it from the pipeline.
+
+        Without ``wait``, returns None unless it is already finished. With
+        ``wait``, decodes it on this thread if no worker has picked it up.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                if not wait:
+                    return None
+                job = self._jobs[key] = _Job(self, key)
+            inline = wait and not job.claimed
+            if inline:
+                job.claimed = True
+                if self._pool.tryTake(job):
+                    self._alive.discard(job)
+        if inline:
+            self._run(job, inline=True)
+        elif not job.done.is_set():
+            if not wait:
+                return None
+            metrics.count("prefetch.waited")
+            job.done.wait()
+        else:
+            metrics.count("prefetch.ready")
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+        return job.image
+
+    def _run(self, job: _Job, inline: bool):
+        if not inline:
+            with self._lock:
+                if job.cancelled or job.claimed:
+                    return
+                job.claimed = True
+        else:
+            metrics.count("prefetch.inline")
+        try:
+            job.image = self._decode(*job.key)
+        except Exception as exc:
+            print(f"Could not decode {job.key[0]}: {exc}")
+            job.image = QtGui.QImage()
+        job.done.set()
+        if not inline and not job.cancelled:
+            try:
+                self.decoded.emit(job.key)
+            except RuntimeError:  # the receiver is gone (window closed)
+                pass
+
+
+class PrefetchPlanner:
+    """Sizes the look-ahead window and worker count to the user's pace.
+
+    Keeps ``target_seconds`` of sorting (at least ``min_ahead`` cards)
+    decoded ahead, plus the cards that will be swiped past while one decode
+    runs. Workers follow Little's law: swipe rate times decode latency, plus
+    one so a slow file does not stall the queue. The window is capped so the
+    cards it holds fit ``memory_fraction`` of the pixmap cache budget.
+
+    The rate counts actions in the last ``rate_window`` seconds, so it falls
+    back to the minimum once the user pauses. Decode latency and size are
+    moving averages per category (the app uses file extension and target
+    size). Thread-safe: decodes are reported from the workers.
+    """
+
+    SMOOTHING = 0.3  # weight of the newest decode in the moving averages
+
+    def __init__(
+        self,
+        min_ahead: int = 2,
+        max_ahead: int = 12,
+        max_workers: int = 4,
+        target_seconds: float = 1.0,
+        rate_window: float = 5.0,
+        memory_fraction: float = 0.5,
+        default_latency: float = 0.05,
+        default_bytes: int = 1600 * 1200 * 4,
+    ):
+        self.min_ahead = min_ahead
+        self.max_ahead = max_ahead
+        self.max_workers = max_workers
+        self.target_seconds = target_seconds
+        self.rate_window = rate_window
+        self.memory_fraction = memory_fraction
+        self.default_latency = default_latency
+        self.default_bytes = default_bytes
+        self._lock = threading.Lock()
+        self._actions: Deque[float] = deque()
+        self._latency: Dict[Hashable, float] = {}
+        self._bytes: Dict[Hashable, float] = {}
+
+    def note_action(self, now: Optional[float] = None):
+        """The user sorted (or skipped) a card."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._actions.append(now)
+            self._expire(now)
+
+    def note_decode(self, category: Hashable, seconds: float, nbytes: int):
+        with self._lock:
+            for averages, value in ((self._latency, seconds), (self._bytes, nbytes)):
+                old = averages.get(category)
+                averages[category] = value if old is None else old + self.SMOOTHING * (value - old)
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Cards per second over the last ``rate_window`` seconds."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return len(self._actions) / self.rate_window
+
+    def latency(self, category: Hashable) -> float:
+        with self._lock:
+            return self._latency.get(category, self.default_latency)
+
+    def plan(self, category: Hashable, budget: int, now: Optional[float] = None) -> Tuple[int, int]:
+        """``(cards ahead, workers)`` for upcoming photos of ``category``."""
+        rate = self.rate(now)
+        with self._lock:
+            latency = self._latency.get(category, self.default_latency)
+            nbytes = self._bytes.get(category, self.default_bytes)
+        in_flight = math.ceil(rate * latency)
+        ready = max(self.min_ahead, math.ceil(rate * self.target_seconds))
+        fits = int(budget * self.memory_fraction // max(1.0, nbytes))
+        ahead = max(1, min(self.max_ahead, ready + in_flight, fits))
+        workers = max(1, min(self.max_workers, in_flight + 1))
+        return ahead, workers
+
+    def _expire(self, now: float):
+        while self._actions and now - self._actions[0] > self.rate_window:
+            self._actions.popleft()
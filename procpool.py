@@ -0,0 +1,59 @@
+"""Batched process-pool map for the per-image analysis passes.
+
+Perceptual hashing and quality scoring both decode every image, which is
+CPU bound and holds the GIL, so they run in worker processes. Paths go to
+the workers in batches to amortize pickling, and only a bounded number of
+batches is in flight so a cancel takes effect quickly.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def map_in_processes(
+    batch_fn: Callable[[Sequence[str]], List[Tuple[str, Optional[T]]]],
+    paths: Sequence[str],
+    workers: Optional[int] = None,
+    batch_size: int = 32,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, T]:
+    """Run ``batch_fn`` over ``paths`` in a process pool.
+
+    ``batch_fn`` must be a module-level function taking a list of paths and
+    returning ``(path, result)`` pairs; None results are left out.
+    ``progress(done, total)`` runs on the calling thread as batches finish.
+    The pool uses the ``spawn`` start method so it is safe to start from a
+    threaded GUI.
+    """
+    results: Dict[str, T] = {}
+    if not paths:
+        return results
+    workers = workers or min(8, os.cpu_count() or 1)
+    batches = iter([paths[i:i + batch_size] for i in range(0, len(paths), batch_size)])
+    done = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers and not (cancel is not None and cancel.is_set()):
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                pending.add(pool.submit(batch_fn, batch))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for path, result in future.result():
+                    done += 1
+                    if result is not None:
+                        results[path] = result
+            if progress is not None:
+                progress(done, len(paths))
+    return results
@@ -0,0 +1,113 @@
+"""Image quality scores: sharpness and exposure.
+
+Both come from one grayscale decode downscaled to ``ANALYSIS_SIZE`` on its
+longest side, so scores are comparable across camera resolutions:
+
+- sharpness: variance of the 4-neighbour Laplacian. In-focus detail gives
+  strong second derivatives; a blurred or shaken shot scores low.
+- clipping: fraction of pixels crushed to black and blown to white, read
+  off the 256-bin histogram.
+
+Scoring runs in a process pool, like the perceptual hashes.
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from procpool import map_in_processes
+
+ANALYSIS_SIZE = 512
+# Pixel values at or below / at or above these count as clipped.
+SHADOW_LEVEL = 4
+HIGHLIGHT_LEVEL = 251
+
+# Laplacian variance at which a shot counts as fully sharp, and below
+# which it is flagged as blurry (about one pixel of blur at this size).
+SHARP_VARIANCE = 500.0
+BLURRY_VARIANCE = 100.0
+# Fraction of clipped pixels at which exposure scores zero, and above
+# which one end of the histogram is flagged.
+MAX_CLIPPED = 0.5
+CLIPPED_FLAG = 0.15
+
+Scores = Tuple[float, float, float]  # (sharpness, dark, bright)
+
+
+def laplacian_variance(pixels: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian of a 2-D grayscale array."""
+    p = pixels.astype(np.float32, copy=False)
+    if p.shape[0] < 3 or p.shape[1] < 3:
+        return 0.0
+    lap = p[:-2, 1:-1] + p[2:, 1:-1] + p[1:-1, :-2] + p[1:-1, 2:] - 4.0 * p[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def clipping(pixels: np.ndarray) -> Tuple[float, float]:
+    """``(dark, bright)`` fractions of clipped pixels in a uint8 array."""
+    hist = np.bincount(pixels.ravel(), minlength=256)
+    total = float(pixels.size) or 1.0
+    return hist[:SHADOW_LEVEL + 1].sum() / total, hist[HIGHLIGHT_LEVEL:].sum() / total
+
+
+def score_pixels(pixels: np.ndarray) -> Scores:
+    dark, bright = clipping(pixels)
+    return laplacian_variance(pixels), float(dark), float(bright)
+
+
+def score_image(path: str) -> Optional[Scores]:
+    """Scores for one file, or None if it cannot be decoded."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            # As for hashing: JPEG decodes straight to about the target size.
+            image.draft("L", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+            gray = image.convert("L")
+    except Exception:
+        return None
+    gray.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.BILINEAR)
+    return score_pixels(np.asarray(gray, dtype=np.uint8))
+
+
+def quality_score(scores: Scores) -> int:
+    """One 0-100 number for sorting and the badge: the weaker of focus and exposure."""
+    sharpness, dark, bright = scores
+    sharp = min(1.0, sharpness / SHARP_VARIANCE)
+    exposure = max(0.0, 1.0 - (dark + bright) / MAX_CLIPPED)
+    return round(100 * min(sharp, exposure))
+
+
+def quality_issues(scores: Scores) -> List[str]:
+    """Short labels for what is wrong with a shot, worst first."""
+    sharpness, dark, bright = scores
+    issues = []
+    if sharpness < BLURRY_VARIANCE:
+        issues.append("blurry")
+    if dark >= CLIPPED_FLAG and dark >= bright:
+        issues.append("too dark")
+    elif bright >= CLIPPED_FLAG:
+        issues.append("blown out")
+    return issues
+
+
+def _score_batch(paths: Sequence[str]) -> List[Tuple[str, Optional[Scores]]]:
+    return [(path, score_image(path)) for path in paths]
+
+
+def compute_scores(
+    paths: Sequence[str],
+    workers: Optional[int] = None,
+    batch_size: int = 16,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Scores]:
+    """Score ``paths`` in a process pool; unreadable files are left out.
+
+    See ``procpool.map_in_processes`` for batching, ``progress`` and the
+    start method.
+    """
+    return map_in_processes(
+        _score_batch, paths, workers=workers, batch_size=batch_size, progress=progress, cancel=cancel
+    )
@@ -0,0 +1,393 @@
+"""Reproducible performance benchmarks.
+
+Generates synthetic photo folders (1k/10k/100k images, a seeded mix of
+JPEG, PNG and WebP in three sizes, drawn with ``make_demo.make_sample``)
+and measures:
+
+  - scan     ImageBackend start-up: plain scan, then with a cold and a warm
+             metadata index
+  - moves    keep, delete and undo throughput (ops/s)
+  - decode   the app's pixmap loader, per format and size (p50/p95)
+  - frames   offscreen SwipeDeck paint times: idle, dragging, entering, exiting
+
+Folders are hard links to a handful of distinct sample files (copies where
+links are not supported), so 100k images take almost no disk space; the
+scan and move numbers depend on the file count, not on the content.
+
+Results are written as JSON. If a baseline exists, every result is compared
+with it and the script exits 1 when one is worse by more than the
+tolerance, listing each regression.
+
+Run:  QT_QPA_PLATFORM=offscreen python scripts/benchmark.py --save-baseline
+      QT_QPA_PLATFORM=offscreen python scripts/benchmark.py   # compare
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, "scripts")
+for _path in (ROOT, SCRIPTS):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from PyQt5 import QtCore, QtGui, QtWidgets  # noqa: E402
+
+import metrics  # noqa: E402
+from app import ImageSwiper, decode_dim  # noqa: E402
+from backend import ImageBackend  # noqa: E402
+from journal import JOURNAL_DIR  # noqa: E402
+from make_demo import SAMPLES, make_sample, settle  # noqa: E402
+from metaindex import INDEX_NAME  # noqa: E402
+from widgets import SwipeDeck  # noqa: E402
+
+SEED = 20240601
+COUNTS = (1000, 10000, 100000)
+FORMATS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+# Share of each format in the generated folders, roughly a phone camera roll.
+FORMAT_WEIGHTS = {"jpeg": 0.7, "png": 0.2, "webp": 0.1}
+SIZES = ((640, 480), (2000, 1500), (4000, 3000))
+DECK_SIZE = (900, 700)
+FRAMES = 60
+BASELINE = os.path.join(ROOT, ".benchmarks", "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+# Differences below these are noise whatever the percentage.
+NOISE_FLOOR = {"s": 0.005, "ms": 0.5, "ops/s": 0.0}
+
+Results = Dict[str, Dict[str, object]]
+# (format, (width, height)) -> sample file
+Samples = Dict[Tuple[str, Tuple[int, int]], str]
+
+
+def _result(results: Results, name: str, value: float, unit: str, better: str = "lower"):
+    results[name] = {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def _median_time(func: Callable[[], None], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+# -- synthetic data -------------------------------------------------------------
+
+
+def make_samples(directory: str, sizes: Sequence[Tuple[int, int]] = SIZES) -> Samples:
+    """One file per (format, size), rendered once and rescaled; reused if present."""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, "base.png")
+    if not os.path.exists(base):
+        label, c1, c2 = SAMPLES[0]
+        make_sample(base, label, c1, c2)
+    samples = {}
+    with Image.open(base) as image:
+        image.load()
+        for width, height in sizes:
+            scaled = None
+            for fmt, ext in FORMATS.items():
+                path = os.path.join(directory, f"sample_{width}x{height}{ext}")
+                if not os.path.exists(path):
+                    if scaled is None:
+                        scaled = image.resize((width, height), Image.BICUBIC)
+                    scaled.save(path, **({} if fmt == "png" else {"quality": 90}))
+                samples[(fmt, (width, height))] = path
+    return samples
+
+
+def make_folder(directory: str, count: int, samples: Samples) -> str:
+    """``count`` images linked from ``samples`` in a seeded mix; reused when complete."""
+    marker = os.path.join(directory, ".complete")
+    if os.path.exists(marker):
+        return directory
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    rng = random.Random(SEED + count)
+    keys = sorted(samples)
+    weights = [FORMAT_WEIGHTS[fmt] for fmt, _size in keys]
+    for i, key in enumerate(rng.choices(keys, weights, k=count)):
+        dest = os.path.join(directory, f"IMG_{i:06d}{FORMATS[key[0]]}")
+        try:
+            os.link(samples[key], dest)
+        except OSError:
+            shutil.copyfile(samples[key], dest)
+    with open(marker, "w") as fh:
+        fh.write(str(count))
+    return directory
+
+
+# -- benchmarks -------------------------------------------------------------------
+
+
+def bench_scan(results: Results, folder: str, count: int, repeat: int):
+    def plain():
+        ImageBackend(folder).close()
+
+    index_path = os.path.join(folder, JOURNAL_DIR, INDEX_NAME)
+
+    def indexed(cold: bool):
+        def run():
+            if cold:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(index_path + suffix):
+                        os.remove(index_path + suffix)
+            backend = ImageBackend(folder, index=True)
+            backend.wait_for_index()
+            backend.close()
+        return run
+
+    _result(results, f"scan.{count}.plain", _median_time(plain, repeat), "s")
+    _result(results, f"scan.{count}.index_cold", _median_time(indexed(True), repeat), "s")
+    _result(results, f"scan.{count}.index_warm", _median_time(indexed(False), repeat), "s")
+
+
+def bench_moves(results: Results, folder: str, count: int):
+    """Keep a third, delete a third, then undo every move, one call at a time."""
+    backend = ImageBackend(folder)
+    paths = backend.remaining_images()[:count]
+    third = len(paths) // 3
+    moved = []
+
+    def timed(label: str, items, op):
+        start = time.perf_counter()
+        for item in items:
+            dest = op(item)
+            if dest is None:
+                raise RuntimeError(f"{label} failed for {item}")
+            if label != "undo":
+                moved.append(dest)
+        elapsed = time.perf_counter() - start
+        _result(results, f"moves.{label}", len(items) / max(elapsed, 1e-9), "ops/s", "higher")
+
+    timed("keep", paths[:third], backend.keep)
+    timed("delete", paths[third:2 * third], backend.delete)
+    timed("undo", list(reversed(moved)), backend.undo_move)
+    backend.close()
+
+
+def _decode(swiper: ImageSwiper, path: str) -> QtGui.QPixmap:
+    swiper._pixmap_cache.clear()
+    return swiper._load_pixmap(path)
+
+
+def bench_decode(results: Results, samples: Samples, repeat: int):
+    """Cold loads through ``ImageSwiper._load_pixmap`` (no memory or disk cache)."""
+    swiper = ImageSwiper()
+    swiper.thumbnails = None
+    try:
+        for (fmt, (width, height)), path in sorted(samples.items()):
+            histogram = metrics.Histogram()
+            _decode(swiper, path)  # warm the page cache and codec
+            for _ in range(max(repeat, 5)):
+                start = time.perf_counter()
+                if _decode(swiper, path).isNull():
+                    raise RuntimeError(f"could not decode {path}")
+                histogram.observe(time.perf_counter() - start)
+            name = f"decode.{fmt}.{width}x{height}"
+            _result(results, f"{name}.p50", histogram.percentile(0.5) * 1000, "ms")
+            _result(results, f"{name}.p95", histogram.percentile(0.95) * 1000, "ms")
+    finally:
+        swiper.close()
+
+
+def bench_frames(results: Results, samples: Samples):
+    """Paint times of a SwipeDeck rendered offscreen into an image, per scenario."""
+    paths = [path for (fmt, size), path in sorted(samples.items()) if fmt == "jpeg"]
+    deck = SwipeDeck()
+    deck.resize(*DECK_SIZE)
+    # Decoded at the size the app would pick for this deck.
+    dim = decode_dim(deck.card_size(), deck.devicePixelRatioF())
+    pixmaps = [QtGui.QPixmap(path).scaled(dim, dim, QtCore.Qt.KeepAspectRatio) for path in paths]
+    target = QtGui.QImage(deck.size(), QtGui.QImage.Format_ARGB32_Premultiplied)
+    deck.set_image(pixmaps[0])
+    deck.set_upcoming(pixmaps[1:3])
+    settle(deck)
+    deck.render(target)  # fills the scaled-pixmap cache
+
+    def idle(i):
+        pass
+
+    def drag(i):
+        deck._drag = QtCore.QPointF(DECK_SIZE[0] * 0.4 * i / FRAMES, 12)
+
+    def enter(i):
+        deck._drag = QtCore.QPointF(0, 0)
+        deck._enter = i / FRAMES
+
+    def exit_(i):
+        deck._enter = 1.0
+        deck._exit = {"pix": pixmaps[0], "t": i / FRAMES, "dir": "keep",
+                      "off0": QtCore.QPointF(0, 0), "ang0": 0.0}
+
+    for name, setup in (("idle", idle), ("drag", drag), ("enter", enter), ("exit", exit_)):
+        histogram = metrics.Histogram()
+        for i in range(FRAMES):
+            setup(i)
+            start = time.perf_counter()
+            deck.render(target)
+            histogram.observe(time.perf_counter() - start)
+        for q in metrics.QUANTILES:
+            _result(results, f"frames.{name}.p{round(q * 100)}", histogram.percentile(q) * 1000, "ms")
+        deck._exit = None
+
+
+# -- baseline ---------------------------------------------------------------------
+
+
+def compare(results: Results, baseline: Results, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """One message per result worse than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    for name, current in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None or old.get("unit") != current["unit"]:
+            continue
+        now, before = float(current["value"]), float(old["value"])
+        if current["better"] == "higher":
+            worse = now < before / (1 + tolerance)
+        else:
+            worse = now > before * (1 + tolerance)
+        if worse and abs(now - before) > NOISE_FLOOR.get(current["unit"], 0.0):
+            change = (now - before) / before * 100 if before else float("inf")
+            regressions.append(f"{name}: {before:g} -> {now:g} {current['unit']} ({change:+.0f}%)")
+    return regressions
+
+
+def environment() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "qt": QtCore.QT_VERSION_STR,
+        "pillow": Image.__version__,
+        "qpa": os.environ.get("QT_QPA_PLATFORM"),
+    }
+
+
+def _print_table(results: Results, baseline: Optional[Results], out):
+    for name, current in sorted(results.items()):
+        line = f"{name:<34} {current['value']:>12.3f} {current['unit']:<6}"
+        old = (baseline or {}).get(name)
+        if old is not None and old["value"]:
+            line += f" {(current['value'] - old['value']) / old['value'] * 100:+6.0f}%"
+        print(line, file=out)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmark", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--counts", default=",".join(str(c) for c in COUNTS),
+                        help="folder sizes to scan, comma-separated (default: %(default)s)")
+    parser.add_argument("--sizes", default=",".join(f"{w}x{h}" for w, h in SIZES),
+                        help="sample image sizes, comma-separated (default: %(default)s)")
+    parser.add_argument("--moves", type=int, default=1000, help="images to keep/delete/undo")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing; the median is kept")
+    parser.add_argument("--only", default="scan,moves,decode,frames",
+                        help="benchmarks to run, comma-separated (default: all)")
+    parser.add_argument("--workdir", help="keep generated folders here and reuse them")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown as a fraction (default: %(default)s)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None, out=sys.stdout) -> int:
+    args = build_parser().parse_args(argv)
+    only = set(args.only.split(","))
+    counts = [int(c) for c in args.counts.split(",") if c]
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes.split(",") if size]
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])  # noqa: F841
+    workdir = args.workdir or tempfile.mkdtemp(prefix="photo_deleter_bench_")
+    # Keep the app's thumbnail cache out of ~/.cache.
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    os.environ["XDG_CACHE_HOME"] = os.path.join(workdir, "cache")
+    results: Results = {}
+    try:
+        samples = make_samples(os.path.join(workdir, "samples"), sizes)
+        if "scan" in only:
+            for count in counts:
+                folder = make_folder(os.path.join(workdir, f"scan-{count}"), count, samples)
+                print(f"scan {count}…", file=sys.stderr)
+                bench_scan(results, folder, count, args.repeat)
+        if "moves" in only:
+            # Moves change the folder, so it is rebuilt every run.
+            folder = os.path.join(workdir, "moves")
+            shutil.rmtree(folder, ignore_errors=True)
+            print(f"moves {args.moves}…", file=sys.stderr)
+            bench_moves(results, make_folder(folder, args.moves, samples), args.moves)
+        if "decode" in only:
+            print("decode…", file=sys.stderr)
+            bench_decode(results, samples, args.repeat)
+        if "frames" in only:
+            print("frames…", file=sys.stderr)
+            bench_frames(results, samples)
+    finally:
+        if cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = cache_home
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    _print_table(results, baseline["results"] if baseline else None, out)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+        print(f"Saved baseline to {args.baseline}", file=out)
+        return 0
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.", file=out)
+        return 0
+    if baseline["environment"].get("platform") != report["environment"]["platform"]:
+        print("Warning: the baseline was recorded on a different platform.", file=out)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}", file=out)
+    if regressions:
+        print(f"{len(regressions)} result(s) regressed by more than {args.tolerance:.0%}.", file=out)
+        return 1
+    print(f"No regressions against {args.baseline}.", file=out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
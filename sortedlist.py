@@ -0,0 +1,207 @@
+"""Indexed sorted sequence used for the backend's remaining-image queue.
+
+Items live in small sorted blocks (a "blocked list"). A Fenwick tree over
+the block lengths turns a position into a block and back, so membership is
+O(1) and insert, remove, index lookup and random access are all O(log n)
+plus a memmove inside one bounded block.
+"""
+
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+
+class IndexedSortedList:
+    """Set-like sorted sequence with positional access.
+
+    ``key(item)`` is evaluated once, when the item is added, and remembered
+    until it is removed; changing whatever the key depends on afterwards
+    does not corrupt the order. Adding an item that is already present is a
+    no-op.
+    """
+
+    LOAD = 512
+
+    def __init__(self, iterable: Iterable[Hashable] = (), key: Optional[Callable[[Any], Any]] = None):
+        self._key = key if key is not None else (lambda item: item)
+        self._keys: Dict[Hashable, Any] = {}
+        self._blocks: List[List[Tuple[Any, Hashable]]] = []
+        self._maxes: List[Tuple[Any, Hashable]] = []
+        self._tree: List[int] = []
+        self.update(iterable)
+
+    # -- Fenwick tree over block lengths ---------------------------------
+
+    def _rebuild(self, entries: List[Tuple[Any, Hashable]]):
+        load = self.LOAD
+        self._blocks = [entries[i:i + load] for i in range(0, len(entries), load)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._rebuild_tree()
+
+    def _rebuild_tree(self):
+        tree = [len(block) for block in self._blocks]
+        size = len(tree)
+        for k in range(1, size + 1):
+            parent = k + (k & -k)
+            if parent <= size:
+                tree[parent - 1] += tree[k - 1]
+        self._tree = tree
+
+    def _tree_add(self, block: int, delta: int):
+        tree = self._tree
+        k = block + 1
+        while k <= len(tree):
+            tree[k - 1] += delta
+            k += k & -k
+
+    def _prefix(self, block: int) -> int:
+        """Total number of items in ``blocks[:block]``."""
+        tree = self._tree
+        total = 0
+        k = block
+        while k > 0:
+            total += tree[k - 1]
+            k -= k & -k
+        return total
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        """Map a position to ``(block, offset)`` by descending the tree."""
+        tree = self._tree
+        block = 0
+        step = 1 << (len(tree).bit_length() - 1) if tree else 0
+        while step:
+            nxt = block + step
+            if nxt <= len(tree) and tree[nxt - 1] <= pos:
+                block = nxt
+                pos -= tree[nxt - 1]
+            step >>= 1
+        return block, pos
+
+    def _find(self, entry: Tuple[Any, Hashable]) -> Tuple[int, int]:
+        block = bisect_left(self._maxes, entry)
+        return block, bisect_left(self._blocks[block], entry)
+
+    # -- mutation ---------------------------------------------------------
+
+    def add(self, item: Hashable):
+        if item in self._keys:
+            return
+        key = self._key(item)
+        self._keys[item] = key
+        entry = (key, item)
+        if not self._blocks:
+            self._rebuild([entry])
+            return
+
+        block = bisect_left(self._maxes, entry)
+        if block == len(self._blocks):
+            block -= 1
+        items = self._blocks[block]
+        insort(items, entry)
+        self._maxes[block] = items[-1]
+        if len(items) > 2 * self.LOAD:
+            half = len(items) // 2
+            self._blocks[block:block + 1] = [items[:half], items[half:]]
+            self._maxes[block:block + 1] = [items[half - 1], items[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(block, 1)
+
+    def update(self, iterable: Iterable[Hashable]):
+        """Add many items at once.
+
+        A run whose keys all sort after the current maximum (the common
+        case for a streamed scan batch) is appended as whole blocks.
+        """
+        entries = []
+        for item in iterable:
+            if item in self._keys:
+                continue
+            key = self._key(item)
+            self._keys[item] = key
+            entries.append((key, item))
+        if not entries:
+            return
+        entries.sort()
+        if not self._blocks:
+            self._rebuild(entries)
+        elif entries[0] > self._maxes[-1]:
+            load = self.LOAD
+            for i in range(0, len(entries), load):
+                chunk = entries[i:i + load]
+                self._blocks.append(chunk)
+                self._maxes.append(chunk[-1])
+            self._rebuild_tree()
+        elif len(entries) > self.LOAD:
+            merged = [entry for block in self._blocks for entry in block]
+            merged.extend(entries)
+            merged.sort()
+            self._rebuild(merged)
+        else:
+            for key, item in entries:
+                del self._keys[item]
+                self.add(item)
+
+    def remove(self, item: Hashable):
+        try:
+            key = self._keys.pop(item)
+        except KeyError:
+            raise ValueError(f"{item!r} is not in list") from None
+        block, offset = self._find((key, item))
+        items = self._blocks[block]
+        del items[offset]
+        if items:
+            self._maxes[block] = items[-1]
+            self._tree_add(block, -1)
+        else:
+            del self._blocks[block]
+            del self._maxes[block]
+            self._rebuild_tree()
+
+    def discard(self, item: Hashable):
+        if item in self._keys:
+            self.remove(item)
+
+    def clear(self):
+        self._keys.clear()
+        self._rebuild([])
+
+    # -- queries ------------------------------------------------------------
+
+    def index(self, item: Hashable) -> int:
+        try:
+            key = self._keys[item]
+        except KeyError:
+            raise ValueError(f"{item!r} is not in list") from None
+        block, offset = self._find((key, item))
+        return self._prefix(block) + offset
+
+    def bisect_key(self, key: Any) -> int:
+        """Position of the first item whose key is not less than ``key``."""
+        probe = (key,)
+        block = bisect_left(self._maxes, probe)
+        if block == len(self._blocks):
+            return len(self._keys)
+        return self._prefix(block) + bisect_left(self._blocks[block], probe)
+
+    def __getitem__(self, index: int) -> Hashable:
+        size = len(self._keys)
+        if index < 0:
+            index += size
+        if index < 0 or index >= size:
+            raise IndexError("list index out of range")
+        block, offset = self._locate(index)
+        return self._blocks[block][offset][1]
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        for block in self._blocks:
+            for _, item in block:
+                yield item
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self)!r})"
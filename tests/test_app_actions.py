@@ -1,19 +1,23 @@
 import os
 import sys
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 
 os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Keep the app's on-disk thumbnail cache out of the real ~/.cache.
+_CACHE_HOME = tempfile.TemporaryDirectory()
+os.environ["XDG_CACHE_HOME"] = _CACHE_HOME.name
 
 ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 try:
-    from PyQt5 import QtWidgets
+    from PyQt5 import QtCore, QtWidgets
 except ImportError:
-    QtWidgets = None
+    QtCore = QtWidgets = None
 
 from backend import ImageBackend
 
@@ -137,12 +141,186 @@ class AppActionTests(unittest.TestCase):
             swiper.current_index = -1
 
             swiper.load_next_image()
+            # bad.png only shows a blank card until its decode fails.
+            deadline = QtCore.QDeadlineTimer(5000)
+            while swiper.current_path != str(good) and not deadline.hasExpired():
+                qapp.processEvents()
+                QtCore.QThread.msleep(5)
 
             self.assertEqual(swiper.current_path, str(good))
             self.assertIn("good.png", swiper.file_label.text())
             self.assertIn("Skipped unreadable file", swiper.action_label.text())
             self.assertTrue(swiper.keep_button.isEnabled())
 
+    def test_failed_background_move_rolls_back_history(self):
+        qapp = get_qapp()
+        self.assertIsNotNone(qapp)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("a.png", "b.png"):
+                write_fake_image(tmp_path / name)
+
+            swiper = ImageSwiper()
+            swiper.backend = ImageBackend(
+                str(tmp_path),
+                async_moves=True,
+                on_move_done=swiper._backend_signals.move_done.emit,
+            )
+            swiper.load_next_image()
+            self.assertEqual(swiper.current_path, str(tmp_path / "a.png"))
+
+            gate = threading.Event()
+
+            def fail(src, dest):
+                gate.wait(5)
+                raise PermissionError("read-only")
+
+            swiper.backend._executor.move_func = fail
+            swiper.keep_current()
+            # The UI advances immediately, before the move has run.
+            self.assertEqual(swiper.current_path, str(tmp_path / "b.png"))
+            self.assertEqual(swiper.kept_count, 1)
+
+            gate.set()
+            swiper.backend.flush_moves(timeout=5)
+            qapp.processEvents()
+            self.assertEqual(swiper.kept_count, 0)
+            self.assertEqual(swiper.history, [])
+            self.assertEqual(swiper.current_path, str(tmp_path / "a.png"))
+            self.assertIn("failed", swiper.action_label.text())
+            swiper.close()
+
+    def test_delete_duplicates_keeps_the_photo_on_screen(self):
+        qapp = get_qapp()
+        self.assertIsNotNone(qapp)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("a.png", "b.png", "c.png"):
+                write_fake_image(tmp_path / name)
+
+            swiper = ImageSwiper()
+            swiper.backend = ImageBackend(str(tmp_path))
+            groups = swiper.backend.exact_duplicate_groups()
+            self.assertEqual(len(groups), 1)
+            swiper._on_duplicates_found(swiper.backend, groups)
+            swiper.current_index = 1
+            swiper.current_path = str(tmp_path / "b.png")
+
+            for name in ("a.png", "c.png"):
+                swiper._load_pixmap(str(tmp_path / name))
+            actions = len(swiper._planner._actions)
+            swiper.delete_duplicates()
+            # Each copy counts towards the sorting pace, and keeps its
+            # pixmap for undo.
+            self.assertEqual(len(swiper._planner._actions), actions + 2)
+            self.assertIn(str(tmp_path / "deleted" / "c.png"), swiper._behind)
+            self.assertTrue((tmp_path / "b.png").exists())
+            self.assertTrue((tmp_path / "deleted" / "a.png").exists())
+            self.assertTrue((tmp_path / "deleted" / "c.png").exists())
+            self.assertEqual(swiper.deleted_count, 2)
+            self.assertEqual(len(swiper.history), 2)
+            self.assertEqual(swiper.current_index, 0)
+
+            swiper.undo_last()
+            self.assertTrue((tmp_path / "c.png").exists())
+
+    def test_worst_first_starts_from_the_lowest_score(self):
+        qapp = get_qapp()
+        self.assertIsNotNone(qapp)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("a.png", "b.png", "c.png"):
+                write_fake_image(tmp_path / name)
+
+            swiper = ImageSwiper()
+            swiper.backend = ImageBackend(str(tmp_path))
+            swiper.load_next_image()
+            self.assertEqual(swiper.current_path, str(tmp_path / "a.png"))
+
+            swiper.toggle_worst_first()
+            self.assertEqual(swiper.current_path, str(tmp_path / "a.png"))
+            scores = {
+                str(tmp_path / "a.png"): (900.0, 0.0, 0.0),
+                str(tmp_path / "b.png"): (900.0, 0.0, 0.6),
+                str(tmp_path / "c.png"): (20.0, 0.0, 0.0),
+            }
+            swiper._on_quality_scored(swiper.backend, scores)
+            self.assertEqual(swiper.current_path, str(tmp_path / "b.png"))
+            self.assertEqual(swiper.current_index, 0)
+            self.assertIn("blown out", swiper.quality_chip.text())
+
+            swiper.keep_current()
+            self.assertEqual(swiper.current_path, str(tmp_path / "c.png"))
+            self.assertIn("blurry", swiper.quality_chip.text())
+
+            # Back to name order, from the top.
+            swiper.settings = QtCore.QSettings(str(tmp_path / "settings.ini"), QtCore.QSettings.IniFormat)
+            swiper.toggle_worst_first()
+            self.assertEqual(swiper.current_path, str(tmp_path / "a.png"))
+            self.assertEqual(swiper.current_index, 0)
+
+    def test_cycle_order_sorts_naturally(self):
+        qapp = get_qapp()
+        self.assertIsNotNone(qapp)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("IMG_10.png", "IMG_2.png", "IMG_9.png"):
+                write_fake_image(tmp_path / name)
+
+            swiper = ImageSwiper()
+            swiper.settings = QtCore.QSettings(str(tmp_path / "settings.ini"), QtCore.QSettings.IniFormat)
+            swiper.backend = ImageBackend(str(tmp_path))
+            swiper.load_next_image()
+            self.assertEqual(swiper.current_path, str(tmp_path / "IMG_10.png"))
+
+            swiper.cycle_order()
+            self.assertEqual(swiper.settings.value("queue/order"), "natural")
+            self.assertEqual(swiper.current_path, str(tmp_path / "IMG_2.png"))
+            swiper.keep_current()
+            self.assertEqual(swiper.current_path, str(tmp_path / "IMG_9.png"))
+
+    def test_filter_reopens_folder_with_matching_photos(self):
+        qapp = get_qapp()
+        self.assertIsNotNone(qapp)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "a.png")
+            write_fake_image(tmp_path / "Screenshot 1.png")
+
+            swiper = ImageSwiper()
+            swiper.settings = QtCore.QSettings(str(tmp_path / "settings.ini"), QtCore.QSettings.IniFormat)
+            swiper.load_directory(str(tmp_path))
+            self.assertEqual(swiper.backend.total_images, 2)
+
+            self.assertTrue(swiper.apply_filter("name ~ 'screenshot*'"))
+            self.assertEqual(swiper.backend.total_images, 1)
+            self.assertEqual(swiper.current_path, str(tmp_path / "Screenshot 1.png"))
+            self.assertIn("screenshot*", swiper.folder_chip.text())
+
+            self.assertFalse(swiper.apply_filter("name ~"))
+            self.assertEqual(swiper.backend.total_images, 1)
+
+            self.assertTrue(swiper.apply_filter(""))
+            self.assertEqual(swiper.backend.total_images, 2)
+            swiper.backend.close()
+
+    def test_scaled_previews_persist_across_sessions(self):
+        qapp = get_qapp()
+        self.assertIsNotNone(qapp)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "big.jpg")
+            Image.new("RGB", (2000, 1000), (200, 40, 40)).save(path)
+
+            swiper = ImageSwiper()
+            pixmap = swiper._load_pixmap(path, 900)
+            self.assertEqual((pixmap.width(), pixmap.height()), (900, 450))
+            swiper.close()  # flushes the background writer
+
+            swiper = ImageSwiper()
+            self.assertIsNotNone(swiper.thumbnails.get(path, 900))
+            pixmap = swiper._load_pixmap(path, 900)
+            self.assertEqual((pixmap.width(), pixmap.height()), (900, 450))
+            swiper.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import sys
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 
@@ -69,8 +70,11 @@ class BackendContractTests(unittest.TestCase):
             self.assertEqual(len(deleted_files), 2)
             self.assertTrue((tmp_path / "deleted").is_dir())
 
-            count = backend.finish_delete()
-            self.assertEqual(count, 2)
+            result = backend.finish_delete()
+            self.assertEqual(result.done, 2)
+            self.assertEqual(result.errors, [])
+            self.assertGreater(result.bytes, 0)
+            self.assertFalse(result.cancelled)
             self.assertFalse((tmp_path / "deleted").exists())
 
     def test_finish_restore_kept_moves_back(self):
@@ -86,13 +90,39 @@ class BackendContractTests(unittest.TestCase):
             kept_files = backend.get_kept_files()
             self.assertEqual(len(kept_files), 2)
 
-            count = backend.finish_restore_kept()
-            self.assertEqual(count, 2)
+            result = backend.finish_restore_kept()
+            self.assertEqual(result.done, 2)
             # Files restored to original directory
             self.assertTrue((tmp_path / "x.png").exists())
             self.assertTrue((tmp_path / "y.png").exists())
             self.assertFalse((tmp_path / "kept").exists())
 
+    def test_finish_delete_reports_progress_and_can_be_cancelled(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            (tmp_path / "deleted").mkdir()
+            # Enough batches that the pool cannot have them all in flight
+            # when the first one reports back.
+            for i in range(3000):
+                (tmp_path / "deleted" / f"{i}.png").write_bytes(b"x" * 10)
+
+            backend = ImageBackend(str(tmp_path))
+            cancel = threading.Event()
+            updates = []
+
+            def on_progress(result):
+                updates.append(result.done)
+                cancel.set()  # stop after the first batch lands
+
+            result = backend.finish_delete(progress=on_progress, cancel=cancel)
+            self.assertTrue(result.cancelled)
+            self.assertEqual(result.total, 3000)
+            self.assertLess(result.done, 3000)
+            self.assertEqual(result.bytes, result.done * 10)
+            self.assertEqual(updates, sorted(updates))
+            remaining = len(list((tmp_path / "deleted").iterdir()))
+            self.assertEqual(remaining, 3000 - result.done)
+
     def test_get_kept_and_deleted_files(self):
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp_path = Path(tmp_dir)
@@ -109,6 +139,194 @@ class BackendContractTests(unittest.TestCase):
             self.assertEqual(backend.get_kept_files(), ["img1.png"])
             self.assertEqual(backend.get_deleted_files(), ["img2.png"])
 
+    def test_collisions_use_suffixes_and_reuse_freed_names(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            (tmp_path / "deleted").mkdir()
+            write_fake_image(tmp_path / "deleted" / "IMG_0001.png")
+            write_fake_image(tmp_path / "IMG_0001.png")
+
+            backend = ImageBackend(str(tmp_path))
+            first = backend.delete(str(tmp_path / "IMG_0001.png"))
+            self.assertTrue(first.endswith("deleted/IMG_0001_1.png"))
+
+            write_fake_image(tmp_path / "IMG_0001.png")
+            second = backend.delete(str(tmp_path / "IMG_0001.png"))
+            self.assertTrue(second.endswith("deleted/IMG_0001_2.png"))
+
+            # Undo frees _1; the next collision takes the lowest free suffix again.
+            restored = backend.undo_move(first)
+            self.assertEqual(restored, str(tmp_path / "IMG_0001_1.png"))
+            write_fake_image(tmp_path / "IMG_0001.png")
+            third = backend.delete(str(tmp_path / "IMG_0001.png"))
+            self.assertTrue(third.endswith("deleted/IMG_0001_1.png"))
+
+    def test_destination_created_behind_our_back_is_not_overwritten(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "a.png")
+            write_fake_image(tmp_path / "b.png")
+
+            backend = ImageBackend(str(tmp_path))
+            backend.keep(str(tmp_path / "a.png"))  # loads the kept/ index
+            (tmp_path / "kept" / "b.png").write_bytes(b"external")
+
+            dest = backend.keep(str(tmp_path / "b.png"))
+            self.assertTrue(dest.endswith("kept/b_1.png"))
+            self.assertEqual((tmp_path / "kept" / "b.png").read_bytes(), b"external")
+
+    def test_async_moves_update_queue_at_once_and_land_on_flush(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("a.png", "b.png"):
+                write_fake_image(tmp_path / name)
+
+            done = []
+            backend = ImageBackend(
+                str(tmp_path),
+                async_moves=True,
+                on_move_done=lambda *args: done.append(args),
+            )
+            try:
+                dest = backend.delete(str(tmp_path / "a.png"))
+                self.assertTrue(dest.endswith("deleted/a.png"))
+                self.assertEqual(backend.remaining_count(), 1)
+                self.assertEqual(backend.get_image(0), str(tmp_path / "b.png"))
+
+                self.assertTrue(backend.flush_moves(timeout=5))
+                self.assertTrue(Path(dest).exists())
+                self.assertEqual(done, [(str(tmp_path / "a.png"), dest, "")])
+
+                restored = backend.undo_move(dest)
+                self.assertEqual(restored, str(tmp_path / "a.png"))
+                self.assertTrue((tmp_path / "a.png").exists())
+                self.assertEqual(backend.index_of_image(restored), 0)
+            finally:
+                backend.close()
+
+    def test_undo_cancels_a_move_that_has_not_started(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "a.png")
+
+            backend = ImageBackend(str(tmp_path), async_moves=True)
+            gate = threading.Event()
+            backend._executor.move_func = lambda src, dest: gate.wait(5)
+            try:
+                backend.keep(str(tmp_path / "blocker.png"))  # occupies the worker
+                dest = backend.keep(str(tmp_path / "a.png"))
+                restored = backend.undo_move(dest)
+                self.assertEqual(restored, str(tmp_path / "a.png"))
+                self.assertEqual(backend.index_of_image(restored), 0)
+            finally:
+                gate.set()
+                backend.close()
+            self.assertTrue((tmp_path / "a.png").exists())
+            self.assertFalse((tmp_path / "kept" / "a.png").exists())
+
+    def test_failed_async_move_returns_file_to_queue(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "a.png")
+
+            done = []
+            backend = ImageBackend(
+                str(tmp_path), async_moves=True, on_move_done=lambda *a: done.append(a)
+            )
+
+            def fail(src, dest):
+                raise PermissionError("read-only")
+
+            backend._executor.move_func = fail
+            dest = backend.keep(str(tmp_path / "a.png"))
+            backend.close()
+
+            self.assertEqual(done, [(str(tmp_path / "a.png"), dest, "read-only")])
+            self.assertEqual(backend.get_image(0), str(tmp_path / "a.png"))
+            self.assertEqual(backend.processed_count(), 0)
+
+    def test_streaming_scan_publishes_batches_then_completes(self):
+        class SmallBatchBackend(ImageBackend):
+            SCAN_FIRST_BATCH = 3
+            SCAN_BATCH_INTERVAL = 0.0
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            names = [f"img{i:02d}.png" for i in range(10)]
+            for name in names:
+                (tmp_path / name).touch()
+            (tmp_path / "notes.txt").touch()
+
+            completed = []
+            backend = SmallBatchBackend(
+                str(tmp_path), stream=True, on_scan_complete=completed.append
+            )
+            self.assertGreaterEqual(backend.total_images, 3)
+            self.assertIsNotNone(backend.get_image(0))
+
+            self.assertTrue(backend.wait_for_scan(timeout=5))
+            backend.close()
+            self.assertTrue(backend.scan_complete)
+            self.assertEqual(backend.total_images, 10)
+            self.assertEqual(completed, [10])
+
+            seen = [backend.get_image(i) for i in range(backend.remaining_count())]
+            self.assertEqual(sorted(seen), [str(tmp_path / n) for n in names])
+            # The first batch is sorted and stays in front of later batches.
+            self.assertEqual(seen[:3], sorted(seen[:3]))
+
+    def test_small_directory_completes_synchronously_when_streaming(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("b.png", "a.png"):
+                write_fake_image(tmp_path / name)
+
+            backend = ImageBackend(str(tmp_path), stream=True)
+            self.assertTrue(backend.scan_complete)
+            self.assertEqual(backend.total_images, 2)
+            self.assertEqual(backend.get_image(0), str(tmp_path / "a.png"))
+
+    def test_recursive_scan_skips_session_folders_and_hidden_dirs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for rel in ("a.png", "trips/b.png", "trips/2023/c.png", "kept/old.png", ".cache/d.png"):
+                (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+                write_fake_image(tmp_path / rel)
+
+            flat = ImageBackend(str(tmp_path))
+            self.assertEqual(flat.total_images, 1)
+
+            backend = ImageBackend(str(tmp_path), recursive=True)
+            seen = sorted(backend.get_image(i) for i in range(backend.remaining_count()))
+            expected = sorted(str(tmp_path / rel) for rel in ("a.png", "trips/b.png", "trips/2023/c.png"))
+            self.assertEqual(seen, expected)
+
+    def test_recursive_layouts_and_undo_return_to_subfolder(self):
+        for layout, expected in (("mirror", "kept/trips/b.png"), ("flat", "kept/b.png")):
+            with self.subTest(layout=layout), tempfile.TemporaryDirectory() as tmp_dir:
+                tmp_path = Path(tmp_dir)
+                (tmp_path / "trips").mkdir()
+                source = tmp_path / "trips" / "b.png"
+                write_fake_image(source)
+
+                backend = ImageBackend(str(tmp_path), recursive=True, layout=layout)
+                dest = backend.keep(str(source))
+                self.assertEqual(dest, str(tmp_path / expected))
+                self.assertEqual(backend.get_kept_files(), [expected[len("kept/"):]])
+
+                self.assertEqual(backend.undo_move(dest), str(source))
+                self.assertEqual(backend.get_image(0), str(source))
+
+                backend.keep(str(source))
+                backend.finish_restore_kept()
+                self.assertTrue(source.exists())
+                self.assertFalse((tmp_path / "kept").exists())
+
+    def test_unknown_layout_is_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(ValueError):
+                ImageBackend(tmp_dir, layout="nested")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "scripts"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+try:
+    from PyQt5 import QtWidgets
+except ImportError:
+    QtWidgets = None
+
+if QtWidgets is not None:
+    import benchmark
+else:
+    benchmark = None
+
+
+@unittest.skipIf(QtWidgets is None, "PyQt5 is not installed")
+class BenchmarkTests(unittest.TestCase):
+    def test_compare_flags_only_real_regressions(self):
+        baseline = {
+            "scan.1000.plain": {"value": 0.100, "unit": "s", "better": "lower"},
+            "moves.keep": {"value": 1000.0, "unit": "ops/s", "better": "higher"},
+            "frames.idle.p95": {"value": 2.0, "unit": "ms", "better": "lower"},
+            "decode.png.640x480.p50": {"value": 10.0, "unit": "ms", "better": "lower"},
+        }
+        results = {
+            "scan.1000.plain": {"value": 0.200, "unit": "s", "better": "lower"},
+            "moves.keep": {"value": 700.0, "unit": "ops/s", "better": "higher"},
+            "frames.idle.p95": {"value": 2.4, "unit": "ms", "better": "lower"},  # under the noise floor
+            "decode.png.640x480.p50": {"value": 11.0, "unit": "ms", "better": "lower"},
+            "frames.new.p50": {"value": 5.0, "unit": "ms", "better": "lower"},  # not in the baseline
+        }
+        regressions = benchmark.compare(results, baseline, tolerance=0.25)
+        self.assertEqual(
+            regressions,
+            ["moves.keep: 1000 -> 700 ops/s (-30%)", "scan.1000.plain: 0.1 -> 0.2 s (+100%)"],
+        )
+
+    def test_folders_are_reproducible(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            samples = benchmark.make_samples(os.path.join(tmp_dir, "samples"), sizes=[(64, 48)])
+            self.assertEqual(sorted(fmt for fmt, _size in samples), ["jpeg", "png", "webp"])
+            first = benchmark.make_folder(os.path.join(tmp_dir, "a"), 40, samples)
+            second = benchmark.make_folder(os.path.join(tmp_dir, "b"), 40, samples)
+            names = sorted(n for n in os.listdir(first) if not n.startswith("."))
+            self.assertEqual(len(names), 40)
+            self.assertEqual(names, sorted(n for n in os.listdir(second) if not n.startswith(".")))
+
+            results = {}
+            benchmark.bench_scan(results, first, 40, repeat=1)
+            benchmark.bench_moves(results, second, 40)
+            self.assertEqual(
+                sorted(results),
+                ["moves.delete", "moves.keep", "moves.undo",
+                 "scan.40.index_cold", "scan.40.index_warm", "scan.40.plain"],
+            )
+            # Every move was undone.
+            self.assertEqual(len([n for n in os.listdir(second) if n.startswith("IMG_")]), 40)
+            self.assertEqual(os.listdir(os.path.join(second, "kept")), [])
+
+    def test_main_fails_on_regression(self):
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])  # noqa: F841
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            baseline = os.path.join(tmp_dir, "baseline.json")
+            args = ["--only", "frames", "--sizes", "320x240", "--workdir", tmp_dir,
+                    "--baseline", baseline]
+            out = io.StringIO()
+            self.assertEqual(benchmark.main(args + ["--save-baseline"], out), 0)
+            with open(baseline) as fh:
+                saved = json.load(fh)
+            self.assertIn("frames.idle.p50", saved["results"])
+
+            for result in saved["results"].values():
+                result["value"] /= 100  # an impossibly fast baseline
+            with open(baseline, "w") as fh:
+                json.dump(saved, fh)
+            out = io.StringIO()
+            self.assertEqual(benchmark.main(args, out), 1)
+            self.assertIn("REGRESSION frames.", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from photo_deleter import build_parser, parse_size, run
+
+
+def events(text: str):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def triage(*argv):
+    out = io.StringIO()
+    code = run(build_parser().parse_args([str(a) for a in argv]), out)
+    return code, events(out.getvalue())
+
+
+class CliTests(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size("200k"), 200 * 1024)
+        self.assertEqual(parse_size("1.5M"), 3 * 512 * 1024)
+        self.assertEqual(parse_size("12"), 12)
+
+    def test_dry_run_reports_without_moving(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("a.png", "b.png", "c.png"):
+                (tmp_path / name).write_bytes(b"same")
+            (tmp_path / "d.png").write_bytes(b"different")
+
+            code, lines = triage(tmp_path, "--duplicates", "--dry-run")
+            self.assertEqual(code, 0)
+            self.assertEqual(lines[0]["event"], "scan")
+            self.assertEqual(lines[0]["images"], 4)
+            picked = [(e["path"], e["rule"]) for e in lines if e["event"] == "select"]
+            self.assertEqual(picked, [("b.png", "duplicate"), ("c.png", "duplicate")])
+            self.assertEqual(lines[-1]["event"], "done")
+            self.assertTrue(lines[-1]["dry_run"])
+            self.assertTrue((tmp_path / "b.png").exists())
+            # Nothing was written to the folder.
+            self.assertEqual(sorted(p.name for p in tmp_path.iterdir()), ["a.png", "b.png", "c.png", "d.png"])
+
+            # An index left by an earlier run is used, and left untouched.
+            triage(tmp_path, "--duplicates", "--action", "keep")
+            index = tmp_path / ".photo-deleter" / "index.sqlite"
+            before = index.read_bytes()
+            (tmp_path / "e.png").write_bytes(b"same")
+            code, lines = triage(tmp_path, "--duplicates", "--dry-run")
+            picked = [(e["path"], e["rule"]) for e in lines if e["event"] == "select"]
+            self.assertEqual(picked, [("e.png", "duplicate")])
+            self.assertEqual(index.read_bytes(), before)
+
+    def test_filters_alone_select_and_files_move_with_collision_policy(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            (tmp_path / "tiny.png").write_bytes(b"x" * 10)
+            (tmp_path / "big.png").write_bytes(b"x" * 5000)
+            (tmp_path / "deleted").mkdir()
+            (tmp_path / "deleted" / "tiny.png").write_bytes(b"old")
+
+            code, lines = triage(tmp_path, "--smaller-than", "1k")
+            self.assertEqual(code, 0)
+            self.assertEqual(lines[-1]["moved"], 1)
+            self.assertEqual(lines[-1]["bytes"], 10)
+            self.assertTrue((tmp_path / "big.png").exists())
+            self.assertEqual((tmp_path / "deleted" / "tiny_1.png").read_bytes(), b"x" * 10)
+
+    def test_runs_without_qt(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            (Path(tmp_dir) / "a.png").write_bytes(b"a")
+            script = (
+                "import sys, photo_deleter;"
+                f"code = photo_deleter.main([{tmp_dir!r}, '--dry-run']);"
+                "sys.exit(3 if 'PyQt5' in sys.modules else code)"
+            )
+            proc = subprocess.run(
+                [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True
+            )
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            self.assertEqual(events(proc.stdout)[-1]["event"], "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
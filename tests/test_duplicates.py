@@ -0,0 +1,149 @@
+import itertools
+import os
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from backend import ImageBackend
+from duplicates import (
+    PARTIAL_BYTES,
+    exact_duplicate_groups,
+    file_digest,
+    group_near_duplicates,
+    hamming,
+    hash_image,
+    near_duplicate_pairs,
+)
+
+
+def write_scene(path: Path, seed: int, size=(320, 240), quality=90):
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((320, 240)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y = rng.randrange(320), rng.randrange(240)
+        r = rng.randrange(20, 80)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    image.resize(size).save(path, format="JPEG", quality=quality)
+
+
+class PerceptualHashTests(unittest.TestCase):
+    def test_reexport_is_close_and_other_scene_is_far(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_scene(tmp_path / "a.jpg", seed=1)
+            write_scene(tmp_path / "a_small.jpg", seed=1, size=(160, 120), quality=60)
+            write_scene(tmp_path / "b.jpg", seed=2)
+
+            a, a_small, b = (hash_image(str(tmp_path / n)) for n in ("a.jpg", "a_small.jpg", "b.jpg"))
+            self.assertLessEqual(hamming(a[0], a_small[0]), 8)
+            self.assertLessEqual(hamming(a[1], a_small[1]), 8)
+            self.assertGreater(hamming(a[1], b[1]), 8)
+            self.assertIsNone(hash_image(str(tmp_path / "missing.jpg")))
+
+    def test_multi_index_search_matches_brute_force(self):
+        rng = random.Random(7)
+        dhashes, phashes = [], []
+        for i in range(600):
+            if i % 4 == 0:
+                base_d, base_p = rng.getrandbits(64), rng.getrandbits(64)
+            d, p = base_d, base_p
+            for _ in range(rng.randrange(12)):
+                d ^= 1 << rng.randrange(64)
+            for _ in range(rng.randrange(12)):
+                p ^= 1 << rng.randrange(64)
+            dhashes.append(d)
+            phashes.append(p)
+
+        a, b = near_duplicate_pairs(
+            np.array(dhashes, dtype=np.uint64), np.array(phashes, dtype=np.uint64), threshold=8
+        )
+        found = sorted(zip(np.minimum(a, b).tolist(), np.maximum(a, b).tolist()))
+        expected = [
+            (i, j)
+            for i, j in itertools.combinations(range(len(dhashes)), 2)
+            if hamming(dhashes[i], dhashes[j]) <= 8 and hamming(phashes[i], phashes[j]) <= 8
+        ]
+        self.assertEqual(found, expected)
+
+    def test_groups_are_connected_components(self):
+        hashes = {
+            "a": (0b0000, 0b0000),
+            "b": (0b0001, 0b0001),
+            "c": (0b0011, 0b0011),
+            "z": (2**64 - 1, 2**64 - 1),
+        }
+        self.assertEqual(group_near_duplicates(hashes, threshold=1), [["a", "b", "c"]])
+
+
+class ExactDuplicateTests(unittest.TestCase):
+    def test_staged_hashing_groups_identical_files_only(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            big = os.urandom(3 * PARTIAL_BYTES)
+            # Same size and same ends, different middle: only a full read tells.
+            twin = big[:PARTIAL_BYTES] + bytes(PARTIAL_BYTES) + big[-PARTIAL_BYTES:]
+            contents = {
+                "a.jpg": big,
+                "a (1).jpg": big,
+                "twin.jpg": twin,
+                "s1.png": b"small",
+                "s2.png": b"small",
+                "s3.png": b"other",
+                "alone.png": b"x" * 10,
+            }
+            for name, data in contents.items():
+                (tmp_path / name).write_bytes(data)
+            files = [(str(tmp_path / n), len(d)) for n, d in contents.items()]
+
+            groups, computed = exact_duplicate_groups(files)
+            self.assertEqual(
+                groups,
+                [
+                    [str(tmp_path / "a (1).jpg"), str(tmp_path / "a.jpg")],
+                    [str(tmp_path / "s1.png"), str(tmp_path / "s2.png")],
+                ],
+            )
+            self.assertNotIn(str(tmp_path / "alone.png"), computed)
+            self.assertEqual(computed[str(tmp_path / "a.jpg")], file_digest(str(tmp_path / "a.jpg")))
+            self.assertEqual(computed[str(tmp_path / "s1.png")], file_digest(str(tmp_path / "s1.png")))
+
+            # Known digests are trusted: nothing large is read in full again.
+            groups_again, computed_again = exact_duplicate_groups(files, known=computed)
+            self.assertEqual(groups_again, groups)
+            self.assertEqual(computed_again, {})
+
+
+class BackendNearDuplicateTests(unittest.TestCase):
+    def test_groups_in_queue_order_and_hashes_are_cached(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_scene(tmp_path / "1.jpg", seed=1)
+            write_scene(tmp_path / "2.jpg", seed=2)
+            write_scene(tmp_path / "3.jpg", seed=1, size=(160, 120), quality=60)
+
+            backend = ImageBackend(tmp_dir, index=True)
+            backend._index_thread.join()
+            calls = []
+            groups = backend.near_duplicate_groups(progress=lambda done, total: calls.append(total))
+            self.assertEqual(groups, [[str(tmp_path / "1.jpg"), str(tmp_path / "3.jpg")]])
+            self.assertEqual(calls[-1], 3)
+            self.assertIsNotNone(backend.index.get(str(tmp_path / "2.jpg")).phash)
+
+            calls.clear()
+            self.assertEqual(backend.near_duplicate_groups(), groups)
+            self.assertEqual(calls, [])
+            backend.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+import io
+import os
+import struct
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+
+from backend import ImageBackend, natural_key
+from exif import jpeg_dimensions, parse_mpf, parse_tiff, read_exif, read_thumbnail
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+try:
+    from PyQt5 import QtGui, QtWidgets
+except ImportError:
+    QtGui = QtWidgets = None
+
+
+def write_photo(path: Path, fmt: str, taken=None, subsec=None, orientation=None):
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    if taken is not None:
+        exif.get_ifd(0x8769)[0x9003] = taken
+    if subsec is not None:
+        exif.get_ifd(0x8769)[0x9291] = subsec
+    Image.new("RGB", (16, 12), (10, 80, 160)).save(path, format=fmt, exif=exif.tobytes())
+
+
+def jpeg_bytes(size, color=(10, 80, 160)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="JPEG")
+    return out.getvalue()
+
+
+def with_thumbnail(jpeg: bytes, thumb: bytes, orientation: int = 1, order: str = "<") -> bytes:
+    """``jpeg`` with an APP1 block whose IFD1 points at ``thumb``."""
+    def ifd(entries, next_offset):
+        out = struct.pack(order + "H", len(entries))
+        for tag, kind, value in entries:
+            packed = struct.pack(order + ("H2x" if kind == 3 else "I"), value)
+            out += struct.pack(order + "HHI", tag, kind, 1) + packed
+        return out + struct.pack(order + "I", next_offset)
+
+    ifd0_size = 2 + 12 + 4
+    ifd1_offset = 8 + ifd0_size
+    thumb_offset = ifd1_offset + 2 + 2 * 12 + 4
+    tiff = (
+        (b"II" if order == "<" else b"MM") + struct.pack(order + "HI", 42, 8)
+        + ifd([(0x0112, 3, orientation)], ifd1_offset)
+        + ifd([(0x0201, 4, thumb_offset), (0x0202, 4, len(thumb))], 0)
+        + thumb
+    )
+    app1 = b"Exif\x00\x00" + tiff
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + jpeg[2:]
+
+
+def with_mpf(jpeg: bytes, preview: bytes, order: str = "<") -> bytes:
+    """``jpeg`` with an MPF APP2 block listing ``preview``, stored after the image."""
+    entries_offset = 8 + 2 + 3 * 12 + 4
+    size = entries_offset + 2 * 16
+    # Offsets count from the MP header, which follows SOI, the APP2 marker
+    # and length, and "MPF\0"; the preview follows the rest of the image.
+    preview_offset = size + len(jpeg) - 2
+    mp = (
+        (b"II" if order == "<" else b"MM") + struct.pack(order + "HI", 42, 8)
+        + struct.pack(order + "H", 3)
+        + struct.pack(order + "HHI", 0xB000, 7, 4) + b"0100"
+        + struct.pack(order + "HHII", 0xB001, 4, 1, 2)
+        + struct.pack(order + "HHII", 0xB002, 7, 32, entries_offset)
+        + struct.pack(order + "I", 0)
+        + struct.pack(order + "IIIHH", 0x20030000, len(jpeg), 0, 0, 0)
+        + struct.pack(order + "IIIHH", 0x00010002, len(preview), preview_offset, 0, 0)
+    )
+    app2 = b"MPF\x00" + mp
+    return jpeg[:2] + b"\xff\xe2" + struct.pack(">H", len(app2) + 2) + app2 + jpeg[2:] + preview
+
+
+class ExifParserTests(unittest.TestCase):
+    def test_reads_capture_time_and_orientation_from_each_container(self):
+        taken = datetime(2021, 7, 4, 18, 30).timestamp()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for fmt, ext in (("JPEG", "jpg"), ("PNG", "png"), ("WEBP", "webp")):
+                with self.subTest(fmt=fmt):
+                    path = Path(tmp_dir) / f"a.{ext}"
+                    write_photo(path, fmt, taken="2021:07:04 18:30:00", subsec="25", orientation=6)
+                    self.assertEqual(read_exif(str(path)), {"orientation": 6, "captured": taken + 0.25})
+
+                    write_photo(path, fmt)
+                    self.assertEqual(read_exif(str(path)), {})
+
+    def test_garbage_is_not_an_error(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "broken.jpg"
+            path.write_bytes(b"\xff\xd8\xff\xe1\x00\x20Exif\x00\x00II*\x00\xff\xff\xff\x00")
+            self.assertEqual(read_exif(str(path)), {})
+            self.assertEqual(read_exif(str(Path(tmp_dir) / "missing.jpg")), {})
+        self.assertEqual(parse_tiff(b"MM\x00*\x00\x00\x00\x08\x00\x00"), {})
+
+    def test_reads_embedded_thumbnail(self):
+        thumb = jpeg_bytes((320, 240), (200, 0, 0))
+        self.assertEqual(jpeg_dimensions(thumb), (320, 240))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "a.jpg"
+            for order in ("<", ">"):
+                with self.subTest(order=order):
+                    path.write_bytes(with_thumbnail(jpeg_bytes((1200, 900)), thumb, 6, order))
+                    found = read_thumbnail(str(path))
+                    self.assertEqual(found.data, thumb)
+                    self.assertEqual((found.width, found.height, found.orientation), (320, 240, 6))
+                    self.assertEqual(read_exif(str(path)), {"orientation": 6})
+                    with Image.open(path) as image:
+                        self.assertEqual(image.size, (1200, 900))
+
+            # No IFD1, a cut-off preview, no file.
+            write_photo(path, "JPEG", orientation=3)
+            self.assertIsNone(read_thumbnail(str(path)))
+            path.write_bytes(with_thumbnail(jpeg_bytes((1200, 900)), thumb[:100]))
+            self.assertIsNone(read_thumbnail(str(path)))
+            self.assertIsNone(read_thumbnail(str(Path(tmp_dir) / "missing.jpg")))
+
+    def test_prefers_the_larger_mpf_preview(self):
+        thumb = jpeg_bytes((160, 120), (200, 0, 0))
+        preview = jpeg_bytes((1600, 1200), (0, 200, 0))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "a.jpg"
+            for order in ("<", ">"):
+                with self.subTest(order=order):
+                    mpf = with_mpf(jpeg_bytes((4000, 3000)), preview, order)
+                    self.assertEqual(len(parse_mpf(mpf[10:])), 1)
+                    path.write_bytes(with_thumbnail(mpf, thumb, 6))
+                    found = read_thumbnail(str(path))
+                    self.assertEqual(found.data, preview)
+                    self.assertEqual((found.width, found.height, found.orientation), (1600, 1200, 6))
+                    with Image.open(path) as image:
+                        self.assertEqual(image.size, (4000, 3000))
+
+            # MPF without EXIF, and a preview cut off by a truncated file.
+            path.write_bytes(with_mpf(jpeg_bytes((4000, 3000)), preview))
+            self.assertEqual(read_thumbnail(str(path)).orientation, 1)
+            path.write_bytes(with_thumbnail(with_mpf(jpeg_bytes((4000, 3000)), preview)[:-100], thumb))
+            self.assertEqual(read_thumbnail(str(path)).data, thumb)
+
+
+class BackendOrderTests(unittest.TestCase):
+    def test_natural_key(self):
+        names = ["img10.jpg", "IMG2.jpg", "img1.jpg"]
+        self.assertEqual(sorted(names, key=natural_key), ["img1.jpg", "IMG2.jpg", "img10.jpg"])
+
+    def test_orders(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_photo(tmp_path / "a.jpg", "JPEG", taken="2022:01:01 10:00:00")
+            write_photo(tmp_path / "b.jpg", "JPEG", taken="2020:01:01 10:00:00")
+            # No EXIF: its mtime stands in.
+            (tmp_path / "c.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+            os.utime(tmp_path / "c.png", (0, datetime(2021, 1, 1).timestamp()))
+            os.utime(tmp_path / "a.jpg", (0, datetime(2019, 1, 1).timestamp()))
+
+            backend = ImageBackend(tmp_dir)
+            names = lambda: [os.path.basename(p) for p in backend.remaining_images()]
+            self.assertTrue(backend.set_order("captured"))
+            self.assertEqual(names(), ["b.jpg", "c.png", "a.jpg"])
+            backend.set_order("mtime")
+            self.assertEqual(names(), ["a.jpg", "c.png", "b.jpg"])
+            backend.set_order("size")
+            self.assertEqual(names(), ["c.png", "a.jpg", "b.jpg"])
+            backend.set_order("name")
+            self.assertEqual(names(), ["a.jpg", "b.jpg", "c.png"])
+            with self.assertRaises(ValueError):
+                backend.set_order("random")
+
+
+@unittest.skipIf(QtWidgets is None, "PyQt5 is not installed")
+class EmbeddedPreviewTests(unittest.TestCase):
+    def setUp(self):
+        self.qapp = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        self._cache = tempfile.TemporaryDirectory()
+        self._old_cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = self._cache.name
+
+    def tearDown(self):
+        if self._old_cache_home is None:
+            os.environ.pop("XDG_CACHE_HOME", None)
+        else:
+            os.environ["XDG_CACHE_HOME"] = self._old_cache_home
+        self._cache.cleanup()
+
+    def test_oriented_matches_pillow(self):
+        from PIL import ImageOps
+
+        from app import oriented
+
+        source = Image.new("RGB", (3, 2))
+        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255), (255, 0, 255)]
+        for i, color in enumerate(colors):
+            source.putpixel((i % 3, i // 3), color)
+        buffer = io.BytesIO()
+        source.save(buffer, format="PNG")
+        qimage = QtGui.QImage.fromData(buffer.getvalue())
+        for orientation in range(1, 9):
+            with self.subTest(orientation=orientation):
+                exif = Image.Exif()
+                exif[0x0112] = orientation
+                tagged = source.copy()
+                tagged.info["exif"] = exif.tobytes()
+                expected = ImageOps.exif_transpose(tagged)
+                turned = oriented(qimage, orientation)
+                self.assertEqual((turned.width(), turned.height()), expected.size)
+                for x in range(expected.width):
+                    for y in range(expected.height):
+                        rgb = QtGui.QColor(turned.pixel(x, y)).getRgb()[:3]
+                        self.assertEqual(rgb, expected.getpixel((x, y)))
+
+    def test_back_cards_use_a_big_enough_preview(self):
+        from app import ImageSwiper
+
+        preview_dim = 900
+
+        red = jpeg_bytes((600, 450), (255, 0, 0))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "a.jpg"
+            path.write_bytes(with_thumbnail(jpeg_bytes((2000, 1500), (0, 0, 255)), red, 6))
+            swiper = ImageSwiper()
+
+            preview = swiper._load_pixmap(str(path), preview_dim, embedded=True)
+            self.assertEqual((preview.width(), preview.height()), (450, 600))  # upright
+            self.assertGreater(QtGui.QColor(preview.toImage().pixel(10, 10)).red(), 200)
+            full = swiper._load_pixmap(str(path), preview_dim)
+            self.assertEqual(max(full.width(), full.height()), preview_dim)
+            self.assertGreater(QtGui.QColor(full.toImage().pixel(10, 10)).blue(), 200)
+
+            # Too small, or letterboxed to another aspect ratio: full decode.
+            for thumb in (jpeg_bytes((160, 120)), jpeg_bytes((600, 600))):
+                with self.subTest(thumb=jpeg_dimensions(thumb)):
+                    path.write_bytes(with_thumbnail(jpeg_bytes((2000, 1500), (0, 0, 255)), thumb))
+                    swiper._pixmap_cache.clear()
+                    preview = swiper._load_pixmap(str(path), preview_dim, embedded=True)
+                    self.assertEqual(max(preview.width(), preview.height()), preview_dim)
+
+            # A camera JPEG: the 160 px thumbnail is too small, its MPF preview is not.
+            big = with_mpf(jpeg_bytes((2000, 1500), (0, 0, 255)), red)
+            path.write_bytes(with_thumbnail(big, jpeg_bytes((160, 120))))
+            swiper._pixmap_cache.clear()
+            preview = swiper._load_pixmap(str(path), preview_dim, embedded=True)
+            self.assertEqual((preview.width(), preview.height()), (600, 450))
+            self.assertGreater(QtGui.QColor(preview.toImage().pixel(10, 10)).red(), 200)
+            swiper.close()
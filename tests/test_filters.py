@@ -0,0 +1,159 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+
+from backend import ImageBackend
+from filters import Filter, FilterError
+from metaindex import ImageMeta, MetadataIndex
+from photo_deleter import build_parser, run
+
+
+def row(path="a.jpg", **fields):
+    fields.setdefault("size", 1000)
+    fields.setdefault("mtime_ns", int(datetime(2021, 6, 1).timestamp() * 1e9))
+    return ImageMeta(path=path, **fields)
+
+
+class FilterParserTests(unittest.TestCase):
+    def test_matches(self):
+        cases = [
+            ("size > 8MB", row(size=9 * 1024 ** 2), True),
+            ("size > 8MB", row(size=8 * 1024 ** 2), False),
+            ("width < 800px or height < 800", row(width=1000, height=600), True),
+            ("format = JPG", row(format="JPEG"), True),
+            ("name ~ 'screenshot*'", row("shots/Screenshot 1.png"), True),
+            ("path ~ 'shots/*'", row("shots/Screenshot 1.png"), True),
+            ("year = 2019", row(captured=datetime(2019, 12, 31, 23).timestamp()), True),
+            ("year = 2019", row(), False),  # falls back to mtime (2021)
+            ("date = 2021-06-01", row(), True),
+            ("date < 2021-06-01", row(), False),
+            ("date <= 2021-06-01", row(), True),
+            ("not (year = 2021 and size >= 1k)", row(size=1023), True),
+            ("sharpness < 100", row(), False),  # not scored yet
+            ("not sharpness < 100", row(), True),
+        ]
+        for text, meta, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(Filter(text).matches(meta), expected)
+
+    def test_errors_say_where(self):
+        cases = [
+            ("", "empty filter"),
+            ("size >", "expected a value at the end"),
+            ("colour = red", "unknown field 'colour' at 1"),
+            ("size > 8 and", "expected a field at the end"),
+            ("(size > 8", "expected ')' at the end"),
+            ("size > big", "not a size: 'big' at 1"),
+            ("format < png", "format only supports =, != and ~ at 1"),
+            ("size > 8 width = 1", "unexpected 'width' at 10"),
+        ]
+        for text, message in cases:
+            with self.subTest(text=text):
+                with self.assertRaises(FilterError) as ctx:
+                    Filter(text)
+                self.assertEqual(str(ctx.exception), message)
+
+
+class FilterIndexTests(unittest.TestCase):
+    def test_sql_agrees_with_python(self):
+        rows = [
+            row("a.jpg", size=100, width=640, height=480, format="JPEG",
+                captured=datetime(2019, 5, 1).timestamp()),
+            row("b.png", size=10 ** 7, width=4000, height=3000, format="PNG"),
+            row("sub/Screenshot.png", size=5000, format="PNG", sharpness=50.0),
+            row("broken.gif", size=10),
+        ]
+        expressions = [
+            "size > 8MB",
+            "year = 2019",
+            "year != 2019",
+            "format = png and name ~ 'screen*'",
+            "not sharpness >= 100",
+            "width < 800 or height < 800",
+            "not (width < 800 or format = gif)",
+            "path ~ 'sub/*' or date >= 2021-01-01T00:00",
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = MetadataIndex(tmp_dir)
+            index._store(rows)
+            for text in expressions:
+                with self.subTest(text=text):
+                    where = Filter(text)
+                    expected = {r.path for r in rows if where.matches(r)}
+                    self.assertEqual(index.query(where), expected)
+            index.close()
+
+
+class FilteredSessionTests(unittest.TestCase):
+    def _make_folder(self, tmp_path: Path):
+        for i in range(6):
+            size = (400, 300) if i % 2 else (1200, 900)
+            Image.new("RGB", size, (i * 40, 0, 0)).save(tmp_path / f"img{i}.jpg")
+        Image.new("RGB", (10, 10)).save(tmp_path / "Screenshot.png")
+        (tmp_path / "broken.jpg").write_bytes(b"not a jpeg")
+
+    def test_backend_queues_only_matching_images(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            self._make_folder(tmp_path)
+            backend = ImageBackend(tmp_dir, filter="width >= 1000")
+            names = [os.path.basename(p) for p in backend.remaining_images()]
+            self.assertEqual(names, ["img0.jpg", "img2.jpg", "img4.jpg"])
+            self.assertEqual(backend.total_images, 3)
+            backend.close()
+
+            # A second session answers from the index; a new file is read.
+            Image.new("RGB", (2000, 10)).save(tmp_path / "img9.jpg")
+            backend = ImageBackend(tmp_dir, stream=True, filter=Filter("width >= 1000"))
+            backend.wait_for_scan()
+            self.assertEqual(backend.total_images, 4)
+            backend.close()
+
+            backend = ImageBackend(tmp_dir, filter=lambda meta: meta.format == "PNG")
+            self.assertEqual([os.path.basename(p) for p in backend.remaining_images()], ["Screenshot.png"])
+            backend.close()
+
+            with self.assertRaises(FilterError):
+                ImageBackend(tmp_dir, filter="width >>")
+
+    def test_resume_rescans_when_the_filter_changes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            self._make_folder(tmp_path)
+            backend = ImageBackend(tmp_dir, journal=True, filter="width < 1000")
+            self.assertEqual(backend.total_images, 4)
+            backend.close()
+
+            backend = ImageBackend(tmp_dir, journal=True, filter="width < 1000")
+            self.assertIsNotNone(backend.resume_state)
+            self.assertEqual(backend.total_images, 4)
+            backend.close()
+
+            backend = ImageBackend(tmp_dir, journal=True)
+            self.assertEqual(backend.total_images, 8)
+            backend.close()
+
+    def test_cli_where(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._make_folder(Path(tmp_dir))
+            out = io.StringIO()
+            args = build_parser().parse_args([tmp_dir, "--where", "format = png", "--dry-run"])
+            self.assertEqual(run(args, out), 0)
+            events = [json.loads(line) for line in out.getvalue().splitlines()]
+            self.assertEqual([e["path"] for e in events if e["event"] == "select"], ["Screenshot.png"])
+            self.assertEqual(events[0]["images"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
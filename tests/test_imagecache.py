@@ -0,0 +1,113 @@
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from imagecache import ImageCache, image_bytes
+
+
+class FakeImage:
+    def __init__(self, width, height, depth=32):
+        self._size = (width, height, depth)
+
+    def width(self):
+        return self._size[0]
+
+    def height(self):
+        return self._size[1]
+
+    def depth(self):
+        return self._size[2]
+
+
+class ImageCacheTests(unittest.TestCase):
+    def test_image_bytes(self):
+        self.assertEqual(image_bytes(FakeImage(100, 50)), 20000)
+        self.assertEqual(image_bytes(FakeImage(100, 50, 8)), 5000)
+        self.assertEqual(image_bytes(FakeImage(0, 0)), 0)
+
+    def test_evicts_least_recently_used_within_budget(self):
+        cache = ImageCache(budget=3 * 400)
+        for name in "abc":
+            cache.put((name, 10, 1.0), FakeImage(10, 10))
+        self.assertEqual(cache.bytes, 1200)
+        cache.get(("a", 10, 1.0))  # "b" is now the oldest
+        cache.put(("d", 10, 1.0), FakeImage(10, 10))
+        self.assertNotIn(("b", 10, 1.0), cache)
+        self.assertEqual(len(cache), 3)
+        # Undo-style revisits keep working instead of emptying the cache.
+        self.assertIsNotNone(cache.get(("a", 10, 1.0)))
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 0, 1))
+        self.assertIsNone(cache.get(("b", 10, 1.0)))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_size_key_and_dpr_are_separate_entries(self):
+        cache = ImageCache()
+        cache.put(("a", 900, 1.0), FakeImage(9, 9))
+        self.assertIsNone(cache.get(("a", 900, 2.0)))
+        self.assertIsNone(cache.get(("a", 1600, 1.0)))
+
+    def test_pinned_entries_survive(self):
+        cache = ImageCache(budget=2 * 400)
+        cache.put("current", FakeImage(10, 10))
+        cache.put("next", FakeImage(10, 10))
+        cache.pin("cards", ["current", "next"])
+        cache.put("other", FakeImage(10, 10))
+        cache.put("more", FakeImage(10, 10))
+        self.assertIn("current", cache)
+        self.assertIn("next", cache)
+        self.assertNotIn("other", cache)
+        # Over budget while the pins hold, but the newest entry stays usable.
+        self.assertIn("more", cache)
+        self.assertEqual(cache.stats()["pinned"], 2)
+
+        cache.pin("cards", ["next"])  # the user moved on
+        self.assertNotIn("current", cache)
+        self.assertEqual(cache.bytes, 800)
+
+    def test_pins_are_per_owner(self):
+        cache = ImageCache(budget=400)
+        cache.pin("cards", ["a"])
+        cache.pin("behind", ["b"])
+        cache.put("a", FakeImage(10, 10))
+        cache.put("b", FakeImage(10, 10))
+        cache.put("c", FakeImage(10, 10))
+        cache.pin("cards", ())
+        self.assertEqual(sorted(k for k in "abc" if k in cache), ["b", "c"])
+
+    def test_replacing_an_entry_recharges_it(self):
+        cache = ImageCache()
+        cache.put("a", FakeImage(10, 10))
+        cache.put("a", FakeImage(20, 10))
+        self.assertEqual((len(cache), cache.bytes), (1, 800))
+        cache.discard("a")
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+    def test_concurrent_use(self):
+        cache = ImageCache(budget=50 * 400)
+
+        def work(offset):
+            for i in range(500):
+                key = (offset + i % 80, 10, 1.0)
+                if cache.get(key) is None:
+                    cache.put(key, FakeImage(10, 10))
+
+        threads = [threading.Thread(target=work, args=(n * 40,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertLessEqual(stats["bytes"], stats["budget"])
+        self.assertEqual(stats["bytes"], 400 * stats["entries"])
+        self.assertEqual(stats["hits"] + stats["misses"], 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
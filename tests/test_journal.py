@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend import ImageBackend
+from journal import JOURNAL_DIR, JOURNAL_NAME
+from moves import partial_path
+
+
+def write_fake_image(path: Path):
+    path.write_bytes(b"\x89PNG fake")
+
+
+class NoRescanBackend(ImageBackend):
+    def _scan_images(self):
+        raise AssertionError("resume should not rescan")
+
+
+class SessionJournalTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        for name in ("a.png", "b.png", "c.png", "d.png"):
+            write_fake_image(self.root / name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _sort_some(self):
+        backend = ImageBackend(str(self.root), async_moves=True, journal=True)
+        kept = backend.keep(str(self.root / "a.png"))
+        backend.delete(str(self.root / "b.png"))
+        backend.skip(str(self.root / "c.png"))
+        backend.close()
+        return kept
+
+    def test_resume_rebuilds_queue_history_and_counters_without_rescan(self):
+        kept = self._sort_some()
+
+        backend = NoRescanBackend(str(self.root), journal=True)
+        state = backend.resume_state
+        self.assertIsNotNone(state)
+        self.assertEqual(state.counts(), (1, 1))
+        self.assertEqual(state.skipped, 1)
+        self.assertEqual(backend.total_images, 4)
+        self.assertEqual(backend.remaining_count(), 2)
+        self.assertEqual(
+            backend.resumed_history(),
+            [("keep", kept), ("delete", str(self.root / "deleted" / "b.png"))],
+        )
+        # c.png was skipped, so the session picks up at d.png.
+        self.assertEqual(backend.get_image(backend.resume_index()), str(self.root / "d.png"))
+
+        restored = backend.undo_move(kept)
+        self.assertEqual(restored, str(self.root / "a.png"))
+        self.assertEqual(backend.index_of_image(restored), 0)
+        backend.close()
+
+    def test_external_change_triggers_rescan_but_keeps_history(self):
+        self._sort_some()
+        write_fake_image(self.root / "e.png")
+
+        backend = ImageBackend(str(self.root), journal=True)
+        self.assertEqual(len(backend.resumed_history()), 2)
+        self.assertIn(str(self.root / "e.png"), [backend.get_image(i) for i in range(3)])
+        self.assertEqual(backend.processed_count(), 2)
+        backend.close()
+
+        # The rewritten journal replays to the same history.
+        again = NoRescanBackend(str(self.root), journal=True)
+        self.assertEqual(again.resume_state.counts(), (1, 1))
+        again.close()
+
+    def test_interrupted_move_is_repaired(self):
+        backend = ImageBackend(str(self.root), journal=True)
+        backend.close()
+        journal = self.root / JOURNAL_DIR / JOURNAL_NAME
+        # Simulate a crash in the middle of a cross-device copy of d.png:
+        # the copy was already renamed into place, and an older attempt
+        # left its temporary file.
+        (self.root / "kept").mkdir()
+        (self.root / "kept" / "d.png").write_bytes((self.root / "d.png").read_bytes())
+        partial = partial_path(str(self.root / "kept" / "d.png"))
+        Path(partial).write_bytes(b"part")
+        with open(journal, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"op": "move", "id": 0, "kind": "keep",
+                                 "src": "d.png", "dest": os.path.join("kept", "d.png")}) + "\n")
+            fh.write('{"op": "do')  # torn last line
+
+        backend = ImageBackend(str(self.root), journal=True)
+        self.assertFalse((self.root / "kept" / "d.png").exists())
+        self.assertFalse(os.path.exists(partial))
+        self.assertEqual(backend.remaining_count(), 4)
+        self.assertEqual(backend.resumed_history(), [])
+        backend.close()
+
+    def test_repair_keeps_a_destination_that_is_not_the_copy(self):
+        backend = ImageBackend(str(self.root), journal=True)
+        backend.close()
+        journal = self.root / JOURNAL_DIR / JOURNAL_NAME
+        # Something else put a different file where the move was headed.
+        other = self.root / "kept" / "d.png"
+        other.parent.mkdir()
+        other.write_bytes(b"someone else's photo")
+        with open(journal, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"op": "move", "id": 0, "kind": "keep",
+                                 "src": "d.png", "dest": os.path.join("kept", "d.png")}) + "\n")
+
+        backend = ImageBackend(str(self.root), journal=True)
+        self.assertEqual(other.read_bytes(), b"someone else's photo")
+        self.assertTrue((self.root / "d.png").exists())
+        self.assertEqual(backend.remaining_count(), 4)
+        self.assertEqual(backend.resumed_history(), [])
+        backend.close()
+
+    def test_end_session_discards_journal(self):
+        backend = ImageBackend(str(self.root), journal=True)
+        backend.end_session()
+        backend.close()
+        self.assertFalse((self.root / JOURNAL_DIR).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
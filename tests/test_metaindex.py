@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+
+from backend import ImageBackend
+from metaindex import MetadataIndex, read_metadata
+
+
+def write_photo(path: Path, size=(40, 30), taken=None, orientation=None):
+    image = Image.new("RGB", size, (200, 120, 40))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    if taken is not None:
+        exif.get_ifd(0x8769)[0x9003] = taken
+    image.save(path, format="JPEG", exif=exif.tobytes())
+
+
+class CountingReader:
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, path):
+        self.paths.append(os.path.basename(path))
+        return read_metadata(path)
+
+
+class MetadataIndexTests(unittest.TestCase):
+    def test_reads_header_and_exif_fields(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            photo = Path(tmp_dir) / "a.jpg"
+            write_photo(photo, taken="2021:07:04 18:30:00", orientation=6)
+
+            index = MetadataIndex(tmp_dir)
+            meta = index.lookup(str(photo))
+            index.close()
+
+            self.assertEqual((meta.width, meta.height, meta.format), (40, 30, "JPEG"))
+            self.assertEqual(meta.orientation, 6)
+            self.assertEqual(meta.captured, datetime(2021, 7, 4, 18, 30).timestamp())
+            self.assertEqual(meta.size, photo.stat().st_size)
+            self.assertEqual(meta.path, "a.jpg")
+
+    def test_refresh_only_rereads_changed_files_and_persists(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            paths = [tmp_path / name for name in ("a.jpg", "b.jpg", "c.jpg")]
+            for path in paths:
+                write_photo(path)
+
+            reader = CountingReader()
+            index = MetadataIndex(tmp_dir, reader=reader)
+            self.assertEqual(index.refresh(str(p) for p in paths), 3)
+            index.close()
+
+            write_photo(paths[1], size=(80, 60))
+            os.utime(paths[1], ns=(1, 1))
+            os.remove(paths[2])
+
+            reader = CountingReader()
+            index = MetadataIndex(tmp_dir, reader=reader)
+            self.assertEqual(len(index), 3)
+            self.assertEqual(index.refresh([str(p) for p in paths[:2]], prune=True), 1)
+            self.assertEqual(reader.paths, ["b.jpg"])
+            self.assertEqual(index.get(str(paths[1])).width, 80)
+            self.assertIsNone(index.get(str(paths[2])))
+            index.close()
+
+    def test_rename_update_and_forget(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_photo(tmp_path / "a.jpg")
+            index = MetadataIndex(tmp_dir)
+            index.lookup(str(tmp_path / "a.jpg"))
+
+            index.update(str(tmp_path / "a.jpg"), digest="abc")
+            with self.assertRaises(ValueError):
+                index.update(str(tmp_path / "a.jpg"), size=0)
+            index.rename(str(tmp_path / "a.jpg"), str(tmp_path / "kept" / "a.jpg"))
+            index.close()
+
+            index = MetadataIndex(tmp_dir)
+            self.assertIsNone(index.get(str(tmp_path / "a.jpg")))
+            self.assertEqual(index.get(str(tmp_path / "kept" / "a.jpg")).digest, "abc")
+            index.forget([str(tmp_path / "kept" / "a.jpg")])
+            self.assertEqual(len(index), 0)
+            index.close()
+
+    def test_old_databases_gain_new_columns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = MetadataIndex(tmp_dir)
+            index.close()
+            db = sqlite3.connect(index.path)
+            db.execute("CREATE TABLE old AS SELECT path, size, mtime_ns FROM images")
+            db.execute("DROP TABLE images")
+            db.execute("ALTER TABLE old RENAME TO images")
+            db.commit()
+            db.close()
+
+            index = MetadataIndex(tmp_dir)
+            db = sqlite3.connect(index.path)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(images)")}
+            db.close()
+            index.close()
+            self.assertIn("orientation", columns)
+
+
+class BackendMetadataTests(unittest.TestCase):
+    def test_backend_indexes_folder_and_follows_moves(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_photo(tmp_path / "a.jpg", size=(64, 48))
+
+            backend = ImageBackend(tmp_dir, index=True)
+            backend._index_thread.join()
+            self.assertEqual(backend.metadata(str(tmp_path / "a.jpg")).width, 64)
+            dest = backend.keep(str(tmp_path / "a.jpg"))
+            self.assertEqual(backend.index.get(dest).height, 48)
+            backend.close()
+
+            plain = ImageBackend(tmp_dir)
+            self.assertEqual(plain.metadata(dest).width, 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from PIL import Image
+
+import metrics
+from backend import ImageBackend
+from photo_deleter import build_parser, run
+
+try:
+    from PyQt5 import QtWidgets
+except ImportError:
+    QtWidgets = None
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+
+
+class RecorderTests(MetricsTestCase):
+    def test_disabled_records_nothing(self):
+        metrics.enable(False)
+
+        @metrics.timed("work")
+        def work(x):
+            return x * 2
+
+        self.assertEqual(work(21), 42)
+        with metrics.timer("block"):
+            pass
+        metrics.count("things")
+        metrics.observe("manual", 0.5)
+        self.assertEqual(metrics.snapshot(), {"histograms": {}, "counters": {}})
+
+    def test_percentiles(self):
+        for ms in range(1, 1001):
+            metrics.observe("uniform", ms / 1000.0)
+        summary = metrics.snapshot()["histograms"]["uniform"]
+        self.assertEqual(summary["count"], 1000)
+        self.assertAlmostEqual(summary["sum"], 500.5)
+        self.assertEqual((summary["min"], summary["max"]), (0.001, 1.0))
+        for key, expected in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            with self.subTest(key=key):
+                self.assertAlmostEqual(summary[key], expected, delta=expected * 0.05)
+
+        metrics.observe("single", 0.25)
+        self.assertEqual(metrics.snapshot()["histograms"]["single"]["p99"], 0.25)
+
+    def test_timed_counts_failures_too(self):
+        @metrics.timed("flaky")
+        def flaky():
+            raise OSError("disk gone")
+
+        with self.assertRaises(OSError):
+            flaky()
+        with metrics.timer("block"):
+            metrics.count("things", 3)
+        data = metrics.snapshot()
+        self.assertEqual(data["histograms"]["flaky"]["count"], 1)
+        self.assertEqual(data["histograms"]["block"]["count"], 1)
+        self.assertEqual(data["counters"], {"things": 3})
+
+    def test_export_formats(self):
+        metrics.observe("app.load_pixmap", 0.002)
+        metrics.count("app.pixmap.decodes")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data = json.loads(Path(metrics.write(os.path.join(tmp_dir, "m.json"))).read_text())
+            self.assertEqual(data["counters"], {"app.pixmap.decodes": 1})
+            self.assertEqual(data["histograms"]["app.load_pixmap"]["count"], 1)
+
+            text = Path(metrics.write(os.path.join(tmp_dir, "m.prom"))).read_text()
+        lines = text.splitlines()
+        self.assertIn("# TYPE photo_deleter_app_load_pixmap_seconds summary", lines)
+        self.assertIn('photo_deleter_app_load_pixmap_seconds{quantile="0.99"} 0.002', lines)
+        self.assertIn("photo_deleter_app_load_pixmap_seconds_count 1", lines)
+        self.assertIn("# TYPE photo_deleter_app_pixmap_decodes_total counter", lines)
+        self.assertIn("photo_deleter_app_pixmap_decodes_total 1", lines)
+
+
+class InstrumentationTests(MetricsTestCase):
+    def test_backend_moves_are_timed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ("a.png", "b.png"):
+                Image.new("RGB", (4, 4)).save(os.path.join(tmp_dir, name))
+            backend = ImageBackend(tmp_dir)
+            backend.keep(os.path.join(tmp_dir, "a.png"))
+            backend.delete(os.path.join(tmp_dir, "missing.png"))
+            backend.close()
+        data = metrics.snapshot()
+        self.assertEqual(data["histograms"]["backend.move"]["count"], 2)
+        self.assertEqual(data["histograms"]["backend.move_file"]["count"], 2)
+        self.assertEqual(data["counters"]["backend.move_failures"], 1)
+
+    def test_cli_writes_metrics(self):
+        metrics.enable(False)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = os.path.join(tmp_dir, "photos")
+            os.mkdir(folder)
+            Image.new("RGB", (4, 4)).save(os.path.join(folder, "a.png"))
+            report = os.path.join(tmp_dir, "moves.prom")
+            args = build_parser().parse_args([folder, "--smaller-than", "1M", "--metrics", report])
+            self.assertEqual(run(args, io.StringIO()), 0)
+            self.assertIn("photo_deleter_backend_move_file_seconds_count 1", Path(report).read_text())
+
+    @unittest.skipIf(QtWidgets is None, "PyQt5 is not installed")
+    def test_app_hot_paths_are_timed(self):
+        from app import ImageSwiper
+
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.dict(os.environ, {"XDG_CACHE_HOME": tmp_dir}):
+            for name in ("a.png", "b.png"):
+                Image.new("RGB", (40, 30)).save(os.path.join(tmp_dir, name))
+            swiper = ImageSwiper()
+            swiper.backend = ImageBackend(tmp_dir)
+            swiper.resize(800, 700)
+            swiper.show()
+            swiper.load_next_image()
+            swiper._settle_front()  # the decode runs on a worker
+            swiper.deck.grab()
+            swiper.close()
+        data = metrics.snapshot()
+        for name in ("app.load_next_image", "app.load_pixmap", "app.set_meta", "deck.paint"):
+            with self.subTest(name=name):
+                self.assertGreaterEqual(data["histograms"][name]["count"], 1)
+        self.assertGreaterEqual(data["counters"]["app.pixmap.decodes"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import errno
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import moves
+from backend import ImageBackend, source_id
+from moves import CANCELLED, DONE, FAILED, MoveExecutor, VerifyError, move_file, partial_path
+
+
+class MoveExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+        self.finished = []
+
+        def move(src, dest):
+            self.started.set()
+            self.gate.wait(5)
+            if src == "bad":
+                raise OSError("disk full")
+            self.calls.append((src, dest))
+
+        self.executor = MoveExecutor(self.finished.append, move_func=move)
+
+    def tearDown(self):
+        self.gate.set()
+        self.executor.close()
+
+    def test_jobs_run_in_submission_order(self):
+        jobs = [self.executor.submit(f"s{i}", f"d{i}") for i in range(5)]
+        self.gate.set()
+        self.assertTrue(self.executor.flush(timeout=5))
+        self.assertEqual(self.calls, [(f"s{i}", f"d{i}") for i in range(5)])
+        self.assertTrue(all(job.state == DONE for job in jobs))
+        self.assertEqual(self.finished, jobs)
+
+    def test_pending_job_can_be_cancelled_but_running_job_cannot(self):
+        running = self.executor.submit("a", "a2")
+        queued = self.executor.submit("b", "b2")
+        self.assertTrue(self.started.wait(5))
+
+        self.assertFalse(self.executor.cancel(running))
+        self.assertTrue(self.executor.cancel(queued))
+        self.assertEqual(queued.state, CANCELLED)
+
+        self.gate.set()
+        self.executor.flush(timeout=5)
+        self.assertEqual(self.calls, [("a", "a2")])
+        self.assertNotIn(queued, self.finished)
+
+    def test_failure_is_reported_not_raised(self):
+        job = self.executor.submit("bad", "x")
+        self.gate.set()
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.state, FAILED)
+        self.assertIsInstance(job.error, OSError)
+        self.assertEqual(self.finished, [job])
+
+
+_link = os.link
+
+
+def cross_device(src, dest, **kwargs):
+    # Stands in for os.link: moves between directories cross a device.
+    if os.path.dirname(src) != os.path.dirname(dest):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    return _link(src, dest, **kwargs)
+
+
+class MoveFileTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.src = self.tmp / "a.jpg"
+        self.data = os.urandom(2 * moves.COPY_CHUNK + 123)
+        self.src.write_bytes(self.data)
+        os.utime(self.src, (1_000_000, 2_000_000))
+        (self.tmp / "out").mkdir()
+        self.dest = self.tmp / "out" / "a.jpg"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_same_filesystem_is_a_rename(self):
+        inode = self.src.stat().st_ino
+        calls = []
+        move_file(str(self.src), str(self.dest), progress=lambda *a: calls.append(a))
+        self.assertEqual(self.dest.stat().st_ino, inode)
+        self.assertEqual(calls, [])
+
+    def test_cross_device_copies_syncs_then_unlinks(self):
+        for unsupported in ([], ["copy_file_range"], ["copy_file_range", "sendfile"]):
+            with self.subTest(unsupported=unsupported):
+                if not self.src.exists():
+                    self.dest.rename(self.src)
+                calls = []
+                patches = [mock.patch("moves.os.link", cross_device)]
+                for name in unsupported:
+                    if hasattr(os, name):
+                        error = OSError(errno.ENOSYS, "not supported")
+                        patches.append(mock.patch(f"moves.os.{name}", side_effect=error))
+                for patch in patches:
+                    patch.start()
+                try:
+                    move_file(str(self.src), str(self.dest), verify=True,
+                              progress=lambda copied, total: calls.append(copied))
+                finally:
+                    for patch in patches:
+                        patch.stop()
+                self.assertFalse(self.src.exists())
+                self.assertEqual(self.dest.read_bytes(), self.data)
+                self.assertEqual(self.dest.stat().st_mtime, 2_000_000)
+                self.assertEqual(calls, [moves.COPY_CHUNK, 2 * moves.COPY_CHUNK, len(self.data)])
+                self.assertEqual(os.listdir(self.tmp / "out"), ["a.jpg"])
+
+    def test_existing_destination_is_never_overwritten(self):
+        self.dest.write_bytes(b"theirs")
+        for patches in ([], [mock.patch("moves.os.link", cross_device)]):
+            with self.subTest(cross_device=bool(patches)):
+                for patch in patches:
+                    patch.start()
+                try:
+                    with self.assertRaises(FileExistsError):
+                        move_file(str(self.src), str(self.dest))
+                finally:
+                    for patch in patches:
+                        patch.stop()
+                self.assertEqual(self.dest.read_bytes(), b"theirs")
+                self.assertEqual(self.src.read_bytes(), self.data)
+                self.assertEqual(os.listdir(self.tmp / "out"), ["a.jpg"])
+
+    def test_backend_takes_the_next_name_when_raced(self):
+        photos = self.tmp / "photos"
+        photos.mkdir()
+        (photos / "b.jpg").write_bytes(b"ours")
+        backend = ImageBackend(str(photos), journal=True)
+        move = backend._move_file
+
+        def raced(src, dest):
+            # Another program creates the first name picked just before the move.
+            if os.path.basename(dest) == "b.jpg":
+                Path(dest).write_bytes(b"theirs")
+            move(src, dest)
+
+        backend._move_file = raced
+        dest = backend.keep(str(photos / "b.jpg"))
+        self.assertEqual(dest, str(photos / "kept" / "b_1.jpg"))
+        self.assertEqual((photos / "kept" / "b.jpg").read_bytes(), b"theirs")
+        self.assertEqual(Path(dest).read_bytes(), b"ours")
+        backend.close()
+
+        resumed = ImageBackend(str(photos), journal=True)
+        self.assertEqual(resumed.resumed_history(), [("keep", dest)])
+        resumed.close()
+
+    def test_failed_verification_keeps_the_source(self):
+        digests = iter([b"source", b"copy"])
+        with mock.patch("moves.os.link", cross_device), \
+                mock.patch("moves._file_digest", lambda path: next(digests)):
+            with self.assertRaises(VerifyError):
+                move_file(str(self.src), str(self.dest), verify=True)
+        self.assertEqual(self.src.read_bytes(), self.data)
+        self.assertFalse(self.dest.exists())
+        self.assertFalse(os.path.exists(partial_path(str(self.dest))))
+
+    def test_backend_moves_into_another_root(self):
+        photos = self.tmp / "photos"
+        photos.mkdir()
+        (photos / "b.jpg").write_bytes(b"b" * 100)
+        nas = self.tmp / "nas"
+        progress = []
+        with mock.patch("moves.os.link", cross_device):
+            backend = ImageBackend(
+                str(photos), journal=True, dest_root=str(nas), verify_moves=True,
+                on_move_progress=lambda src, copied, total: progress.append((src, copied, total)),
+            )
+            dest = backend.keep(str(photos / "b.jpg"))
+        self.assertEqual(dest, str(nas / source_id(str(photos)) / "kept" / "b.jpg"))
+        self.assertEqual(progress, [(str(photos / "b.jpg"), 100, 100)])
+        self.assertEqual(backend.get_kept_files(), ["b.jpg"])
+        backend.close()
+
+        backend = ImageBackend(str(photos), journal=True, dest_root=str(nas))
+        self.assertEqual(backend.resumed_history(), [("keep", dest)])
+        self.assertEqual(backend.undo_move(dest), str(photos / "b.jpg"))
+        self.assertTrue((photos / "b.jpg").exists())
+        backend.close()
+
+    def test_folders_sharing_a_root_keep_separate_buckets(self):
+        nas = self.tmp / "nas"
+        folders = {}
+        for name in ("A", "B"):
+            folder = self.tmp / name
+            folder.mkdir()
+            (folder / "keep.jpg").write_bytes(name.encode() * 10)
+            (folder / "drop.jpg").write_bytes(name.encode() * 20)
+            folders[name] = folder
+        backends = {name: ImageBackend(str(folder), dest_root=str(nas)) for name, folder in folders.items()}
+        for name, backend in backends.items():
+            backend.keep(str(folders[name] / "keep.jpg"))
+            backend.delete(str(folders[name] / "drop.jpg"))
+        self.assertNotEqual(backends["A"].kept_dir, backends["B"].kept_dir)
+        self.assertEqual(backends["B"].get_deleted_files(), ["drop.jpg"])
+
+        backends["B"].finish_delete()
+        backends["B"].finish_restore_kept()
+        # A's photos are untouched by B's Finish step.
+        self.assertEqual(backends["A"].get_kept_files(), ["keep.jpg"])
+        self.assertEqual(backends["A"].get_deleted_files(), ["drop.jpg"])
+        self.assertEqual(sorted(os.listdir(folders["A"])), [])
+        self.assertEqual(sorted(os.listdir(folders["B"])), ["keep.jpg"])
+        self.assertEqual((folders["B"] / "keep.jpg").read_bytes(), b"B" * 10)
+        for backend in backends.values():
+            backend.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
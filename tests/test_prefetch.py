@@ -0,0 +1,295 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+_CACHE_HOME = tempfile.TemporaryDirectory()
+os.environ["XDG_CACHE_HOME"] = _CACHE_HOME.name
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+try:
+    from PyQt5 import QtCore, QtGui, QtWidgets
+except ImportError:
+    QtCore = QtGui = QtWidgets = None
+
+from PIL import Image
+
+from backend import ImageBackend
+
+if QtWidgets is not None:
+    from app import (
+        DEFAULT_DISPLAY_DIM, PLACEHOLDER_DIM, PREFETCH_AHEAD, PREFETCH_MAX_WORKERS, PROXY_DIM,
+        ImageSwiper, decode_dim,
+    )
+    from prefetch import DecodePipeline, PrefetchPlanner
+
+
+_QAPP = None
+
+
+def get_qapp():
+    global _QAPP
+    if _QAPP is None:
+        _QAPP = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    return _QAPP
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = QtCore.QDeadlineTimer(int(timeout * 1000))
+    while not predicate() and not deadline.hasExpired():
+        QtWidgets.QApplication.processEvents()
+        QtCore.QThread.msleep(5)
+    return predicate()
+
+
+@unittest.skipIf(QtWidgets is None, "PyQt5 is not installed")
+class DecodePipelineTests(unittest.TestCase):
+    def setUp(self):
+        get_qapp()
+        self.calls = []
+        self.threads = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def decode(self, name, size):
+        self.gate.wait(5)
+        self.calls.append(name)
+        self.threads.add(threading.get_ident())
+        image = QtGui.QImage(size, size, QtGui.QImage.Format_RGB32)
+        image.fill(QtCore.Qt.red)
+        return image
+
+    def test_decodes_on_workers_and_signals(self):
+        pipeline = DecodePipeline(self.decode, workers=2)
+        seen = []
+        pipeline.decoded.connect(seen.append)
+        pipeline.want([("a", 10), ("b", 20)])
+        self.assertTrue(wait_until(lambda: len(seen) == 2))
+        self.assertNotIn(threading.get_ident(), self.threads)
+        self.assertTrue(pipeline.ready(("b", 20)))
+        self.assertEqual(pipeline.take(("b", 20), wait=False).width(), 20)
+        # Taken results leave the pipeline.
+        self.assertIsNone(pipeline.take(("b", 20), wait=False))
+        pipeline.shutdown()
+
+    def test_stale_jobs_are_cancelled(self):
+        self.gate.clear()
+        pipeline = DecodePipeline(self.decode, workers=1)
+        pipeline.want([("a", 1), ("b", 2), ("c", 3)])
+        self.assertTrue(wait_until(lambda: pipeline.pending() == 3))
+        pipeline.want([("d", 4)])  # the user jumped elsewhere
+        self.gate.set()
+        image = pipeline.take(("d", 4))
+        self.assertEqual(image.width(), 4)
+        pipeline.shutdown()
+        # "a" was already running; "b" and "c" never started.
+        self.assertNotIn("b", self.calls)
+        self.assertNotIn("c", self.calls)
+        self.assertFalse(pipeline.ready(("a", 1)))
+
+    def test_take_runs_a_queued_job_on_the_caller(self):
+        self.gate.clear()
+        pipeline = DecodePipeline(self.decode, workers=1)
+        pipeline.want([("busy", 1), ("next", 2)])
+        self.assertTrue(wait_until(lambda: pipeline._jobs[("busy", 1)].claimed))
+        # The only worker is stuck on "busy"; "next" should not wait for it.
+        threading.Timer(0.2, self.gate.set).start()
+        self.assertEqual(pipeline.take(("next", 2)).width(), 2)
+        self.assertIn(threading.get_ident(), self.threads)
+        pipeline.shutdown()
+
+
+@unittest.skipIf(QtWidgets is None, "PyQt5 is not installed")
+class PrefetchPlannerTests(unittest.TestCase):
+    BUDGET = 256 * 1024 ** 2
+
+    def swipe(self, planner, per_second, seconds=5.0, start=0.0):
+        count = int(per_second * seconds)
+        for i in range(count):
+            planner.note_action(start + i / per_second)
+        return start + seconds
+
+    def test_idle_user_gets_the_minimum(self):
+        planner = PrefetchPlanner(min_ahead=2)
+        self.assertEqual(planner.plan((".jpg", 1600), self.BUDGET, now=0.0), (2, 1))
+
+    def test_fast_sorting_widens_the_window_and_the_pool(self):
+        planner = PrefetchPlanner(min_ahead=2, max_workers=4)
+        for _ in range(5):
+            planner.note_decode((".png", 1600), 0.4, 8 * 1024 ** 2)
+        now = self.swipe(planner, 4.0)
+        self.assertAlmostEqual(planner.rate(now), 4.0, delta=0.3)
+        ahead, workers = planner.plan((".png", 1600), self.BUDGET, now=now)
+        # A second of sorting, plus the cards swiped during one decode.
+        self.assertEqual(ahead, 4 + 2)
+        self.assertEqual(workers, 3)
+        # Cheap formats need less of both at the same pace.
+        planner.note_decode((".jpg", 1600), 0.02, 8 * 1024 ** 2)
+        self.assertEqual(planner.plan((".jpg", 1600), self.BUDGET, now=now), (5, 2))
+
+    def test_pausing_shrinks_back(self):
+        planner = PrefetchPlanner(min_ahead=2)
+        now = self.swipe(planner, 4.0)
+        self.assertGreater(planner.plan((".jpg", 1600), self.BUDGET, now=now)[0], 2)
+        self.assertEqual(planner.plan((".jpg", 1600), self.BUDGET, now=now + 30)[0], 2)
+
+    def test_window_fits_the_cache_budget(self):
+        planner = PrefetchPlanner(min_ahead=2, max_ahead=12)
+        planner.note_decode((".tif", 1600), 0.5, 40 * 1024 ** 2)
+        now = self.swipe(planner, 4.0)
+        ahead, _workers = planner.plan((".tif", 1600), 200 * 1024 ** 2, now=now)
+        self.assertEqual(ahead, 2)  # half of 200 MiB holds two 40 MiB cards
+
+    def test_latency_is_a_moving_average(self):
+        planner = PrefetchPlanner(default_latency=0.05)
+        self.assertEqual(planner.latency((".jpg", 900)), 0.05)
+        planner.note_decode((".jpg", 900), 0.1, 1)
+        planner.note_decode((".jpg", 900), 0.2, 1)
+        self.assertAlmostEqual(planner.latency((".jpg", 900)), 0.13)
+
+
+@unittest.skipIf(QtWidgets is None, "PyQt5 is not installed")
+class AppPrefetchTests(unittest.TestCase):
+    def test_cards_ahead_are_decoded_in_the_background(self):
+        get_qapp()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            names = [f"img{i}.png" for i in range(6)]
+            for i, name in enumerate(names):
+                Image.new("RGB", (64, 48), (i * 40, 0, 0)).save(tmp_path / name)
+
+            swiper = ImageSwiper()
+            swiper.backend = ImageBackend(str(tmp_path))
+            decoded = []
+            swiper._decoder.decoded.connect(decoded.append)
+            swiper.load_next_image()
+            ahead = [(str(tmp_path / n), DEFAULT_DISPLAY_DIM, False) for n in names[1:1 + PREFETCH_AHEAD]]
+            backs = [(str(tmp_path / n), swiper._preview_dim, True) for n in names[1:3]]
+            self.assertTrue(wait_until(lambda: set(ahead + backs) <= set(decoded)))
+            # Back cards that arrived later were handed to the deck.
+            self.assertEqual(len(swiper.deck._upcoming), 2)
+
+            swiper.keep_current()
+            self.assertEqual(swiper.current_path, str(tmp_path / "img1.png"))
+            self.assertTrue(swiper.deck.has_image)
+            # The next card came from the prefetched result, not a new decode.
+            self.assertIn((str(tmp_path / "img1.png"), DEFAULT_DISPLAY_DIM, False), swiper._pixmap_cache)
+            self.assertFalse(swiper._decoder.ready(ahead[0]))
+            # The new back cards decode in the background; wait until both
+            # reached the cache before counting pins.
+            backs = [(str(tmp_path / n), swiper._preview_dim, True) for n in names[2:4]]
+            self.assertTrue(wait_until(lambda: all(key in swiper._pixmap_cache for key in backs)))
+            # Pinned: the card on screen, the two behind it and the one just
+            # kept (for undo).
+            self.assertEqual(swiper._pixmap_cache.stats()["pinned"], 4)
+
+            # Undo brings back the pixmap of the photo that was kept.
+            shown = swiper._pixmap_cache.peek(swiper._behind[str(tmp_path / "kept" / "img0.png")])
+            swiper.undo_last()
+            self.assertEqual(swiper.current_path, str(tmp_path / "img0.png"))
+            self.assertIs(swiper.deck._pixmap, shown)
+            swiper.close()
+
+    def test_fast_sorting_decodes_further_ahead(self):
+        get_qapp()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for i in range(30):
+                Image.new("RGB", (32, 24)).save(tmp_path / f"img{i:02}.png")
+            swiper = ImageSwiper()
+            swiper.backend = ImageBackend(str(tmp_path))
+            swiper.load_next_image()
+            plan = swiper._planner.plan((".png", DEFAULT_DISPLAY_DIM), 1 << 30)
+            self.assertEqual(plan[0], PREFETCH_AHEAD)
+            wanted = []
+            want = swiper._decoder.want
+            swiper._decoder.want = lambda keys: wanted.append(set(keys)) or want(keys)
+            for _ in range(20):
+                swiper.skip_current()
+            # Twenty swipes at once: four a second over the rate window.
+            ahead = {(swiper.backend.get_image(swiper.current_index + i), DEFAULT_DISPLAY_DIM, False)
+                     for i in range(1, 6)}
+            self.assertLessEqual(ahead - set(swiper._pixmap_cache._entries), wanted[-1])
+            self.assertGreaterEqual(swiper._decoder.workers, min(2, PREFETCH_MAX_WORKERS))
+            swiper.close()
+
+    def test_cold_card_shows_a_proxy_then_upgrades(self):
+        get_qapp()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "big.jpg")
+            Image.new("RGB", (2400, 1800), (0, 90, 200)).save(path, quality=90)
+            swiper = ImageSwiper()
+            swiper.thumbnails = None  # cold: nothing on disk either
+            swiper.backend = ImageBackend(tmp_dir)
+            swiper.load_next_image()
+            proxy = swiper.deck._pixmap
+            self.assertEqual(max(proxy.width(), proxy.height()), PROXY_DIM)
+            anim = swiper.deck._enter_anim
+
+            full_key = (path, DEFAULT_DISPLAY_DIM, False)
+            self.assertTrue(wait_until(lambda: swiper.deck._pixmap is not proxy))
+            full = swiper.deck._pixmap
+            self.assertEqual(max(full.width(), full.height()), DEFAULT_DISPLAY_DIM)
+            self.assertIn(full_key, swiper._pixmap_cache)
+            self.assertIs(swiper.deck._enter_anim, anim)  # not restarted
+            swiper.close()
+
+    def test_cold_card_without_a_proxy_shows_a_blank_card(self):
+        get_qapp()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            Image.new("RGB", (1200, 600), (0, 90, 200)).save(Path(tmp_dir) / "wide.png")
+            swiper = ImageSwiper()
+            swiper.thumbnails = None
+            swiper.backend = ImageBackend(tmp_dir)
+            swiper.load_next_image()
+            # No proxy for a PNG: a blank card of its shape, not a decode
+            # on the GUI thread. The buttons wait for the photo.
+            blank = swiper.deck._pixmap
+            self.assertEqual((blank.width(), blank.height()), (PLACEHOLDER_DIM, PLACEHOLDER_DIM // 2))
+            self.assertFalse(swiper.keep_button.isEnabled())
+
+            self.assertTrue(wait_until(lambda: swiper.deck._pixmap is not blank))
+            self.assertEqual(swiper.deck._pixmap.width(), 1200)
+            self.assertTrue(swiper.keep_button.isEnabled())
+            swiper.close()
+
+    def test_decode_dim_follows_card_and_density(self):
+        self.assertEqual(decode_dim(QtCore.QSize(600, 400), 1.0), 640)  # next 128 px step
+        self.assertEqual(decode_dim(QtCore.QSize(600, 400), 2.0), 1280)
+        self.assertEqual(decode_dim(QtCore.QSize(640, 400), 1.0, 0.56), 384)
+        self.assertEqual(decode_dim(QtCore.QSize(3840, 2160), 2.0), 4096)  # capped
+        self.assertEqual(decode_dim(QtCore.QSize(0, 0), 1.0), 128)
+
+    def test_resizing_redecodes_at_the_drawn_size(self):
+        get_qapp()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "a.png")
+            Image.new("RGB", (3000, 2000), (200, 40, 40)).save(path)
+            swiper = ImageSwiper()
+            swiper._resize_timer.setInterval(10)
+            swiper.resize(900, 700)
+            swiper.show()
+            swiper.backend = ImageBackend(tmp_dir)
+            swiper.load_next_image()
+            QtWidgets.QApplication.processEvents()
+            dim = decode_dim(swiper.deck.card_size(), swiper.deck.devicePixelRatioF())
+            self.assertLess(dim, DEFAULT_DISPLAY_DIM)
+            self.assertTrue(wait_until(lambda: swiper.deck._pixmap.width() == dim))
+
+            swiper.resize(1400, 1000)
+            bigger = decode_dim(swiper.deck.card_size(), swiper.deck.devicePixelRatioF())
+            self.assertGreater(bigger, dim)
+            anim = swiper.deck._enter_anim
+            self.assertTrue(wait_until(lambda: swiper.deck._pixmap.width() == bigger))
+            self.assertIs(swiper.deck._enter_anim, anim)
+            swiper.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from backend import ImageBackend
+from quality import quality_issues, quality_score, score_image, score_pixels
+
+
+def texture(seed: int, size: int = 1024) -> Image.Image:
+    """1/f noise: edges at every scale, like a real scene."""
+    rng = np.random.default_rng(seed)
+    f = np.fft.fftfreq(size)
+    radius = np.hypot(f[:, None], f[None, :])
+    radius[0, 0] = 1.0
+    spectrum = (rng.normal(size=(size, size)) + 1j * rng.normal(size=(size, size))) / radius
+    pixels = np.real(np.fft.ifft2(spectrum))
+    pixels = (pixels - pixels.mean()) / pixels.std() * 40 + 128
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+class QualityScoreTests(unittest.TestCase):
+    def test_sharp_beats_blurred_and_clipping_is_counted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            sharp = texture(1)
+            sharp.save(tmp_path / "sharp.jpg", quality=92)
+            sharp.filter(ImageFilter.GaussianBlur(6)).save(tmp_path / "soft.jpg", quality=92)
+
+            sharp_scores = score_image(str(tmp_path / "sharp.jpg"))
+            soft_scores = score_image(str(tmp_path / "soft.jpg"))
+            self.assertGreater(sharp_scores[0], 10 * soft_scores[0])
+            self.assertEqual(quality_issues(sharp_scores), [])
+            self.assertEqual(quality_issues(soft_scores), ["blurry"])
+            self.assertGreater(quality_score(sharp_scores), quality_score(soft_scores))
+            self.assertIsNone(score_image(str(tmp_path / "missing.jpg")))
+
+    def test_histogram_clipping(self):
+        pixels = np.full((10, 10), 128, dtype=np.uint8)
+        pixels[:3] = 255
+        pixels[3:4] = 0
+        _sharpness, dark, bright = score_pixels(pixels)
+        self.assertAlmostEqual(dark, 0.1)
+        self.assertAlmostEqual(bright, 0.3)
+        self.assertIn("blown out", quality_issues((1000.0, dark, bright)))
+        self.assertEqual(quality_score((1000.0, 0.0, 0.0)), 100)
+        self.assertEqual(quality_score((1000.0, 0.5, 0.0)), 0)
+
+
+class BackendQualityTests(unittest.TestCase):
+    def test_scores_are_cached_and_queue_sorts_worst_first(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            image = texture(2, size=256)
+            image.save(tmp_path / "a.png")
+            image.filter(ImageFilter.GaussianBlur(4)).save(tmp_path / "b.png")
+            image.save(tmp_path / "c.png")
+
+            backend = ImageBackend(tmp_dir, index=True)
+            backend._index_thread.join()
+            calls = []
+            scores = backend.quality_scores(progress=lambda done, total: calls.append(total))
+            self.assertEqual(len(scores), 3)
+            self.assertEqual(calls[-1], 3)
+            self.assertIsNotNone(backend.index.get(str(tmp_path / "a.png")).sharpness)
+
+            calls.clear()
+            self.assertEqual(backend.quality_scores(progress=lambda d, t: calls.append(t)), scores)
+            self.assertEqual(calls, [])
+
+            backend.sort_queue(lambda path: quality_score(scores[path]) if path in scores else 101)
+            self.assertEqual(backend.get_image(0), str(tmp_path / "b.png"))
+            # Later arrivals still go after what was queued when sorting.
+            (tmp_path / "0.png").write_bytes((tmp_path / "b.png").read_bytes())
+            backend._publish([str(tmp_path / "0.png")])
+            self.assertEqual(backend.get_image(3), str(tmp_path / "0.png"))
+
+            backend.sort_queue(None)
+            self.assertEqual(
+                [backend.get_image(i) for i in range(4)],
+                [str(tmp_path / n) for n in ("0.png", "a.png", "b.png", "c.png")],
+            )
+            backend.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import random
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sortedlist import IndexedSortedList
+
+
+class TinyBlocks(IndexedSortedList):
+    LOAD = 4  # force frequent block splits
+
+
+class IndexedSortedListTests(unittest.TestCase):
+    def test_matches_plain_sorted_list_under_random_churn(self):
+        rng = random.Random(7)
+        queue = TinyBlocks()
+        reference = []
+        for _ in range(2000):
+            item = rng.randrange(300)
+            if rng.random() < 0.55:
+                queue.add(item)
+                if item not in reference:
+                    reference.append(item)
+                    reference.sort()
+            else:
+                queue.discard(item)
+                if item in reference:
+                    reference.remove(item)
+
+            self.assertEqual(len(queue), len(reference))
+            if reference:
+                pos = rng.randrange(len(reference))
+                self.assertEqual(queue[pos], reference[pos])
+                self.assertEqual(queue.index(reference[pos]), pos)
+        self.assertEqual(list(queue), reference)
+
+    def test_key_is_frozen_at_insertion(self):
+        tiers = {"b": 0, "a": 1}
+        queue = IndexedSortedList(["a", "b"], key=lambda p: (tiers[p], p))
+        self.assertEqual(list(queue), ["b", "a"])
+        tiers["a"] = 0  # must not break removal of "a"
+        queue.remove("a")
+        self.assertEqual(list(queue), ["b"])
+
+    def test_update_appends_and_merges(self):
+        queue = TinyBlocks(range(0, 20, 2))
+        queue.update(range(100, 110))  # pure append fast path
+        queue.update(range(1, 20, 2))  # interleaved merge
+        self.assertEqual(list(queue), list(range(20)) + list(range(100, 110)))
+        self.assertEqual(queue[-1], 109)
+
+    def test_missing_items_raise(self):
+        queue = IndexedSortedList(["x"])
+        with self.assertRaises(ValueError):
+            queue.index("y")
+        with self.assertRaises(ValueError):
+            queue.remove("y")
+        with self.assertRaises(IndexError):
+            queue[1]
+        self.assertNotIn("y", queue)
+
+
+if __name__ == "__main__":
+    unittest.main()
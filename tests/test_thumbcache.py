@@ -0,0 +1,89 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from thumbcache import ThumbnailCache, default_cache_dir
+
+
+class ThumbnailCacheTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.photos = self.tmp / "photos"
+        self.photos.mkdir()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def photo(self, name: str, content: bytes) -> str:
+        path = self.photos / name
+        path.write_bytes(content)
+        return str(path)
+
+    def test_round_trip_follows_content_not_path(self):
+        cache = ThumbnailCache(str(self.tmp / "cache"))
+        path = self.photo("a.jpg", b"A" * 1000)
+        self.assertIsNone(cache.get(path, 900))
+        cache.put(path, 900, b"preview")
+        self.assertEqual(cache.get(path, 900), b"preview")
+        self.assertIsNone(cache.get(path, 1600))
+
+        moved = str(self.photos / "kept.jpg")
+        shutil.move(path, moved)
+        self.assertEqual(cache.get(moved, 900), b"preview")
+
+        # New content under the same name is a miss.
+        Path(moved).write_bytes(b"B" * 1001)
+        self.assertIsNone(cache.get(moved, 900))
+        leftovers = [n for _, _, files in os.walk(cache.directory) for n in files if n.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+        cache.close()
+
+    def test_evicts_least_recently_used_past_budget(self):
+        cache = ThumbnailCache(str(self.tmp / "cache"), budget=250)
+        cache.TOUCH_INTERVAL = 0.0
+        paths = [self.photo(f"{i}.jpg", bytes([i]) * 100) for i in range(3)]
+        cache.put(paths[0], 100, b"0" * 100)
+        cache.put(paths[1], 100, b"1" * 100)
+        self.assertIsNotNone(cache.get(paths[0], 100))  # now most recent
+        cache.put(paths[2], 100, b"2" * 100)
+
+        self.assertIsNotNone(cache.get(paths[0], 100))
+        self.assertIsNone(cache.get(paths[1], 100))
+        self.assertIsNotNone(cache.get(paths[2], 100))
+        self.assertEqual(cache.total_bytes(), 200)
+        cache.close()
+
+    def test_instances_share_the_directory(self):
+        first = ThumbnailCache(str(self.tmp / "cache"))
+        second = ThumbnailCache(str(self.tmp / "cache"))
+        path = self.photo("a.jpg", b"A" * 10)
+        first.put(path, 900, b"one")
+        self.assertEqual(second.get(path, 900), b"one")
+        second.put(path, 900, b"two")
+        self.assertEqual(first.get(path, 900), b"two")
+        self.assertEqual(first.total_bytes(), 3)
+        first.close()
+        second.close()
+
+    def test_default_dir_follows_xdg(self):
+        old = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = str(self.tmp)
+        try:
+            self.assertEqual(default_cache_dir(), str(self.tmp / "photo-deleter"))
+        finally:
+            if old is None:
+                del os.environ["XDG_CACHE_HOME"]
+            else:
+                os.environ["XDG_CACHE_HOME"] = old
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend import ImageBackend
+from watcher import (
+    CREATED, DIR_REMOVED, IN_Q_OVERFLOW, REMOVED, InotifyWatcher, PollingWatcher, _HEADER, _libc,
+)
+
+EXTS = (".png", ".jpg")
+
+
+def write_fake_image(path: Path):
+    path.write_bytes(b"\x89PNG\r\n\x1a\n")
+
+
+class Collector:
+    def __init__(self):
+        self.events = []
+        self.cond = threading.Condition()
+
+    def __call__(self, events):
+        with self.cond:
+            self.events.extend(events)
+            self.cond.notify_all()
+
+    def wait_for(self, predicate, timeout=5.0):
+        with self.cond:
+            return self.cond.wait_for(lambda: predicate(self.events), timeout)
+
+
+class PollingWatcherTests(unittest.TestCase):
+    def test_reports_settled_creates_and_removals(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "old.png")
+            collector = Collector()
+            watcher = PollingWatcher(str(tmp_path), collector, EXTS, interval=3600)
+            watcher.start()
+            try:
+                write_fake_image(tmp_path / "new.png")
+                (tmp_path / "notes.txt").write_text("x")
+                watcher.poll()
+                # Not reported until it has looked the same on two polls.
+                self.assertEqual(collector.events, [])
+                watcher.poll()
+                self.assertEqual(collector.events, [(CREATED, str(tmp_path / "new.png"))])
+
+                os.remove(tmp_path / "old.png")
+                watcher.poll()
+                self.assertEqual(collector.events[-1], (REMOVED, str(tmp_path / "old.png")))
+            finally:
+                watcher.stop()
+
+
+@unittest.skipIf(_libc is None, "inotify is not available")
+class InotifyWatcherTests(unittest.TestCase):
+    def test_reports_writes_renames_and_removed_subfolders(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            (tmp_path / "kept").mkdir()
+            collector = Collector()
+            watcher = InotifyWatcher(
+                str(tmp_path), collector, EXTS, recursive=True, skip_dirs=[str(tmp_path / "kept")]
+            )
+            watcher.start()
+            try:
+                write_fake_image(tmp_path / "a.png")
+                write_fake_image(tmp_path / "kept" / "ignored.png")
+                os.rename(tmp_path / "a.png", tmp_path / "b.png")
+                sub = tmp_path / "trip"
+                sub.mkdir()
+                write_fake_image(sub / "c.png")
+                self.assertTrue(collector.wait_for(lambda ev: (CREATED, str(sub / "c.png")) in ev))
+                os.remove(sub / "c.png")
+                sub.rmdir()
+                self.assertTrue(collector.wait_for(lambda ev: (DIR_REMOVED, str(sub)) in ev))
+            finally:
+                watcher.stop()
+
+            events = collector.events
+            self.assertIn((CREATED, str(tmp_path / "a.png")), events)
+            self.assertIn((REMOVED, str(tmp_path / "a.png")), events)
+            self.assertIn((CREATED, str(tmp_path / "b.png")), events)
+            self.assertNotIn((CREATED, str(tmp_path / "kept" / "ignored.png")), events)
+
+    def test_queue_overflow_rescans_the_folder(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "old.png")
+            (tmp_path / "trip").mkdir()
+            watcher = InotifyWatcher(str(tmp_path), Collector(), EXTS, recursive=True)
+            try:
+                # Changes whose events the kernel dropped.
+                os.remove(tmp_path / "old.png")
+                (tmp_path / "trip").rmdir()
+                write_fake_image(tmp_path / "new.png")
+                events = watcher._parse(_HEADER.pack(-1, IN_Q_OVERFLOW, 0, 0))
+                self.assertEqual(
+                    events,
+                    [
+                        (REMOVED, str(tmp_path / "old.png")),
+                        (DIR_REMOVED, str(tmp_path / "trip")),
+                        (CREATED, str(tmp_path / "new.png")),
+                    ],
+                )
+                # The rescan is the new baseline.
+                self.assertEqual(watcher._parse(_HEADER.pack(-1, IN_Q_OVERFLOW, 0, 0)), [])
+            finally:
+                watcher.stop()
+
+
+class BackendWatchTests(unittest.TestCase):
+    def test_queue_follows_files_added_and_removed_by_other_programs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            for name in ("a.png", "b.png"):
+                write_fake_image(tmp_path / name)
+            changes = Collector()
+            backend = ImageBackend(
+                str(tmp_path), watch=True, on_folder_change=lambda a, r: changes([(a, r)])
+            )
+            backend._watcher.stop()
+            try:
+                self.assertEqual(backend.total_images, 2)
+                backend._on_watch_events([(CREATED, str(tmp_path / "c.png"))])
+                # The same removal twice in one batch counts once.
+                backend._on_watch_events([(REMOVED, str(tmp_path / "a.png"))] * 2)
+                self.assertEqual(backend.total_images, 2)
+                self.assertEqual(
+                    [backend.get_image(i) for i in range(backend.remaining_count())],
+                    [str(tmp_path / "b.png"), str(tmp_path / "c.png")],
+                )
+                # a.png sat at index 0; b.png has taken its place.
+                self.assertEqual(backend.position_of(str(tmp_path / "a.png")), 0)
+                self.assertEqual(
+                    changes.events,
+                    [([str(tmp_path / "c.png")], []), ([], [str(tmp_path / "a.png")])],
+                )
+
+                # Our own moves are not mistaken for outside changes.
+                dest = backend.keep(str(tmp_path / "b.png"))
+                backend._on_watch_events([(REMOVED, str(tmp_path / "b.png"))])
+                restored = backend.undo_move(dest)
+                backend._on_watch_events([(CREATED, restored)])
+                self.assertEqual(backend.total_images, 2)
+                self.assertEqual(backend.remaining_count(), 2)
+                self.assertEqual(len(changes.events), 2)
+            finally:
+                backend.close()
+
+    @unittest.skipIf(_libc is None, "inotify is not available")
+    def test_live_watch_picks_up_new_photo(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "a.png")
+            changes = Collector()
+            backend = ImageBackend(
+                str(tmp_path), watch=True, on_folder_change=lambda a, r: changes([(a, r)])
+            )
+            try:
+                write_fake_image(tmp_path / "b.png")
+                self.assertTrue(changes.wait_for(lambda ev: ev))
+                self.assertEqual(backend.total_images, 2)
+                self.assertEqual(backend.get_image(1), str(tmp_path / "b.png"))
+            finally:
+                backend.close()
+
+    @unittest.skipIf(_libc is None, "inotify is not available")
+    def test_undo_does_not_hide_a_later_file_of_the_same_name(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            write_fake_image(tmp_path / "a.png")
+            changes = Collector()
+            backend = ImageBackend(
+                str(tmp_path), watch=True, on_folder_change=lambda a, r: changes([(a, r)])
+            )
+            try:
+                kept = backend.keep(str(tmp_path / "a.png"))
+                # Events arrive in order: once this one is in, so is the keep's.
+                write_fake_image(tmp_path / "sync.png")
+                self.assertTrue(changes.wait_for(lambda ev: ([str(tmp_path / "sync.png")], []) in ev))
+                backend.undo_move(kept)
+                self.assertEqual(backend.remaining_count(), 2)
+                # Another program replaces the photo with a new one.
+                os.remove(tmp_path / "a.png")
+                self.assertTrue(changes.wait_for(lambda ev: ([], [str(tmp_path / "a.png")]) in ev))
+                (tmp_path / "a.png").write_bytes(b"\x89PNG\r\n\x1a\nnew")
+                self.assertTrue(changes.wait_for(lambda ev: ([str(tmp_path / "a.png")], []) in ev))
+                self.assertEqual(backend.remaining_count(), 2)
+            finally:
+                backend.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -118,6 +118,17 @@ class SwipeDeckTests(unittest.TestCase):
         self.deck.set_upcoming([make_pixmap(), QtGui.QPixmap(), None])
         self.assertEqual(len(self.deck._upcoming), 1)
 
+    def test_replace_image_keeps_the_enter_animation(self):
+        self.deck.replace_image(make_pixmap())
+        self.assertFalse(self.deck.has_image)  # nothing to upgrade yet
+        self.deck.set_image(make_pixmap(8, 8))
+        anim = self.deck._enter_anim
+        sharp = make_pixmap(64, 64)
+        self.deck.replace_image(sharp)
+        self.assertIs(self.deck._pixmap, sharp)
+        self.assertIs(self.deck._enter_anim, anim)
+        self.assertEqual(anim.state(), QtCore.QAbstractAnimation.Running)
+
     def test_set_upcoming_caps_at_two(self):
         self.deck.set_upcoming([make_pixmap(), make_pixmap(), make_pixmap()])
         self.assertEqual(len(self.deck._upcoming), 2)
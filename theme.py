@@ -100,6 +100,14 @@ def app_stylesheet(body_font: str, title_font: str) -> str:
         font-size: 15px;
         font-weight: 700;
     }}
+    #qualityChip {{
+        border-radius: 10px;
+        padding: 2px 10px;
+        color: {p["text"]};
+        border: 1px solid {p["border_strong"]};
+        font-size: 11px;
+        font-weight: 700;
+    }}
     #metaLabel {{
         font-size: 12px;
         color: {p["text_secondary"]};
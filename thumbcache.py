@@ -0,0 +1,190 @@
+"""Persistent thumbnail cache, shared by every app instance.
+
+Scaled previews are kept under ``$XDG_CACHE_HOME/photo-deleter`` (by
+default ``~/.cache/photo-deleter``), so reopening a folder does not decode
+every photo from full resolution again.
+
+- Entries are keyed by content, not path: the file size plus BLAKE2b of its
+  first and last 64 KiB (``duplicates.partial_digest``), and the target
+  size. A photo moved to kept/ or copied to another folder still hits.
+- Entry bytes are opaque to the cache; the app stores JPEG (PNG when the
+  image has alpha), which decodes much faster than the original.
+- Writes go to a temporary file in the same directory that is renamed into
+  place, so a reader never sees a partial entry.
+- ``cache.sqlite`` (WAL) records each entry's size and last use. When the
+  total passes the byte budget, the least recently used entries are deleted.
+  Several processes can share the directory: SQLite serializes the
+  bookkeeping, and an entry evicted under a reader is just a miss.
+
+Every method is best-effort: a cache that cannot be read or written
+behaves as if it were empty.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from duplicates import partial_digest
+
+CACHE_NAME = "photo-deleter"
+DB_NAME = "cache.sqlite"
+DEFAULT_BUDGET = 512 * 1024 ** 2
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, CACHE_NAME)
+
+
+class ThumbnailCache:
+    """Content-addressed previews on disk with an LRU byte budget. Thread-safe."""
+
+    # Last-use times are only rewritten when older than this, so a burst
+    # of hits does not turn into a burst of writes.
+    TOUCH_INTERVAL = 60.0
+    # Eviction frees down to this fraction of the budget, so it does not
+    # run again on the very next write.
+    LOW_WATER = 0.9
+    # Content keys are memoized per (path, size, mtime) up to this many.
+    MAX_KEYS = 10000
+
+    def __init__(self, directory: Optional[str] = None, budget: int = DEFAULT_BUDGET):
+        self.directory = directory or default_cache_dir()
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._keys: Dict[Tuple[str, int, int], str] = {}
+        self._touched: Dict[str, float] = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(self.directory, DB_NAME), check_same_thread=False, timeout=5.0
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, size INTEGER NOT NULL, used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+
+    # -- keys ---------------------------------------------------------------
+
+    def content_key(self, path: str) -> Optional[str]:
+        """``<size>-<digest>`` for the file's current content, or None if unreadable."""
+        try:
+            st = os.stat(path)
+            memo = (path, st.st_size, st.st_mtime_ns)
+            key = self._keys.get(memo)
+            if key is None:
+                digest, _whole = partial_digest(path, st.st_size)
+                key = f"{st.st_size:x}-{digest}"
+                if len(self._keys) >= self.MAX_KEYS:
+                    self._keys.clear()
+                self._keys[memo] = key
+            return key
+        except OSError:
+            return None
+
+    def _entry(self, key: str, max_dim: int) -> Tuple[str, str]:
+        name = f"{key}-{max_dim}"
+        return name, os.path.join(self.directory, key[-2:], name + ".thumb")
+
+    # -- reading and writing ------------------------------------------------------
+
+    def get(self, path: str, max_dim: int) -> Optional[bytes]:
+        """Cached preview bytes of ``path`` at ``max_dim``, or None on a miss."""
+        key = self.content_key(path)
+        if key is None:
+            return None
+        name, file = self._entry(key, max_dim)
+        try:
+            with open(file, "rb") as fh:
+                data = fh.read()
+        except OSError:
+            return None
+        if not data:  # left behind by a crash mid-write on some filesystems
+            return None
+        now = time.time()
+        if now - self._touched.get(name, 0.0) >= self.TOUCH_INTERVAL:
+            self._touched[name] = now
+            self._record(name, len(data), now)
+        return data
+
+    def put(self, path: str, max_dim: int, data: bytes):
+        """Store preview bytes for ``path`` at ``max_dim``; may evict older entries."""
+        key = self.content_key(path)
+        if key is None or not data:
+            return
+        name, file = self._entry(key, max_dim)
+        try:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, file)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as exc:
+            print(f"Could not cache preview of {path}: {exc}")
+            return
+        now = time.time()
+        self._touched[name] = now
+        if self._record(name, len(data), now):
+            self._evict()
+
+    def _record(self, name: str, size: int, used: float) -> bool:
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT INTO entries (key, size, used) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET size = excluded.size, used = excluded.used",
+                    (name, size, used),
+                )
+            return True
+        except sqlite3.Error as exc:
+            print(f"Thumbnail cache update failed: {exc}")
+            return False
+
+    # -- budget ---------------------------------------------------------------
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return total
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits its budget."""
+        try:
+            total = self.total_bytes()
+            if total <= self.budget:
+                return
+            target = total - int(self.budget * self.LOW_WATER)
+            victims = []
+            freed = 0
+            with self._lock:
+                for name, size in self._db.execute("SELECT key, size FROM entries ORDER BY used"):
+                    victims.append(name)
+                    freed += size
+                    if freed >= target:
+                        break
+                with self._db:
+                    self._db.executemany("DELETE FROM entries WHERE key = ?", [(n,) for n in victims])
+        except sqlite3.Error as exc:
+            print(f"Thumbnail cache eviction failed: {exc}")
+            return
+        for name in victims:
+            self._touched.pop(name, None)
+            key, _, max_dim = name.rpartition("-")
+            try:
+                os.remove(self._entry(key, int(max_dim))[1])
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,392 @@
+"""Live folder watching for the backend.
+
+``create_watcher`` returns an :class:`InotifyWatcher` on Linux (inotify
+through ``ctypes``, no extra dependency) and a :class:`PollingWatcher`
+everywhere else. Both report batches of ``(kind, path)`` events on their own
+thread:
+
+- ``created``     an image appeared and has been fully written
+- ``removed``     an image disappeared
+- ``dir_removed`` a watched subfolder disappeared (recursive watching only)
+
+A rename inside the watched tree is reported as ``removed`` + ``created``.
+Only files with one of the given extensions are reported.
+"""
+
+import abc
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+Event = Tuple[str, str]
+EventCallback = Callable[[List[Event]], None]
+
+CREATED = "created"
+REMOVED = "removed"
+DIR_REMOVED = "dir_removed"
+
+
+class FolderWatcher(abc.ABC):
+    """Base class: filtering and the worker thread."""
+
+    def __init__(
+        self,
+        root: str,
+        on_events: EventCallback,
+        extensions: Collection[str],
+        recursive: bool = False,
+        skip_dirs: Iterable[str] = (),
+    ):
+        self.root = os.path.abspath(root)
+        self.on_events = on_events
+        self.extensions = {ext.lower() for ext in extensions}
+        self.recursive = recursive
+        self.skip_dirs = {os.path.abspath(d) for d in skip_dirs}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _wants_file(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def _wants_dir(self, path: str) -> bool:
+        return (
+            self.recursive
+            and not os.path.basename(path).startswith(".")
+            and path not in self.skip_dirs
+        )
+
+    def _walk(self, directory: str) -> Iterable[Tuple[str, bool, os.DirEntry]]:
+        """Yield ``(path, is_dir, entry)`` for ``directory`` and, if recursive, below."""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self._wants_dir(entry.path):
+                                    stack.append(entry.path)
+                                    yield entry.path, True, entry
+                            elif self._wants_file(entry.name) and entry.is_file():
+                                yield entry.path, False, entry
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _snapshot(self) -> Tuple[Dict[str, Tuple[int, int]], Set[str]]:
+        """``({file: (size, mtime_ns)}, {subfolder})`` for the watched tree."""
+        files = {}
+        dirs = set()
+        for path, is_dir, entry in self._walk(self.root):
+            if is_dir:
+                dirs.add(path)
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files[path] = (st.st_size, st.st_mtime_ns)
+        return files, dirs
+
+    def _diff_removed(self, known: Set[str], files, old_dirs: Set[str], dirs: Set[str]) -> List[Event]:
+        """Events for files in ``known`` and folders in ``old_dirs`` no longer there."""
+        events = [(REMOVED, path) for path in sorted(known - files.keys())]
+        events.extend((DIR_REMOVED, path) for path in sorted(old_dirs - dirs))
+        return events
+
+    def _emit(self, events: List[Event]):
+        if not events or self._stop.is_set():
+            return
+        try:
+            self.on_events(events)
+        except Exception as exc:
+            print(f"Watcher callback failed: {exc}")
+
+    @abc.abstractmethod
+    def _run(self):
+        """Watch until ``_stop`` is set, passing batches to ``_emit``."""
+
+
+class PollingWatcher(FolderWatcher):
+    """Portable fallback: diff a ``scandir`` snapshot every ``interval`` seconds.
+
+    A new file is only reported once its size and mtime were the same on
+    two polls in a row, so a photo that is still being copied in is not
+    picked up half-written.
+    """
+
+    def __init__(self, *args, interval: float = 1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self._known: Set[str] = set()
+        self._unsettled: Dict[str, Tuple[int, int]] = {}
+        self._dirs: Set[str] = set()
+
+    def start(self):
+        # Files present now belong to the initial scan, not to the watcher.
+        files, self._dirs = self._snapshot()
+        self._known = set(files)
+        super().start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """Run one snapshot diff now and report what changed."""
+        files, dirs = self._snapshot()
+        events = self._diff_removed(self._known, files, self._dirs, dirs)
+        self._known &= files.keys()
+        self._dirs = dirs
+
+        unsettled = {}
+        for path, sig in files.items():
+            if path in self._known:
+                continue
+            if self._unsettled.get(path) == sig:
+                self._known.add(path)
+                events.append((CREATED, path))
+            else:
+                unsettled[path] = sig
+        self._unsettled = unsettled
+        self._emit(events)
+
+
+# -- inotify ----------------------------------------------------------------
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# IN_CREATE is only used for directories: a file is reported when its
+# writer closes it (IN_CLOSE_WRITE) or when it is renamed into place.
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+class InotifyWatcher(FolderWatcher):
+    """Linux watcher built on inotify; one watch per directory.
+
+    The files and folders reported so far are tracked, so when the kernel
+    queue overflows (``IN_Q_OVERFLOW``, events were dropped) the tree is
+    rescanned and the difference reported, as :class:`PollingWatcher` does.
+    """
+
+    READ_SIZE = 64 * 1024
+    SELECT_TIMEOUT = 0.25
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._wd_paths: Dict[int, str] = {}
+        try:
+            self._add_watch(self.root)
+        except OSError:
+            os.close(fd)
+            raise
+        files, self._dirs = self._snapshot()
+        self._known: Set[str] = set(files)
+        for path in self._dirs:
+            self._add_watch(path)
+
+    def _add_watch(self, path: str) -> bool:
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if path == self.root:
+                raise OSError(err, os.strerror(err), path)
+            # Gone again already, or out of watches; polling would not help.
+            return False
+        self._wd_paths[wd] = path
+        return True
+
+    def stop(self):
+        super().stop()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], self.SELECT_TIMEOUT)
+            except (OSError, ValueError):
+                return
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, self.READ_SIZE)
+            except BlockingIOError:
+                continue
+            except OSError as exc:
+                print(f"Watcher read failed: {exc}")
+                return
+            self._emit(self._parse(data))
+
+    def _parse(self, data: bytes) -> List[Event]:
+        events: List[Event] = []
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            wd, mask, _cookie, length = _HEADER.unpack_from(data, offset)
+            offset += _HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.extend(self._resync())
+                continue
+            directory = self._wd_paths.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                if mask & IN_IGNORED:
+                    del self._wd_paths[wd]
+                continue
+
+            path = os.path.join(directory, name)
+            is_dir = bool(mask & IN_ISDIR)
+            if is_dir:
+                if not self._wants_dir(path):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.extend(self._watch_new_dir(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    if mask & IN_MOVED_FROM:
+                        self._forget_dir(path)
+                    self._drop_known(path)
+                    events.append((DIR_REMOVED, path))
+                continue
+            if not self._wants_file(name):
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._known.add(path)
+                events.append((CREATED, path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._known.discard(path)
+                events.append((REMOVED, path))
+        return events
+
+    def _resync(self) -> List[Event]:
+        """Rescan the tree after the kernel dropped events; report the difference.
+
+        New files are reported right away rather than after they settle: one
+        still being written is reported again when its writer closes it,
+        and the backend ignores the repeat.
+        """
+        print("Watcher queue overflowed; rescanning the folder")
+        files, dirs = self._snapshot()
+        events = self._diff_removed(self._known, files, self._dirs, dirs)
+        events.extend((CREATED, path) for path in sorted(files.keys() - self._known))
+        for path in dirs - self._dirs:
+            self._add_watch(path)
+        self._known = set(files)
+        self._dirs = dirs
+        return events
+
+    def _watch_new_dir(self, path: str) -> List[Event]:
+        """Watch a new subfolder and report images already inside it.
+
+        Files written before the watch was in place produce no events, so
+        the folder is listed once after adding it.
+        """
+        events = []
+        if not self._add_watch(path):
+            return events
+        self._dirs.add(path)
+        for sub, is_dir, _entry in self._walk(path):
+            if is_dir:
+                self._add_watch(sub)
+                self._dirs.add(sub)
+            else:
+                self._known.add(sub)
+                events.append((CREATED, sub))
+        return events
+
+    def _drop_known(self, path: str):
+        prefix = path + os.sep
+        self._dirs = {d for d in self._dirs if d != path and not d.startswith(prefix)}
+        self._known = {f for f in self._known if not f.startswith(prefix)}
+
+    def _forget_dir(self, path: str):
+        # A folder moved out of the tree keeps its watches; drop them.
+        prefix = path + os.sep
+        for wd, watched in list(self._wd_paths.items()):
+            if watched == path or watched.startswith(prefix):
+                _libc.inotify_rm_watch(self._fd, wd)
+                del self._wd_paths[wd]
+
+
+def create_watcher(
+    root: str,
+    on_events: EventCallback,
+    extensions: Collection[str],
+    recursive: bool = False,
+    skip_dirs: Iterable[str] = (),
+    poll_interval: float = 1.0,
+) -> FolderWatcher:
+    """Return a started watcher: inotify when available, polling otherwise."""
+    skip_dirs = list(skip_dirs)
+    try:
+        watcher: FolderWatcher = InotifyWatcher(
+            root, on_events, extensions, recursive=recursive, skip_dirs=skip_dirs
+        )
+    except OSError:
+        watcher = PollingWatcher(
+            root, on_events, extensions, recursive=recursive, skip_dirs=skip_dirs,
+            interval=poll_interval,
+        )
+    watcher.start()
+    return watcher
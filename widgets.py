@@ -11,6 +11,8 @@ import time
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+import metrics
+from imagecache import ImageCache
 from theme import PALETTE
 
 
@@ -31,6 +33,7 @@ class SwipeDeck(QtWidgets.QWidget):
 
     swiped = QtCore.pyqtSignal(str)  # "keep" | "delete"
     inspect_requested = QtCore.pyqtSignal()
+    resized = QtCore.pyqtSignal()
 
     SWIPE_THRESHOLD_RATIO = 0.28
     FLING_VELOCITY = 0.85  # px / ms
@@ -39,7 +42,7 @@ class SwipeDeck(QtWidgets.QWidget):
     STACK_SCALE = 0.045
     MARGIN = 10
 
-    def __init__(self):
+    def __init__(self, cache: ImageCache = None):
         super().__init__()
         self.setMinimumHeight(360)
         self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
@@ -61,8 +64,10 @@ class SwipeDeck(QtWidgets.QWidget):
         self._spring_anim = None
         self._exit = None  # dict: pix, t, dir, off0, ang0
         self._exit_anim = None
+        self._last_frame = None  # perf_counter of the previous animated paint
 
-        self._scaled_cache = {}
+        # Card-sized copies of the pixmaps, in the app's shared cache if given.
+        self._scaled_cache = cache if cache is not None else ImageCache()
 
     # -- public API ------------------------------------------------------
 
@@ -74,6 +79,21 @@ class SwipeDeck(QtWidgets.QWidget):
         self._animate_enter()
         self.update()
 
+    def replace_image(self, pixmap: QtGui.QPixmap):
+        """Swap in a sharper pixmap of the photo already on the front card.
+
+        Unlike ``set_image`` this keeps the drag and the running enter
+        animation, so the upgrade from a quick proxy is seamless.
+        """
+        if not self.has_image or pixmap is None or pixmap.isNull():
+            return
+        self._pixmap = pixmap
+        self.update()
+
+    def card_size(self) -> QtCore.QSize:
+        """Size of the front card at rest, in logical pixels."""
+        return self._card_area().size()
+
     def set_upcoming(self, pixmaps: list):
         self._upcoming = [p for p in pixmaps if p is not None and not p.isNull()][:2]
         self.update()
@@ -119,6 +139,7 @@ class SwipeDeck(QtWidgets.QWidget):
         self._exit_anim.setEasingCurve(QtCore.QEasingCurve.OutQuad)
         self._exit_anim.valueChanged.connect(self._on_exit_tick)
         self._exit_anim.finished.connect(self._on_exit_done)
+        self._time_animation(self._exit_anim, "deck.exit_animation")
         self._exit_anim.start()
 
     # -- animation plumbing -----------------------------------------------
@@ -142,6 +163,7 @@ class SwipeDeck(QtWidgets.QWidget):
         anim.setDuration(260)
         anim.setEasingCurve(QtCore.QEasingCurve.OutCubic)
         anim.valueChanged.connect(self._on_enter_tick)
+        self._time_animation(anim, "deck.enter_animation")
         anim.start()
         self._enter_anim = anim
 
@@ -165,6 +187,7 @@ class SwipeDeck(QtWidgets.QWidget):
         anim.setDuration(340)
         anim.setEasingCurve(QtCore.QEasingCurve.OutBack)
         anim.valueChanged.connect(self._on_spring_tick)
+        self._time_animation(anim, "deck.spring_animation")
         anim.start()
         self._spring_anim = anim
 
@@ -172,6 +195,29 @@ class SwipeDeck(QtWidgets.QWidget):
         self._drag = QtCore.QPointF(value)
         self.update()
 
+    def _time_animation(self, anim, name):
+        """Record how long ``anim`` really takes, to compare with its nominal duration."""
+        if metrics.enabled():
+            start = time.perf_counter()
+            anim.finished.connect(lambda: metrics.observe(name, time.perf_counter() - start))
+
+    def _animating(self) -> bool:
+        spring = self._spring_anim
+        return (
+            self._exit is not None or self._enter < 1.0
+            or (spring is not None and spring.state() == QtCore.QAbstractAnimation.Running)
+        )
+
+    def _note_frame(self):
+        """Frame pacing: the gap between consecutive paints while a card is moving."""
+        now = time.perf_counter()
+        if not self._animating():
+            self._last_frame = None
+            return
+        if self._last_frame is not None:
+            metrics.observe("deck.frame_interval", now - self._last_frame)
+        self._last_frame = now
+
     def _current_angle(self) -> float:
         area = self._card_area()
         return 14.0 * self._drag.x() / max(1.0, float(area.width()))
@@ -215,6 +261,10 @@ class SwipeDeck(QtWidgets.QWidget):
         if self.has_image:
             self.inspect_requested.emit()
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit()
+
     def _fling_velocity(self) -> float:
         if len(self._samples) < 2:
             return 0.0
@@ -231,17 +281,21 @@ class SwipeDeck(QtWidgets.QWidget):
         return self.rect().adjusted(m, m, -m, -(m + reserve))
 
     def _scaled_for(self, pixmap: QtGui.QPixmap, size: QtCore.QSize) -> QtGui.QPixmap:
-        key = (pixmap.cacheKey(), size.width(), size.height())
+        """``pixmap`` fitted into ``size`` (logical pixels) at the screen's resolution."""
+        dpr = self.devicePixelRatioF()
+        key = (pixmap.cacheKey(), (size.width(), size.height()), dpr)
         cached = self._scaled_cache.get(key)
         if cached is not None:
             return cached
-        scaled = pixmap.scaled(size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
-        if len(self._scaled_cache) > 12:
-            self._scaled_cache.clear()
-        self._scaled_cache[key] = scaled
+        scaled = pixmap.scaled(size * dpr, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        scaled.setDevicePixelRatio(dpr)
+        self._scaled_cache.put(key, scaled)
         return scaled
 
+    @metrics.timed("deck.paint")
     def paintEvent(self, event):
+        if metrics.enabled():
+            self._note_frame()
         painter = QtGui.QPainter(self)
         painter.setRenderHints(
             QtGui.QPainter.Antialiasing | QtGui.QPainter.SmoothPixmapTransform
@@ -284,9 +338,10 @@ class SwipeDeck(QtWidgets.QWidget):
         painter.setClipPath(_rounded(rect, self.RADIUS * scale))
         painter.fillRect(rect, QtGui.QColor(PALETTE["surface_high"]))
         scaled = self._scaled_for(pixmap, rect.size().toSize())
+        dpr = scaled.devicePixelRatioF()
         painter.drawPixmap(
-            int(rect.x() + (rect.width() - scaled.width()) / 2),
-            int(rect.y() + (rect.height() - scaled.height()) / 2),
+            int(rect.x() + (rect.width() - scaled.width() / dpr) / 2),
+            int(rect.y() + (rect.height() - scaled.height() / dpr) / 2),
             scaled,
         )
         painter.fillRect(rect, QtGui.QColor(0, 0, 0, 110))
@@ -306,9 +361,10 @@ class SwipeDeck(QtWidgets.QWidget):
         painter.fillRect(rect, QtGui.QColor(PALETTE["surface_high"]))
 
         scaled = self._scaled_for(pixmap, rect.size().toSize())
+        dpr = scaled.devicePixelRatioF()
         painter.drawPixmap(
-            int(rect.x() + (rect.width() - scaled.width()) / 2),
-            int(rect.y() + (rect.height() - scaled.height()) / 2),
+            int(rect.x() + (rect.width() - scaled.width() / dpr) / 2),
+            int(rect.y() + (rect.height() - scaled.height() / dpr) / 2),
             scaled,
         )
 
@@ -334,9 +390,9 @@ class SwipeDeck(QtWidgets.QWidget):
         font.setBold(True)
         font.setLetterSpacing(QtGui.QFont.AbsoluteSpacing, 2.5)
         painter.setFont(font)
-        metrics = QtGui.QFontMetrics(font)
-        tw = metrics.horizontalAdvance(text)
-        th = metrics.height()
+        fm = QtGui.QFontMetrics(font)
+        tw = fm.horizontalAdvance(text)
+        th = fm.height()
         pad = 10
 
         painter.save()